@@ -0,0 +1,218 @@
+"""
+Headless batch generation.
+
+    python -m backend.batch INPUT [INPUT ...] [--output batch_output] [--workers 2]
+
+INPUT is an image file, a directory (all images in it, --recursive for
+subdirectories) or a glob pattern such as "photos/*.png". Every image gets
+its own folder under --output, mirroring the input layout. Images whose
+folder already holds an up-to-date result (same image bytes, model and
+options, see GenerationPipeline.result_keys) are skipped, so an interrupted
+run can simply be restarted.
+
+Results are listed in <output>/batch_results.json, which is rewritten after
+every finished image. Nothing here imports Qt, so this runs on machines
+without a display.
+"""
+import os
+import sys
+import json
+import glob
+import time
+import hashlib
+import argparse
+import threading
+
+from backend.stages import DEFAULT_OPTIONS
+from backend.manifest import read_manifest, artifact_paths
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".bmp")
+RESULTS_FILE = "batch_results.json"
+
+
+def collect_inputs(patterns, recursive=False):
+    """
+    Expands files, directories and glob patterns into (image path, relative
+    output name) pairs, sorted and without duplicates.
+    """
+    found = {}
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            root = os.path.abspath(pattern)
+            walker = os.walk(root) if recursive else [(root, [], os.listdir(root))]
+            for dirpath, _, filenames in walker:
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    if filename.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(path):
+                        found.setdefault(path, os.path.splitext(os.path.relpath(path, root))[0])
+        else:
+            paths = glob.glob(pattern, recursive=recursive) if glob.has_magic(pattern) else [pattern]
+            for path in paths:
+                path = os.path.abspath(path)
+                if path.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(path):
+                    found.setdefault(path, os.path.splitext(os.path.basename(path))[0])
+
+    # Same stem from different places (e.g. two globs): keep names unique and stable
+    inputs = []
+    used = set()
+    for path in sorted(found):
+        name = found[path]
+        if name in used:
+            name = f"{name}-{hashlib.sha1(path.encode('utf-8')).hexdigest()[:8]}"
+        used.add(name)
+        inputs.append((path, name))
+    return inputs
+
+
+def is_complete(output_dir, cache_key):
+    """True if output_dir holds an intact result for exactly this cache key."""
+    manifest = read_manifest(output_dir)
+    if manifest is None or manifest.get("cache_key") != cache_key:
+        return False
+    return artifact_paths(manifest, output_dir) is not None
+
+
+class BatchResults:
+    """Collects per-image results and keeps RESULTS_FILE up to date."""
+
+    def __init__(self, path, options, started_at):
+        self.path = path
+        self.options = options
+        self.started_at = started_at
+        self.entries = {}
+        self._lock = threading.Lock()
+
+    def record(self, input_path, **fields):
+        """Stores one result; returns how many images were processed (not skipped) so far."""
+        with self._lock:
+            self.entries[input_path] = dict(input=input_path, **fields)
+            self._save()
+            return sum(1 for entry in self.entries.values() if entry["state"] != "skipped")
+
+    def count(self, state):
+        with self._lock:
+            return sum(1 for entry in self.entries.values() if entry["state"] == state)
+
+    def _save(self):
+        payload = {
+            "started_at": self.started_at,
+            "updated_at": time.time(),
+            "options": self.options,
+            "results": sorted(self.entries.values(), key=lambda entry: entry["input"]),
+        }
+        tmp_path = f"{self.path}.tmp{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m backend.batch",
+                                     description="Generate meshes for many images without the GUI.")
+    parser.add_argument("inputs", nargs="+", help="Image files, directories or glob patterns.")
+    parser.add_argument("--output", default="batch_output", help="Output directory.")
+    parser.add_argument("--workers", type=int, default=1, help="Images processed in parallel (one worker process each).")
+    parser.add_argument("--pin-cpus", action="store_true", help="Pin every worker to its own block of CPU cores.")
+    parser.add_argument("--recursive", action="store_true", help="Descend into subdirectories / allow ** in globs.")
+    parser.add_argument("--force", action="store_true", help="Regenerate even if a complete result exists.")
+    parser.add_argument("--model", default="InstantMesh", help="Model name.")
+    parser.add_argument("--low-vram", action="store_true", help="Low-memory mode (bfloat16 on CPU, FP16 on GPU).")
+    parser.add_argument("--memory-budget-gb", type=float, default=None,
+                        help="Peak RSS target per worker; implies --low-vram.")
+    parser.add_argument("--diffusion-steps", type=int, default=DEFAULT_OPTIONS["diffusion_steps"])
+    parser.add_argument("--seed", type=int, default=DEFAULT_OPTIONS["seed"])
+    parser.add_argument("--scale", type=float, default=DEFAULT_OPTIONS["scale"])
+    parser.add_argument("--view", type=int, default=DEFAULT_OPTIONS["view"], choices=[4, 6])
+    parser.add_argument("--distance", type=float, default=DEFAULT_OPTIONS["distance"])
+    parser.add_argument("--no-rembg", action="store_true", help="Do not remove the input background.")
+    parser.add_argument("--export-texmap", action="store_true", help="Export meshes with a texture map.")
+    parser.add_argument("--no-video", action="store_true", help="Skip the turntable video.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    options = {
+        "no_rembg": args.no_rembg,
+        "diffusion_steps": args.diffusion_steps,
+        "seed": args.seed,
+        "scale": args.scale,
+        "view": args.view,
+        "export_texmap": args.export_texmap,
+        "save_video": not args.no_video,
+        "distance": args.distance,
+    }
+
+    inputs = collect_inputs(args.inputs, recursive=args.recursive)
+    if not inputs:
+        print("[Batch] No images found.")
+        return 1
+
+    from backend.manager import BackendManager
+    from backend.pipeline import GenerationPipeline
+
+    output_root = os.path.abspath(args.output)
+    os.makedirs(output_root, exist_ok=True)
+    results = BatchResults(os.path.join(output_root, RESULTS_FILE), options, time.time())
+
+    manager = BackendManager()
+    manager.set_concurrency(args.workers, pin_cpus=args.pin_cpus)
+    manager.set_memory_budget(args.memory_budget_gb)
+    pipeline = GenerationPipeline(manager)
+
+    # Skip everything that is already done
+    pending = {}
+    for input_path, name in inputs:
+        output_dir = os.path.join(output_root, name)
+        low_vram = args.low_vram or bool(args.memory_budget_gb)
+        _, cache_key = pipeline.result_keys(input_path, args.model, low_vram, options)
+        if not args.force and is_complete(output_dir, cache_key):
+            results.record(input_path, state="skipped", output_dir=output_dir,
+                           mesh=artifact_paths(read_manifest(output_dir), output_dir).get("mesh"))
+            continue
+        pending[input_path] = output_dir
+
+    total = len(pending)
+    print(f"[Batch] {len(inputs)} images, {len(inputs) - total} already done, {total} to generate "
+          f"with {args.workers} worker(s)")
+    if not total:
+        return 0
+
+    finished = threading.Semaphore(0)
+
+    def on_job_updated(job):
+        if not job.finished or job.image_path not in pending:
+            return
+        seconds = (job.finished_at or time.time()) - (job.started_at or job.created_at)
+        done = results.record(job.image_path, state=job.state, output_dir=job.output_dir,
+                              mesh=job.result_path, error=job.error, seconds=round(seconds, 2))
+        detail = job.error if job.state == "failed" else f"{seconds:.1f}s"
+        print(f"[Batch] {done}/{total} {job.state}: {job.image_path} ({detail})", flush=True)
+        finished.release()
+
+    manager.jobs.add_listener(on_job_updated)
+    for input_path, output_dir in pending.items():
+        manager.submit_job(input_path, model_name=args.model, low_vram=args.low_vram,
+                           options=options, output_dir=output_dir, memory_budget_gb=args.memory_budget_gb)
+
+    try:
+        for _ in range(total):
+            # Short timeouts keep Ctrl+C responsive on every platform
+            while not finished.acquire(timeout=0.5):
+                pass
+    except KeyboardInterrupt:
+        print("[Batch] Interrupted, cancelling remaining jobs (finished results are kept)...")
+        manager.request_stop()
+        manager.jobs.wait(timeout=10)
+        return 130
+    finally:
+        manager.unload_model()
+
+    failed = results.count("failed")
+    print(f"[Batch] Finished: {results.count('done')} generated, {results.count('skipped')} skipped, "
+          f"{failed} failed. Results: {results.path}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
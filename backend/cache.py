@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+
+DEFAULT_CACHE_DIR = "cache"
+DEFAULT_MAX_SIZE_MB = 2048
+
+
+class ResultCache:
+    """
+    Content-addressed cache of finished generations, stored next to output/.
+
+    An entry is keyed on the SHA-256 of the input image bytes plus every
+    generation parameter, and holds a copy of the mesh (and its .mtl/texture
+    sidecars) under cache/<key>/, plus any other published artifact (the
+    turntable video) under cache/<key>/<artifact>/. The total size is capped;
+    when it is exceeded the least recently used entries are evicted.
+    """
+
+    INDEX_FILE = "index.json"
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_size_mb=DEFAULT_MAX_SIZE_MB):
+        self.root = os.path.abspath(root)
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = self._load_index()
+
+    @staticmethod
+    def make_key(image_path, params):
+        """Hashes the image content together with the generation parameters."""
+        digest = hashlib.sha256()
+        with open(image_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        digest.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key, required=()):
+        """
+        Returns the cached mesh path for key, or None on a miss.
+
+        An entry missing one of the required artifacts (e.g. "video", for an
+        entry stored before videos were cached) counts as a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            mesh_path = os.path.join(self.root, key, entry["mesh"]) if entry else None
+            artifacts = self._artifact_paths(key)
+            if (mesh_path is None or not os.path.exists(mesh_path)
+                    or any(name not in artifacts for name in required)
+                    or not all(os.path.exists(path) for path in artifacts.values())):
+                if entry:
+                    # Files were removed behind our back (or never stored), forget the entry
+                    self._remove_entry(key)
+                    self._save_index()
+                self.misses += 1
+                return None
+
+            entry["last_used"] = time.time()
+            self._save_index()
+            self.hits += 1
+            return mesh_path
+
+    def get_artifacts(self, key):
+        """Returns artifact name -> cached path of the entry's other artifacts."""
+        with self._lock:
+            return self._artifact_paths(key)
+
+    def put(self, key, mesh_path, artifacts=None):
+        """
+        Copies a generated mesh and its sidecar files into the cache, together
+        with the files in artifacts (artifact name -> path, e.g. the video).
+
+        Returns:
+            str | None: Path of the cached mesh, or None if it exceeds the cap.
+        """
+        mesh_dir = os.path.dirname(mesh_path)
+        stem = os.path.splitext(os.path.basename(mesh_path))[0]
+        files = [f for f in os.listdir(mesh_dir)
+                 if os.path.splitext(f)[0] == stem and os.path.isfile(os.path.join(mesh_dir, f))]
+        # Artifacts get their own subdirectory, so they never pass for mesh sidecars
+        extras = {name: (path, os.path.join(name, os.path.basename(path)))
+                  for name, path in (artifacts or {}).items() if path}
+        size = (sum(os.path.getsize(os.path.join(mesh_dir, f)) for f in files)
+                + sum(os.path.getsize(path) for path, _ in extras.values()))
+        if size > self.max_bytes:
+            return None
+
+        with self._lock:
+            entry_dir = os.path.join(self.root, key)
+            tmp_dir = f"{entry_dir}.tmp{os.getpid()}"
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+            for f in files:
+                shutil.copy2(os.path.join(mesh_dir, f), os.path.join(tmp_dir, f))
+            for name, (path, relative) in extras.items():
+                os.makedirs(os.path.join(tmp_dir, name))
+                shutil.copy2(path, os.path.join(tmp_dir, relative))
+
+            if key in self._entries:
+                self._remove_entry(key)
+            os.replace(tmp_dir, entry_dir)
+            self._entries[key] = {
+                "mesh": os.path.basename(mesh_path),
+                "artifacts": {name: relative for name, (_, relative) in extras.items()},
+                "size": size,
+                "last_used": time.time(),
+            }
+            self._evict()
+            self._save_index()
+            return os.path.join(entry_dir, os.path.basename(mesh_path))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "size_mb": self._total_size() / (1024 * 1024),
+            }
+
+    def format_stats(self):
+        stats = self.stats()
+        return (f"hits={stats['hits']} misses={stats['misses']} "
+                f"entries={stats['entries']} size={stats['size_mb']:.1f} MB")
+
+    def clear(self):
+        """
+        Deletes every cached entry.
+        Returns a tuple (deleted_count, freed_bytes).
+        """
+        with self._lock:
+            count = len(self._entries)
+            freed = self._total_size()
+            for key in list(self._entries):
+                self._remove_entry(key)
+            self._save_index()
+            return count, freed
+
+    # --- Internals (callers hold self._lock) ---
+
+    def _artifact_paths(self, key):
+        entry = self._entries.get(key) or {}
+        return {name: os.path.join(self.root, key, relative)
+                for name, relative in entry.get("artifacts", {}).items()}
+
+    def _total_size(self):
+        return sum(entry["size"] for entry in self._entries.values())
+
+    def _evict(self):
+        total = self._total_size()
+        for key in sorted(self._entries, key=lambda k: self._entries[k]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            total -= self._entries[key]["size"]
+            print(f"[Cache] Evicting {key[:12]}")
+            self._remove_entry(key)
+
+    def _remove_entry(self, key):
+        self._entries.pop(key, None)
+        shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+
+    def _load_index(self):
+        index_path = os.path.join(self.root, self.INDEX_FILE)
+        if not os.path.exists(index_path):
+            return {}
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[Cache] Ignoring unreadable index {index_path}: {e}")
+            return {}
+
+    def _save_index(self):
+        os.makedirs(self.root, exist_ok=True)
+        index_path = os.path.join(self.root, self.INDEX_FILE)
+        tmp_path = f"{index_path}.tmp{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, index_path)
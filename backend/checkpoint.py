@@ -0,0 +1,182 @@
+"""
+Memory-mapped copies of the InstantMesh checkpoints.
+
+The original .ckpt / .bin files are pickles that torch.load has to read into
+private memory in full. They are converted once into torch's zip format (a
+plain state dict with tensor data laid out as separate records) under ckpts/.
+torch.load(mmap=True) then maps the tensors straight from the file, so a load
+costs almost no time, and worker processes on the same host share the page
+cache instead of each holding its own copy.
+
+A small JSON stamp next to the converted file records which source it was
+made from (path, size, mtime) plus the converted file's size, mtime and
+sha256; a changed source triggers a new conversion. The hash is checked
+whenever the converted file's mtime no longer matches the stamp (it was
+rewritten, copied or touched), so a corrupted copy is converted again
+instead of being loaded, while an untouched one costs only a stat.
+"""
+import os
+import json
+import time
+import hashlib
+
+import torch
+
+CONVERTED_DIR = os.path.join(os.path.dirname(__file__), "InstantMesh", "ckpts")
+CONVERTED_SUFFIX = ".mmap.pt"
+STAMP_SUFFIX = ".mmap.json"
+FORMAT_VERSION = 1
+
+
+def _sha256(path, chunk_size=16 * 1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _source_stamp(src_path, key, prefix):
+    stat = os.stat(src_path)
+    return {
+        "format": FORMAT_VERSION,
+        "source": os.path.abspath(src_path),
+        "source_size": stat.st_size,
+        "source_mtime_ns": stat.st_mtime_ns,
+        "key": key,
+        "prefix": prefix,
+    }
+
+
+def converted_paths(src_path, name=None, out_dir=CONVERTED_DIR):
+    """Returns (converted file, stamp file) for a source checkpoint."""
+    name = name or os.path.splitext(os.path.basename(src_path))[0]
+    return (os.path.join(out_dir, name + CONVERTED_SUFFIX),
+            os.path.join(out_dir, name + STAMP_SUFFIX))
+
+
+def _write_stamp(stamp_path, stamp):
+    tmp_stamp = f"{stamp_path}.tmp{os.getpid()}"
+    with open(tmp_stamp, "w", encoding="utf-8") as f:
+        json.dump(stamp, f, indent=2)
+    os.replace(tmp_stamp, stamp_path)
+
+
+def is_converted(src_path, key=None, prefix=None, name=None, out_dir=CONVERTED_DIR):
+    """
+    True if an up-to-date converted copy of src_path exists.
+
+    If the copy's mtime differs from the one it was hashed at, its sha256 is
+    checked against the stamp (and the new mtime recorded when it matches).
+    """
+    converted_path, stamp_path = converted_paths(src_path, name, out_dir)
+    try:
+        with open(stamp_path, "r", encoding="utf-8") as f:
+            stamp = json.load(f)
+        stat = os.stat(converted_path)
+    except (OSError, ValueError):
+        return False
+    expected = _source_stamp(src_path, key, prefix)
+    if not all(stamp.get(k) == v for k, v in expected.items()) or stamp.get("size") != stat.st_size:
+        return False
+    if stamp.get("mtime_ns") == stat.st_mtime_ns:
+        return True
+
+    print(f"[Checkpoint] {converted_path} changed since it was written, checking its sha256 ...")
+    if _sha256(converted_path) != stamp.get("sha256"):
+        print(f"[Checkpoint] {converted_path} does not match its stamp, converting again")
+        return False
+    stamp["mtime_ns"] = stat.st_mtime_ns
+    try:
+        _write_stamp(stamp_path, stamp)
+    except OSError:
+        pass # Read-only ckpts/: the hash is checked again next time
+    return True
+
+
+def convert(src_path, key=None, prefix=None, name=None, out_dir=CONVERTED_DIR):
+    """
+    Converts a pickled checkpoint into an mmap-able state dict file.
+
+    Args:
+        src_path (str): Original .ckpt / .bin file.
+        key (str): Entry holding the state dict (e.g. "state_dict"), or None
+                   if the file is the state dict itself.
+        prefix (str): Only keep entries starting with this prefix, and strip it
+                      (e.g. "lrm_generator.").
+        name (str): Base name of the converted file (defaults to the source stem).
+        out_dir (str): Where converted files are kept.
+
+    Returns:
+        str: Path of the converted file.
+    """
+    converted_path, stamp_path = converted_paths(src_path, name, out_dir)
+    os.makedirs(out_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    print(f"[Checkpoint] Converting {src_path} for memory-mapped loading ...")
+    state_dict = torch.load(src_path, map_location="cpu")
+    if key is not None:
+        state_dict = state_dict[key]
+    if prefix is not None:
+        state_dict = {k[len(prefix):]: v for k, v in state_dict.items() if k.startswith(prefix)}
+    # Views would drag their whole base storage along; save compact tensors only
+    state_dict = {k: v.contiguous().clone() if torch.is_tensor(v) else v for k, v in state_dict.items()}
+
+    # Several workers may convert at once; the last atomic replace wins and all copies are identical
+    tmp_path = f"{converted_path}.tmp{os.getpid()}"
+    torch.save(state_dict, tmp_path)
+    del state_dict
+    os.replace(tmp_path, converted_path)
+
+    stamp = _source_stamp(src_path, key, prefix)
+    stat = os.stat(converted_path)
+    stamp["size"] = stat.st_size
+    stamp["mtime_ns"] = stat.st_mtime_ns
+    stamp["sha256"] = _sha256(converted_path)
+    _write_stamp(stamp_path, stamp)
+
+    print(f"[Checkpoint] Wrote {converted_path} in {time.perf_counter() - start:.1f}s")
+    return converted_path
+
+
+def load_state_dict(src_path, key=None, prefix=None, name=None, out_dir=CONVERTED_DIR):
+    """
+    Returns the state dict of src_path, memory-mapped from its converted copy.
+
+    The copy is created on first use. If the installed torch cannot mmap
+    (older than 2.1) or the conversion fails (e.g. read-only ckpts/), the
+    source is loaded the classic way instead.
+    """
+    try:
+        if not is_converted(src_path, key, prefix, name, out_dir):
+            convert(src_path, key, prefix, name, out_dir)
+        converted_path, _ = converted_paths(src_path, name, out_dir)
+        return torch.load(converted_path, map_location="cpu", mmap=True, weights_only=True)
+    except (OSError, TypeError, RuntimeError) as e:
+        print(f"[Checkpoint] Memory-mapped load unavailable ({e}), loading {src_path} directly")
+
+    state_dict = torch.load(src_path, map_location="cpu")
+    if key is not None:
+        state_dict = state_dict[key]
+    if prefix is not None:
+        state_dict = {k[len(prefix):]: v for k, v in state_dict.items() if k.startswith(prefix)}
+    return state_dict
+
+
+def assign_state_dict(module, state_dict, strict=True):
+    """
+    Loads state_dict into module, adopting the (memory-mapped) tensors
+    instead of copying them when dtypes match, so the weights stay shared.
+    """
+    current = module.state_dict()
+    same_dtypes = all(
+        k not in current or not torch.is_tensor(v) or current[k].dtype == v.dtype
+        for k, v in state_dict.items()
+    )
+    if same_dtypes:
+        try:
+            return module.load_state_dict(state_dict, strict=strict, assign=True)
+        except TypeError:
+            pass # torch < 2.1 has no assign
+    return module.load_state_dict(state_dict, strict=strict)
@@ -1,42 +1,21 @@
 import sys
 import os
+import json
 import argparse
-from unittest.mock import MagicMock
+import traceback
 import torch
 
-# --- 1. MOCKING NVDIFFRAST ---
+# --- 1. NVDIFFRAST ON CPU ---
 # Ini harus dilakukan SEBELUM import apapun dari InstantMesh
-print("[Wrapper] Setting up Mock Nvdiffrast...")
+# The vendored nvdiffrast dispatches on the device of the input tensors and
+# only loads its compiled CUDA extension for CUDA tensors, so with everything
+# on the CPU it runs from the source tree without the extension.
+print("[Wrapper] Setting up CPU Nvdiffrast...")
 
-class MockContext:
-    def __init__(self, *args, **kwargs):
-        pass
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "nvdiffrast"))
+import nvdiffrast.torch as dr
 
-def mock_rasterize(*args, **kwargs):
-    # Return dummy tensors compatible with what expected
-    # Usually: rast, rast_db
-    # Shape logic might be needed if strict checking, but let's try generic
-    return torch.zeros(1), torch.zeros(1)
-
-def mock_interpolate(*args, **kwargs):
-    return torch.zeros(1), torch.zeros(1)
-
-def mock_antialias(*args, **kwargs):
-    return torch.zeros(1)
-
-# Create Mock Module
-mock_nvdiffrast = MagicMock()
-mock_nvdiffrast.RasterizeGLContext = MockContext
-
-mock_torch = MagicMock()
-mock_torch.rasterize = mock_rasterize
-mock_torch.interpolate = mock_interpolate
-mock_torch.antialias = mock_antialias
-
-sys.modules["nvdiffrast"] = mock_nvdiffrast
-sys.modules["nvdiffrast.torch"] = mock_torch
-
-print("[Wrapper] Nvdiffrast mocked successfully.")
+print(f"[Wrapper] Nvdiffrast loaded from {os.path.dirname(dr.__file__)}.")
 
 # --- 2. FORCE CPU ---
 # Hook torch.cuda.is_available to always return False inside this process
@@ -53,34 +32,699 @@ instant_mesh_root = os.path.join(current_dir, "InstantMesh")
 if instant_mesh_root not in sys.path:
     sys.path.insert(0, instant_mesh_root)
 
+# The project root makes the shared backend helpers (protocol, ...) importable
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from backend.protocol import encode_message
+from backend.instrumentation import ProgressReporter, release_memory, rss_mb
+from backend.manifest import MANIFEST_FILE, write_manifest
+from backend.checkpoint import load_state_dict, assign_state_dict
+
 # Change working directory so InstantMesh finds its configs
+# (CLI paths are resolved against the directory we were launched from)
+launch_dir = os.getcwd()
 os.chdir(instant_mesh_root)
 
-# CLI Parser to match run.py expectation or forward args
-# run.py usage: python run.py configs/instant-mesh-large.yaml examples/hatsune_miku.png --output_path output/
+
+def emit(event, **fields):
+    """Writes a protocol message for the parent process."""
+    print(encode_message(event, **fields), flush=True)
+
+
+# --- 4. INSTANTMESH ENGINE ---
+# Same steps as InstantMesh's run.py, but split into a one-time load and a
+# per-image generate() so the models can stay resident between jobs.
+
+def get_render_cameras(batch_size=1, M=120, radius=4.0, elevation=20.0, is_flexicubes=False):
+    """Camera parameters for the turntable video (copied from run.py)."""
+    from src.utils.camera_util import FOV_to_intrinsics, get_circular_camera_poses
+
+    c2ws = get_circular_camera_poses(M=M, radius=radius, elevation=elevation)
+    if is_flexicubes:
+        cameras = torch.linalg.inv(c2ws)
+        cameras = cameras.unsqueeze(0).repeat(batch_size, 1, 1, 1)
+    else:
+        extrinsics = c2ws.flatten(-2)
+        intrinsics = FOV_to_intrinsics(30.0).unsqueeze(0).repeat(M, 1, 1).float().flatten(-2)
+        cameras = torch.cat([extrinsics, intrinsics], dim=-1)
+        cameras = cameras.unsqueeze(0).repeat(batch_size, 1, 1)
+    return cameras
+
+
+def render_frames(model, planes, render_cameras, render_size=512, chunk_size=1, is_flexicubes=False,
+                  on_progress=None):
+    """Renders turntable frames from triplanes (copied from run.py, plus on_progress(fraction))."""
+    frames = []
+    num_frames = render_cameras.shape[1]
+    for i in range(0, render_cameras.shape[1], chunk_size):
+        if is_flexicubes:
+            frame = model.forward_geometry(
+                planes,
+                render_cameras[:, i:i+chunk_size],
+                render_size=render_size,
+            )['img']
+        else:
+            frame = model.forward_synthesizer(
+                planes,
+                render_cameras[:, i:i+chunk_size],
+                render_size=render_size,
+            )['images_rgb']
+        frames.append(frame)
+        if on_progress:
+            on_progress(min(i + chunk_size, num_frames) / num_frames)
+
+    frames = torch.cat(frames, dim=1)[0]    # batch size is always 1
+    return frames
+
+
+class ChunkedPointwise(torch.nn.Module):
+    """
+    Runs a per-point module (an MLP over the last dimension) on slices of
+    at most chunk_size points, so its hidden activations never exist for the
+    whole grid at once. Results are identical to the unchunked module.
+    """
+
+    def __init__(self, module, chunk_size=None):
+        super().__init__()
+        self.module = module
+        self.chunk_size = chunk_size
+
+    def forward(self, x):
+        if not self.chunk_size or x.dim() < 2 or x.shape[-2] <= self.chunk_size:
+            return self.module(x)
+        return torch.cat([self.module(chunk) for chunk in x.split(self.chunk_size, dim=-2)], dim=-2)
+
+
+# Model needed by each stage; in low-memory mode only that one stays loaded
+STAGE_MODELS = {
+    "segment": None,
+    "multiview": "pipeline",
+    "reconstruct": "model",
+    "mesh": "model",
+    "export": "model",
+}
+GEOMETRY_DECODER_NETS = ("net_sdf", "net_deformation", "net_weight", "net_rgb")
+GEOMETRY_CHUNK_POINTS = 65536           # Low-memory mode without a budget
+RENDER_CHUNK_VIEWS = 20                 # Views per FlexiCubes render call in normal mode
+
+# With a memory budget, chunks are sized from the headroom between the budget
+# and the RSS once the stage's model is loaded. One chunk gets HEADROOM_SHARE
+# of it; the rest covers the stage's other tensors and allocator slack.
+HEADROOM_SHARE = 0.5
+GEOMETRY_MIN_CHUNK_POINTS = 4096
+GEOMETRY_MAX_CHUNK_POINTS = 1 << 20
+RENDER_BYTES_PER_PIXEL = 2048           # Rough working set of one rendered view per pixel (rasterizer, features, FlexiCubes)
+CHUNKED_STAGES = ("mesh", "export")     # Stages whose peak depends on the chunk sizes
+BUDGET_RETRIES = 2                      # Re-runs with halved chunks after a chunked stage exceeds the budget
+KEEP_MEMORY_MODE = object()             # run_stage(memory=...) default: stay in the current mode
+
+
+class MemoryBudgetExceeded(RuntimeError):
+    """A stage needs more memory than the budget allows."""
+
+
+def _pointwise_bytes(net):
+    """Activation bytes per point of a per-point MLP: every layer output and its activation."""
+    params = list(net.parameters())
+    element_size = params[0].element_size() if params else 4
+    widths = [m.out_features for m in net.modules() if isinstance(m, torch.nn.Linear)]
+    return 2 * element_size * max(sum(widths), 1)
+
+
+def _floor_pow2(x):
+    return 1 << (max(int(x), 1).bit_length() - 1)
+
+
+class InstantMeshEngine:
+    """
+    Holds the zero123plus diffusion pipeline and the reconstruction model.
+
+    Loading both is the expensive part of run.py; generate() only runs
+    inference, so a warm engine can serve many jobs back to back.
+
+    In low-memory mode (a stage request carrying "memory", or a worker
+    started with --memory_budget_gb) the weights are kept in bfloat16
+    (float16 on CUDA), only the model the current stage needs is loaded
+    (diffusion for multiview, reconstruction for the rest), and the
+    triplane geometry decoder and FlexiCubes renders run in chunks. With a
+    budget, the chunks are sized from the memory left once the model is
+    loaded, and a stage whose peak RSS still exceeds the budget is re-run
+    with smaller chunks or fails with MemoryBudgetExceeded.
+    """
+
+    def __init__(self, config_path, device="cpu", memory_budget_gb=None):
+        from omegaconf import OmegaConf
+
+        self.device = torch.device(device)
+        config = OmegaConf.load(config_path)
+        self.config_name = os.path.basename(config_path).replace('.yaml', '')
+        self.model_config = config.model_config
+        self.infer_config = config.infer_config
+        self.is_flexicubes = self.config_name.startswith('instant-mesh')
+        self.rembg_session = None
+        self.progress = None      # ProgressReporter of the running stage
+        self.last_timing = None   # Final StageRecorder snapshot of the last stage
+
+        self.memory_budget_gb = memory_budget_gb
+        self.low_memory = memory_budget_gb is not None
+        self.memory_plan = None   # Chunk sizes of the running stage, see _plan_memory()
+        self.pipeline = None
+        self.model = None
+        if not self.low_memory:
+            # Warm start: both models stay resident between jobs
+            self.pipeline = self._load_diffusion_pipeline()
+            self.model = self._load_reconstruction_model()
+
+    @property
+    def dtype(self):
+        """Weight dtype of the current mode."""
+        if self.low_memory:
+            return torch.float16 if self.device.type == "cuda" else torch.bfloat16
+        return None # Defaults: fp16 diffusion on CUDA, fp32 otherwise
+
+    def configure_memory(self, memory):
+        """
+        Switches between normal and low-memory mode for the next stage.
+
+        Args:
+            memory (dict | None): {"budget_gb": float | None} selects low-memory
+                                  mode, None the normal (all resident) mode,
+                                  KEEP_MEMORY_MODE leaves the mode and budget
+                                  as they are (e.g. as set by --memory_budget_gb).
+        """
+        if memory is KEEP_MEMORY_MODE:
+            return
+        low_memory = memory is not None
+        if low_memory != self.low_memory:
+            print(f"[Wrapper] Switching to {'low-memory' if low_memory else 'normal'} mode")
+            # Weights were loaded in the other mode's dtype
+            self.pipeline = None
+            self.model = None
+            release_memory()
+            self.low_memory = low_memory
+        self.memory_budget_gb = (memory or {}).get("budget_gb")
+
+    def _ensure_models(self, stage):
+        """Loads what the stage needs; in low-memory mode frees everything else first."""
+        needed = STAGE_MODELS.get(stage)
+        if self.low_memory:
+            for attr in ("pipeline", "model"):
+                if attr != needed and getattr(self, attr) is not None:
+                    print(f"[Wrapper] Releasing {attr} to stay within the memory budget")
+                    setattr(self, attr, None)
+            release_memory()
+        if needed == "pipeline" and self.pipeline is None:
+            self.pipeline = self._load_diffusion_pipeline()
+        elif needed == "model" and self.model is None:
+            self.model = self._load_reconstruction_model()
+
+    def _precision(self):
+        """Autocast for low-memory mode, so fp32 inputs meet low-precision weights."""
+        import contextlib
+
+        if not self.low_memory:
+            return contextlib.nullcontext()
+        return torch.autocast(device_type=self.device.type, dtype=self.dtype)
+
+    def _load_diffusion_pipeline(self):
+        from diffusers import DiffusionPipeline, EulerAncestralDiscreteScheduler
+        from huggingface_hub import hf_hub_download
+
+        print("[Wrapper] Loading diffusion model ...")
+        # Half precision is only worth it (and only fully supported) on CUDA,
+        # except in low-memory mode, which uses bfloat16 on CPU
+        dtype = self.dtype or (torch.float16 if self.device.type == "cuda" else torch.float32)
+        pipeline = DiffusionPipeline.from_pretrained(
+            "sudo-ai/zero123plus-v1.2",
+            custom_pipeline="zero123plus",
+            torch_dtype=dtype,
+        )
+        pipeline.scheduler = EulerAncestralDiscreteScheduler.from_config(
+            pipeline.scheduler.config, timestep_spacing='trailing'
+        )
+
+        print("[Wrapper] Loading custom white-background unet ...")
+        if os.path.exists(self.infer_config.unet_path):
+            unet_ckpt_path = self.infer_config.unet_path
+        else:
+            unet_ckpt_path = hf_hub_download(repo_id="TencentARC/InstantMesh", filename="diffusion_pytorch_model.bin", repo_type="model")
+        state_dict = load_state_dict(unet_ckpt_path, name="zero123plus_unet")
+        assign_state_dict(pipeline.unet, state_dict, strict=True)
+
+        return pipeline.to(self.device)
+
+    def _load_reconstruction_model(self):
+        from huggingface_hub import hf_hub_download
+        from src.utils.train_util import instantiate_from_config
+
+        print("[Wrapper] Loading reconstruction model ...")
+        model = instantiate_from_config(self.model_config)
+        if os.path.exists(self.infer_config.model_path):
+            model_ckpt_path = self.infer_config.model_path
+        else:
+            model_ckpt_path = hf_hub_download(repo_id="TencentARC/InstantMesh", filename=f"{self.config_name.replace('-', '_')}.ckpt", repo_type="model")
+        # Memory-mapped from a one-time converted copy (see backend/checkpoint.py)
+        state_dict = load_state_dict(model_ckpt_path, key='state_dict', prefix='lrm_generator.')
+        assign_state_dict(model, state_dict, strict=True)
+        del state_dict
+
+        model = model.to(self.device, dtype=self.dtype) if self.dtype else model.to(self.device)
+        if self.is_flexicubes:
+            model.init_flexicubes_geometry(self.device, fovy=30.0)
+        self._chunk_geometry_decoder(model)
+        release_memory() # Drops the fp32 copies after a dtype conversion
+        return model.eval()
+
+    @staticmethod
+    def _chunk_geometry_decoder(model):
+        """Wraps the triplane decoder's per-point MLPs in ChunkedPointwise; _plan_memory() sets their chunk size."""
+        decoder = getattr(getattr(model, "synthesizer", None), "decoder", None)
+        if decoder is None:
+            print("[Wrapper] No triplane decoder found, geometry is decoded in one pass")
+            return
+        for net_name in GEOMETRY_DECODER_NETS:
+            net = getattr(decoder, net_name, None)
+            if net is not None:
+                setattr(decoder, net_name, ChunkedPointwise(net))
+
+    def _geometry_nets(self):
+        decoder = getattr(getattr(self.model, "synthesizer", None), "decoder", None)
+        nets = (getattr(decoder, net_name, None) for net_name in GEOMETRY_DECODER_NETS)
+        return [net for net in nets if isinstance(net, ChunkedPointwise)]
+
+    def _plan_memory(self, stage, scale=1.0):
+        """
+        Sizes the geometry decoder and render chunks for the stage and applies them.
+
+        Normal mode decodes in one pass; low-memory mode without a budget uses
+        the fixed low-memory chunks. With a budget, the headroom is the budget
+        minus the RSS measured now, after the stage's model is loaded, and
+        scale (halved on every retry) shrinks the share given to one chunk.
+
+        Returns:
+            dict: The plan, also kept as self.memory_plan.
+        """
+        nets = self._geometry_nets()
+        plan = {"budget_gb": self.memory_budget_gb}
+        if not self.low_memory:
+            plan.update(geometry_chunk_points=None, render_chunk_views=RENDER_CHUNK_VIEWS)
+        elif self.memory_budget_gb is None:
+            plan.update(geometry_chunk_points=GEOMETRY_CHUNK_POINTS, render_chunk_views=1)
+        else:
+            rss = rss_mb()
+            budget_mb = self.memory_budget_gb * 1024
+            if rss is not None and rss >= budget_mb:
+                raise MemoryBudgetExceeded(
+                    f"Stage {stage} needs {rss / 1024:.2f} GB with its model loaded, "
+                    f"over the {self.memory_budget_gb:.2f} GB memory budget")
+            # Without an RSS reading (non-Linux) the whole budget counts as headroom
+            headroom = (budget_mb - (rss or 0.0)) * 1024 * 1024 * HEADROOM_SHARE * scale
+            point_bytes = max((_pointwise_bytes(net.module) for net in nets), default=1)
+            points = _floor_pow2(headroom / point_bytes)
+            view_bytes = self.infer_config.render_resolution ** 2 * RENDER_BYTES_PER_PIXEL
+            plan.update(
+                rss_mb=round(rss, 1) if rss is not None else None,
+                headroom_mb=round(budget_mb - (rss or 0.0), 1),
+                geometry_chunk_points=min(max(points, GEOMETRY_MIN_CHUNK_POINTS), GEOMETRY_MAX_CHUNK_POINTS),
+                render_chunk_views=int(min(max(headroom // view_bytes, 1), RENDER_CHUNK_VIEWS)),
+            )
+        for net in nets:
+            net.chunk_size = plan["geometry_chunk_points"]
+        self.memory_plan = plan
+        return plan
+
+    def _check_budget(self, stage, timing, recorder):
+        """Raises MemoryBudgetExceeded if the stage's measured peak RSS exceeds the budget."""
+        peak = timing.get("peak_rss_mb")
+        if self.memory_budget_gb is None or peak is None:
+            return
+        if not recorder.peak_is_stage:
+            print("[Wrapper] Peak RSS cannot be reset on this platform, the budget is not checked")
+            return
+        if peak > self.memory_budget_gb * 1024:
+            raise MemoryBudgetExceeded(
+                f"Stage {stage} peaked at {peak / 1024:.2f} GB RSS, over the "
+                f"{self.memory_budget_gb:.2f} GB memory budget (geometry chunk "
+                f"{self.memory_plan.get('geometry_chunk_points')} points, "
+                f"{self.memory_plan.get('render_chunk_views')} views per render)")
+
+    def run_stage(self, stage, output_dir, inputs, params, name="mesh", memory=KEEP_MEMORY_MODE):
+        """
+        Runs one pipeline stage (see backend/stages.py) and returns its outputs.
+
+        Inputs are artifact paths produced by earlier stages, params are the
+        generation options that affect this stage. Artifacts are written to
+        output_dir, together with a manifest.json listing their exact paths,
+        sizes and hashes; the stage only counts as complete once it exists.
+        memory selects the low-memory mode (see configure_memory); left out,
+        the engine stays in its current mode. With a memory budget, a chunked
+        stage whose peak RSS exceeds it is re-run up to BUDGET_RETRIES times
+        with halved chunks; any other overrun raises MemoryBudgetExceeded.
+        """
+        handler = getattr(self, f"stage_{stage}", None)
+        if handler is None:
+            raise ValueError(f"Unknown stage: {stage}")
+        os.makedirs(output_dir, exist_ok=True)
+        print(f"[Wrapper] Stage {stage} ...")
+
+        self.configure_memory(memory)
+        retries = BUDGET_RETRIES if stage in CHUNKED_STAGES else 0
+        scale = 1.0
+        for attempt in range(retries + 1):
+            if self.low_memory:
+                release_memory() # So the previous stage's (or attempt's) garbage is not counted here
+            # The reporter's StageRecorder measures from here: wall/CPU time, peak RSS, allocator
+            self.progress = ProgressReporter(stage, lambda **fields: emit("progress", **fields))
+            self.progress.report(0.0, force=True)
+            recorder = self.progress.recorder
+            try:
+                self._ensure_models(stage)
+                plan = self._plan_memory(stage, scale)
+                if self.low_memory:
+                    budget = f"{plan['budget_gb'] * 1024:.0f} MB" if plan["budget_gb"] else "none"
+                    print(f"[Wrapper] Stage {stage} memory plan: budget {budget}, "
+                          f"geometry chunk {plan['geometry_chunk_points']} points, "
+                          f"{plan['render_chunk_views']} views per render")
+                with self._precision():
+                    outputs = handler(output_dir, name=name, **inputs, **params)
+            finally:
+                self.last_timing = self.progress.snapshot(detailed=True)
+                self.progress = None
+            self.last_timing["memory_plan"] = plan
+            try:
+                self._check_budget(stage, self.last_timing, recorder)
+                break
+            except MemoryBudgetExceeded as e:
+                smallest = ((plan["geometry_chunk_points"] or 0) <= GEOMETRY_MIN_CHUNK_POINTS
+                            and plan["render_chunk_views"] <= 1)
+                if attempt == retries or smallest:
+                    raise
+                print(f"[Wrapper] {e}; retrying with smaller chunks")
+                scale /= 2
+        self.last_timing["fraction"] = 1.0
+        emit("progress", **self.last_timing)
+
+        write_manifest(output_dir, outputs, stage=stage, name=name, params=params,
+                       inputs=inputs, timing=self.last_timing)
+        return outputs
+
+    def report(self, fraction):
+        """Reports progress (0..1) of the running stage to the parent."""
+        if self.progress is not None:
+            self.progress.report(fraction)
+
+    def _diffusion_callback_kwargs(self, num_steps):
+        """Per-step progress hook, in whichever form the installed diffusers accepts."""
+        import diffusers
+        from packaging.version import Version
+
+        if Version(diffusers.__version__) >= Version("0.22"):
+            def on_step_end(pipe, step, timestep, callback_kwargs):
+                self.report((step + 1) / num_steps)
+                return callback_kwargs
+            return {"callback_on_step_end": on_step_end}
+
+        def on_step(step, timestep, latents):
+            self.report((step + 1) / num_steps)
+        return {"callback": on_step, "callback_steps": 1}
+
+    def stage_segment(self, output_dir, input_path, no_rembg=False, name="mesh"):
+        from PIL import Image
+        from src.utils.infer_util import remove_background, resize_foreground
+
+        input_image = Image.open(input_path)
+        if not no_rembg:
+            if self.rembg_session is None:
+                import rembg
+                self.rembg_session = rembg.new_session()
+                self.report(0.5)
+            input_image = remove_background(input_image, self.rembg_session)
+            input_image = resize_foreground(input_image, 0.85)
+
+        image_path = os.path.join(output_dir, "segmented.png")
+        input_image.save(image_path)
+        return {"image": image_path}
+
+    def stage_multiview(self, output_dir, image, diffusion_steps=75, seed=42, name="mesh"):
+        from PIL import Image
+        from pytorch_lightning import seed_everything
+
+        seed_everything(seed)
+        output_image = self.pipeline(
+            Image.open(image),
+            num_inference_steps=diffusion_steps,
+            **self._diffusion_callback_kwargs(diffusion_steps),
+        ).images[0]
+
+        grid_path = os.path.join(output_dir, "multiview.png")
+        output_image.save(grid_path)
+        print(f"[Wrapper] Image saved to {grid_path}")
+        return {"grid": grid_path}
+
+    def stage_reconstruct(self, output_dir, grid, scale=1.0, view=6, name="mesh"):
+        import numpy as np
+        from PIL import Image
+        from einops import rearrange
+        from torchvision.transforms import v2
+        from src.utils.camera_util import get_zero123plus_input_cameras
+
+        images = np.asarray(Image.open(grid), dtype=np.float32) / 255.0
+        images = torch.from_numpy(images).permute(2, 0, 1).contiguous().float()     # (3, 960, 640)
+        images = rearrange(images, 'c (n h) (m w) -> (n m) c h w', n=3, m=2)        # (6, 3, 320, 320)
+
+        input_cameras = get_zero123plus_input_cameras(batch_size=1, radius=4.0*scale).to(self.device)
+        images = images.unsqueeze(0).to(self.device)
+        images = v2.functional.resize(images, 320, interpolation=3, antialias=True).clamp(0, 1)
+
+        if view == 4:
+            indices = torch.tensor([0, 2, 4, 5]).long().to(self.device)
+            images = images[:, indices]
+            input_cameras = input_cameras[:, indices]
+
+        with torch.no_grad():
+            planes = self.model.forward_planes(images, input_cameras)
+
+        planes_path = os.path.join(output_dir, "planes.pt")
+        torch.save(planes.float().cpu(), planes_path) # fp32 on disk whatever the compute dtype
+        return {"planes": planes_path}
+
+    def stage_mesh(self, output_dir, planes, export_texmap=False, name="mesh"):
+        from src.utils.mesh_util import save_obj, save_obj_with_mtl
+
+        planes = torch.load(planes, map_location=self.device)
+        mesh_path = os.path.join(output_dir, f"{name}.obj")
+
+        with torch.no_grad():
+            mesh_out = self.model.extract_mesh(
+                planes,
+                use_texture_map=export_texmap,
+                **self.infer_config,
+            )
+        if export_texmap:
+            vertices, faces, uvs, mesh_tex_idx, tex_map = mesh_out
+            save_obj_with_mtl(
+                vertices.data.cpu().numpy(),
+                uvs.data.cpu().numpy(),
+                faces.data.cpu().numpy(),
+                mesh_tex_idx.data.cpu().numpy(),
+                tex_map.permute(1, 2, 0).data.cpu().numpy(),
+                mesh_path,
+            )
+        else:
+            vertices, faces, vertex_colors = mesh_out
+            save_obj(vertices, faces, vertex_colors, mesh_path)
+        print(f"[Wrapper] Mesh saved to {mesh_path}")
+        return {"mesh": mesh_path}
+
+    def stage_export(self, output_dir, planes, save_video=False, distance=4.5, name="mesh"):
+        from src.utils.infer_util import save_video as write_video
+
+        if not save_video:
+            return {}
+
+        planes = torch.load(planes, map_location=self.device)
+        video_path = os.path.join(output_dir, f"{name}.mp4")
+        render_cameras = get_render_cameras(
+            batch_size=1,
+            M=120,
+            radius=distance,
+            elevation=20.0,
+            is_flexicubes=self.is_flexicubes,
+        ).to(self.device)
+
+        with torch.no_grad():
+            frames = render_frames(
+                self.model,
+                planes,
+                render_cameras=render_cameras,
+                render_size=self.infer_config.render_resolution,
+                chunk_size=self.memory_plan["render_chunk_views"] if self.is_flexicubes else 1,
+                is_flexicubes=self.is_flexicubes,
+                on_progress=lambda fraction: self.report(0.9 * fraction),
+            )
+        write_video(frames, video_path, fps=30)
+        print(f"[Wrapper] Video saved to {video_path}")
+        hashes = dr.get_topology_hash_cache_stats()
+        print(f"[Wrapper] Antialias topology hashes: {hashes['hits']} reused, {hashes['misses']} built")
+        return {"video": video_path}
+
+    def generate(self, input_path, output_path, **options):
+        """
+        Runs every stage for a single input, like run.py does.
+
+        Intermediates and results are written to output_path/<name>/.
+
+        Returns:
+            dict: Outputs of all stages merged together.
+        """
+        from backend.stages import STAGES, DEFAULT_OPTIONS, stage_input_names
+
+        options = dict(DEFAULT_OPTIONS, **options)
+        name = os.path.basename(input_path).split('.')[0]
+        output_dir = os.path.join(output_path, name)
+
+        outputs = {"input_path": input_path}
+        for stage in STAGES:
+            inputs = {k: outputs[k] for k in stage_input_names(stage)}
+            params = {p: options[p] for p in stage.params}
+            outputs.update(self.run_stage(stage.name, output_dir, inputs, params, name=name))
+        outputs.pop("input_path")
+
+        # All stages share output_dir here, so replace the last stage's manifest with one for the whole run
+        write_manifest(output_dir, outputs, name=name, options=options, input_path=input_path)
+        return outputs
+
+
+def apply_thread_budget(num_threads=None, interop_threads=None, cpus=None):
+    """
+    Confines this process to its share of the machine (see backend/worker.py
+    plan_thread_budgets), so parallel workers do not oversubscribe the cores.
+    Must run before the first torch operation.
+    """
+    if cpus and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, cpus)
+        except OSError as e:
+            print(f"[Wrapper] Could not pin to CPUs {cpus}: {e}")
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as e: # Only allowed once, before any inter-op work
+            print(f"[Wrapper] Could not set inter-op threads: {e}")
+    print(f"[Wrapper] Threads: intra-op {torch.get_num_threads()}, inter-op {torch.get_num_interop_threads()}"
+          + (f", CPUs {cpus}" if cpus else ""))
+
+
+def parse_cpu_list(value):
+    """Parses "0-3,8,10-11" into [0, 1, 2, 3, 8, 10, 11]."""
+    cpus = []
+    for part in value.split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            cpus.extend(range(int(first), int(last) + 1))
+        elif part:
+            cpus.append(int(part))
+    return cpus
+
+
+# --- 5. SERVE MODE ---
+# The parent (backend/worker.py) writes one JSON stage request per line to
+# stdin and waits for the matching "done"/"error" message. EOF or a "shutdown" command
+# ends the loop, so the worker never outlives the app.
+
+def serve(engine):
+    emit("ready", config=engine.config_name, pid=os.getpid())
+    while True:
+        line = sys.stdin.readline()
+        if not line:
+            break
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            request = json.loads(line)
+        except ValueError:
+            emit("error", id=None, message=f"Malformed request: {line[:200]}")
+            continue
+
+        if request.get("command") == "shutdown":
+            break
+
+        job_id = request.get("id")
+        try:
+            outputs = engine.run_stage(
+                request["stage"],
+                request["output_dir"],
+                request.get("inputs", {}),
+                request.get("params", {}),
+                name=request.get("name", "mesh"),
+                memory=request.get("memory", KEEP_MEMORY_MODE), # null switches back to normal mode
+            )
+            emit("done", id=job_id, outputs=outputs, timing=engine.last_timing,
+                 manifest=os.path.join(request["output_dir"], MANIFEST_FILE))
+        except Exception as e:
+            print(f"[Wrapper] Error running InstantMesh: {e}")
+            traceback.print_exc()
+            emit("error", id=job_id, message=str(e))
+
+    print("[Wrapper] Worker shutting down.")
+
+
+# CLI mirrors run.py so the wrapper can still be invoked exactly like it:
+# python instantmesh_wrapper.py configs/instant-mesh-large.yaml input.png --output_path output/
 if __name__ == "__main__":
-    # Remove the wrapper script name from argv so run.py sees correct args
-    # We expect this script to be called exactly like run.py: with config and image args
-    
-    # Argv[0] is this script. 
-    # run.py expects args start from index 1. 
-    # So we can just invoke run.py main block inside this env.
-    
+    parser = argparse.ArgumentParser()
+    parser.add_argument('config', type=str, help='Path to config file (relative to InstantMesh).')
+    parser.add_argument('input_path', type=str, nargs='?', help='Path to input image (one-shot mode).')
+    parser.add_argument('--output_path', type=str, default='outputs/', help='Output directory.')
+    parser.add_argument('--diffusion_steps', type=int, default=75, help='Denoising Sampling steps.')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for sampling.')
+    parser.add_argument('--scale', type=float, default=1.0, help='Scale of generated object.')
+    parser.add_argument('--distance', type=float, default=4.5, help='Render distance.')
+    parser.add_argument('--view', type=int, default=6, choices=[4, 6], help='Number of input views.')
+    parser.add_argument('--no_rembg', action='store_true', help='Do not remove input background.')
+    parser.add_argument('--export_texmap', action='store_true', help='Export a mesh with texture map.')
+    parser.add_argument('--save_video', action='store_true', help='Save a circular-view video.')
+    parser.add_argument('--serve', action='store_true', help='Keep the models loaded and read jobs from stdin.')
+    parser.add_argument('--num_threads', type=int, default=None, help='Intra-op torch threads (default: all cores).')
+    parser.add_argument('--interop_threads', type=int, default=None, help='Inter-op torch threads.')
+    parser.add_argument('--cpus', type=parse_cpu_list, default=None, help='Pin to these CPUs, e.g. "0-7,16".')
+    parser.add_argument('--memory_budget_gb', type=float, default=None,
+                        help='Start in low-memory mode (bf16 weights, one model resident at a time).')
+    args = parser.parse_args()
+
+    if not args.serve and not args.input_path:
+        parser.error("input_path is required unless --serve is given")
+
     try:
-        print(f"[Wrapper] Importing run.py logic from {instant_mesh_root}")
-        
-        # Method: Use runpy to execute the script in this process standardly
-        import runpy
-        
-        # We need to ensure 'run' module is found if we use run_module, 
-        # but since run.py is a script, we use run_path.
-        run_path_target = "run.py"
-        
-        # Execute it!
-        runpy.run_path(run_path_target, run_name="__main__")
-        
+        apply_thread_budget(args.num_threads, args.interop_threads, args.cpus)
+        print(f"[Wrapper] Loading InstantMesh from {instant_mesh_root}")
+        engine = InstantMeshEngine(args.config, memory_budget_gb=args.memory_budget_gb)
+
+        if args.serve:
+            serve(engine)
+        else:
+            outputs = engine.generate(
+                os.path.join(launch_dir, args.input_path),
+                os.path.join(launch_dir, args.output_path),
+                diffusion_steps=args.diffusion_steps,
+                seed=args.seed,
+                scale=args.scale,
+                distance=args.distance,
+                view=args.view,
+                no_rembg=args.no_rembg,
+                export_texmap=args.export_texmap,
+                save_video=args.save_video,
+            )
+            emit("done", id=None, outputs=outputs)
+
     except Exception as e:
         print(f"[Wrapper] Error running InstantMesh: {e}")
-        import traceback
         traceback.print_exc()
+        emit("error", id=None, message=str(e))
         sys.exit(1)
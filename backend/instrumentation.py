@@ -0,0 +1,225 @@
+"""
+Lightweight measurements shared by the wrapper and the pipeline.
+
+Kept free of torch/Qt imports so it can be loaded anywhere; torch allocator
+statistics are only read if the process has already imported torch.
+"""
+import os
+import re
+import gc
+import sys
+import json
+import ctypes
+import time
+import threading
+
+STAGE_TIMINGS_PATH = os.path.join("logs", "stage_timings.jsonl")
+STAGE_STATS_FILE = "stage_stats.json" # Written next to every published mesh
+
+_append_lock = threading.Lock()
+
+
+def _proc_status_kb(field):
+    """Reads a "<field>: <n> kB" line from /proc/self/status (Linux only)."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            match = re.search(rf"^{field}:\s+(\d+)\s+kB", f.read(), re.MULTILINE)
+    except OSError:
+        return None
+    return int(match.group(1)) if match else None
+
+
+def reset_peak_rss():
+    """
+    Restarts peak RSS tracking for this process, so peak_rss_mb() reports the
+    peak of the following section only. Linux only; returns False elsewhere,
+    in which case peak_rss_mb() keeps reporting the lifetime peak.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None if unknown."""
+    hwm = _proc_status_kb("VmHWM")
+    if hwm is not None:
+        return hwm / 1024
+
+    try:
+        import resource
+    except ImportError:
+        return None # Windows
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kB everywhere else
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def rss_mb():
+    """Current resident set size of this process in MB, or None if unknown."""
+    rss = _proc_status_kb("VmRSS")
+    return rss / 1024 if rss is not None else None
+
+
+def reset_torch_peak_stats():
+    """Restarts the torch allocator's peak counters (CUDA only, if in use)."""
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available() and torch.cuda.is_initialized():
+        torch.cuda.reset_peak_memory_stats()
+
+
+def torch_memory_stats():
+    """
+    Allocator statistics of the torch backend in use, in MB, or None.
+
+    CUDA reports allocated/reserved memory and their peaks since the last
+    reset_torch_peak_stats(), MPS the current allocations. The CPU allocator
+    keeps no statistics; peak RSS is the measure there, so only the thread
+    count is reported.
+    """
+    torch = sys.modules.get("torch")
+    if torch is None:
+        return None
+    mb = 1024 * 1024
+    if torch.cuda.is_available() and torch.cuda.is_initialized():
+        return {
+            "device": "cuda",
+            "allocated_mb": round(torch.cuda.memory_allocated() / mb, 1),
+            "reserved_mb": round(torch.cuda.memory_reserved() / mb, 1),
+            "peak_allocated_mb": round(torch.cuda.max_memory_allocated() / mb, 1),
+            "peak_reserved_mb": round(torch.cuda.max_memory_reserved() / mb, 1),
+        }
+    mps = getattr(torch, "mps", None)
+    if mps is not None and hasattr(mps, "current_allocated_memory") and torch.backends.mps.is_available():
+        return {
+            "device": "mps",
+            "allocated_mb": round(mps.current_allocated_memory() / mb, 1),
+            "driver_allocated_mb": round(mps.driver_allocated_memory() / mb, 1),
+        }
+    return {"device": "cpu", "num_threads": torch.get_num_threads()}
+
+
+class StageRecorder:
+    """
+    Measures one stage of this process: wall time, process CPU time (all
+    threads), peak RSS and, in detailed snapshots, torch allocator stats.
+    """
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.start()
+
+    def start(self):
+        # peak_rss_mb then covers this stage only; otherwise it is the process lifetime peak
+        self.peak_is_stage = reset_peak_rss()
+        reset_torch_peak_stats()
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+
+    def elapsed(self):
+        return time.perf_counter() - self.wall_start
+
+    def snapshot(self, detailed=False):
+        """
+        Measurements so far. Cheap enough for every progress event; detailed
+        adds current RSS and torch allocator stats for the final record.
+        """
+        elapsed = self.elapsed()
+        cpu_time = time.process_time() - self.cpu_start
+        peak = peak_rss_mb()
+        record = {
+            "stage": self.stage,
+            "elapsed": round(elapsed, 3),
+            "cpu_time": round(cpu_time, 3),
+            "peak_rss_mb": round(peak, 1) if peak is not None else None,
+        }
+        if detailed:
+            rss = rss_mb()
+            record["cpu_utilization"] = round(cpu_time / elapsed, 2) if elapsed > 0 else None
+            record["rss_mb"] = round(rss, 1) if rss is not None else None
+            record["torch"] = torch_memory_stats()
+        return record
+
+
+def format_stage_stats(record):
+    """One log line for a StageRecorder snapshot, e.g. "12.3s wall, 80.1s CPU (6.5 cores), peak RSS 4100 MB"."""
+    parts = [f"{record['elapsed']:.2f}s wall"]
+    if record.get("cpu_time") is not None:
+        cores = record["cpu_time"] / record["elapsed"] if record["elapsed"] else 0.0
+        parts.append(f"{record['cpu_time']:.2f}s CPU ({cores:.1f} cores)")
+    if record.get("peak_rss_mb") is not None:
+        parts.append(f"peak RSS {record['peak_rss_mb']:.0f} MB")
+    torch_stats = record.get("torch") or {}
+    if torch_stats.get("peak_allocated_mb") is not None:
+        parts.append(f"{torch_stats['device']} peak {torch_stats['peak_allocated_mb']:.0f} MB "
+                     f"(reserved {torch_stats['peak_reserved_mb']:.0f} MB)")
+    elif torch_stats.get("allocated_mb") is not None:
+        parts.append(f"{torch_stats['device']} allocated {torch_stats['allocated_mb']:.0f} MB")
+    return ", ".join(parts)
+
+
+def release_memory():
+    """
+    Collects garbage and asks glibc to return freed heap pages to the OS, so
+    RSS actually drops after large tensors are released (no-op elsewhere).
+    """
+    gc.collect()
+    if sys.platform.startswith("linux"):
+        try:
+            ctypes.CDLL("libc.so.6").malloc_trim(0)
+        except (OSError, AttributeError):
+            pass
+
+
+class ProgressReporter:
+    """
+    Tracks one running stage and turns fractions into progress events.
+
+    Events are throttled to one per min_interval seconds, except for the
+    first and the final one, so per-step callbacks cannot flood the pipe.
+    Creating a reporter starts a StageRecorder for the stage.
+    """
+
+    def __init__(self, stage, send, min_interval=0.2):
+        self.stage = stage
+        self._send = send
+        self._min_interval = min_interval
+        self._last_sent = None
+        self.recorder = StageRecorder(stage)
+        self.fraction = 0.0
+
+    def elapsed(self):
+        return self.recorder.elapsed()
+
+    def report(self, fraction, force=False):
+        self.fraction = min(max(float(fraction), 0.0), 1.0)
+        now = time.perf_counter()
+        if not force and self._last_sent is not None and now - self._last_sent < self._min_interval:
+            return
+        self._last_sent = now
+        self._send(**self.snapshot())
+
+    def snapshot(self, detailed=False):
+        return dict(self.recorder.snapshot(detailed), fraction=round(self.fraction, 4))
+
+
+def append_jsonl(path, record):
+    """Appends one JSON record as a line; safe to call from several threads."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    line = json.dumps(record, sort_keys=True) + "\n"
+    with _append_lock:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+def write_json(path, payload):
+    """Writes payload as indented JSON, atomically."""
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
@@ -0,0 +1,287 @@
+import time
+import uuid
+import heapq
+import threading
+import contextlib
+from dataclasses import dataclass, field, replace
+from typing import Optional
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+def new_job_id():
+    return uuid.uuid4().hex[:12]
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once its cancellation token has been triggered."""
+
+
+class CancellationToken:
+    """
+    Cooperative cancellation flag shared by a running job and its canceller.
+
+    The job polls it between stages (raise_if_cancelled), and registers
+    callbacks with on_cancel() for work that cannot poll, such as killing the
+    worker process in the middle of a stage.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self.cancelled_at = None # time.monotonic() of the cancel request
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.cancelled_at = time.monotonic()
+            self._event.set()
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[Jobs] Cancel callback failed: {e}")
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled("Job cancelled")
+
+    @contextlib.contextmanager
+    def on_cancel(self, callback):
+        """Calls callback if the token is (or already was) cancelled during the with-block."""
+        with self._lock:
+            fire_now = self._event.is_set()
+            if not fire_now:
+                self._callbacks.append(callback)
+        if fire_now:
+            callback()
+        try:
+            yield
+        finally:
+            with self._lock:
+                if callback in self._callbacks:
+                    self._callbacks.remove(callback)
+
+
+@dataclass
+class Job:
+    """One image-to-3D request and its lifecycle."""
+    image_path: str
+    model_name: str = "InstantMesh"
+    low_vram: bool = False
+    prompt: str = ""
+    options: dict = field(default_factory=dict)
+    priority: int = 0                   # Higher runs first
+    output_dir: Optional[str] = None    # Defaults to output/<id>
+    memory_budget_gb: Optional[float] = None  # Low-memory mode with this peak RSS target
+    id: str = field(default_factory=new_job_id)
+    state: str = QUEUED
+    progress: int = 0                   # 0-100
+    status: str = ""                    # Last status / log line
+    result_path: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    cancel_latency: Optional[float] = None  # Seconds from cancel request to idle
+
+    @property
+    def finished(self):
+        return self.state in FINISHED_STATES
+
+
+class JobQueue:
+    """
+    Priority queue of generation jobs with a bounded number running at once.
+
+    run_job(job, update, cancel_token) is called on a background thread for
+    each job and returns the result path; update(progress=None, status=None)
+    may be used to report progress, and the job should stop by raising
+    JobCancelled once cancel_token is triggered. Listeners receive a snapshot
+    of the job after every change.
+    """
+
+    def __init__(self, run_job, concurrency=1):
+        self._run_job = run_job
+        self._concurrency = max(1, int(concurrency))
+        self._lock = threading.Condition()
+        self._heap = []
+        self._counter = 0
+        self._jobs = {}
+        self._tokens = {} # job id -> CancellationToken of running jobs
+        self._running = 0
+        self._listeners = []
+
+    # --- Configuration ---
+
+    @property
+    def concurrency(self):
+        return self._concurrency
+
+    def set_concurrency(self, concurrency):
+        with self._lock:
+            self._concurrency = max(1, int(concurrency))
+            self._start_ready_jobs()
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    # --- Submission & queries ---
+
+    def submit(self, job):
+        """Queues a job and returns its id."""
+        with self._lock:
+            self._jobs[job.id] = job
+            self._counter += 1
+            heapq.heappush(self._heap, (-job.priority, self._counter, job.id))
+            snapshot = replace(job)
+            self._start_ready_jobs()
+        self._notify(snapshot)
+        return job.id
+
+    def get(self, job_id):
+        """Returns a snapshot of the job, or None for unknown ids."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return replace(job) if job else None
+
+    def jobs(self):
+        with self._lock:
+            return [replace(job) for job in self._jobs.values()]
+
+    def counts(self):
+        """Number of jobs per state."""
+        with self._lock:
+            counts = {state: 0 for state in (QUEUED, RUNNING, DONE, FAILED, CANCELLED)}
+            for job in self._jobs.values():
+                counts[job.state] += 1
+            return counts
+
+    def is_busy(self):
+        with self._lock:
+            return self._running > 0 or bool(self._heap)
+
+    def wait(self, timeout=None):
+        """Blocks until no job is queued or running. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while self._running > 0 or self._heap:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._lock.wait(remaining)
+            return True
+
+    # --- Cancellation ---
+
+    def cancel(self, job_id):
+        """
+        Cancels a job. Queued jobs are dropped immediately; running jobs get
+        their cancellation token triggered and turn "cancelled" once they stop.
+        Never blocks the caller.
+        Returns True if the job was queued or running.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return False
+
+            if job.state == RUNNING:
+                token = self._tokens[job_id]
+                # Callbacks may wait for a process to die; keep that off the caller's thread
+                threading.Thread(target=token.cancel, name=f"cancel-{job_id}", daemon=True).start()
+                return True
+
+            self._heap = [entry for entry in self._heap if entry[2] != job_id]
+            heapq.heapify(self._heap)
+            job.state = CANCELLED
+            job.finished_at = time.time()
+            job.cancel_latency = 0.0
+            snapshot = replace(job)
+            self._lock.notify_all()
+        self._notify(snapshot)
+        return True
+
+    def cancel_all(self):
+        """Cancels every queued and running job. Returns the number cancelled."""
+        with self._lock:
+            # Drop the queue first so nothing starts in the slots freed by running jobs
+            pending = [entry[2] for entry in self._heap]
+            running = list(self._tokens)
+        return sum(self.cancel(job_id) for job_id in pending + running)
+
+    # --- Execution ---
+
+    def _start_ready_jobs(self):
+        # Caller holds self._lock
+        while self._heap and self._running < self._concurrency:
+            _, _, job_id = heapq.heappop(self._heap)
+            job = self._jobs[job_id]
+            job.state = RUNNING
+            job.started_at = time.time()
+            self._tokens[job_id] = CancellationToken()
+            self._running += 1
+            threading.Thread(target=self._execute, args=(job,), name=f"job-{job.id}", daemon=True).start()
+
+    def _execute(self, job):
+        self._notify(self.get(job.id))
+
+        def update(progress=None, status=None):
+            with self._lock:
+                if progress is not None:
+                    job.progress = progress
+                if status is not None:
+                    job.status = status
+                snapshot = replace(job)
+            self._notify(snapshot)
+
+        token = self._tokens[job.id]
+        try:
+            result_path = self._run_job(replace(job), update, token)
+            token.raise_if_cancelled()
+            with self._lock:
+                job.state = DONE
+                job.progress = 100
+                job.result_path = result_path
+        except Exception as e:
+            with self._lock:
+                if token.cancelled:
+                    job.state = CANCELLED
+                    job.cancel_latency = time.monotonic() - token.cancelled_at
+                else:
+                    job.state = FAILED
+                    job.error = str(e)
+        finally:
+            with self._lock:
+                job.finished_at = time.time()
+                del self._tokens[job.id]
+                self._running -= 1
+                snapshot = replace(job)
+                self._start_ready_jobs()
+                self._lock.notify_all()
+            self._notify(snapshot)
+
+    def _notify(self, job):
+        for callback in list(self._listeners):
+            try:
+                callback(job)
+            except Exception as e:
+                print(f"[Jobs] Listener failed: {e}")
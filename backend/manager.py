@@ -1,24 +1,17 @@
 import os
 import sys
-import torch
 import gc
-from huggingface_hub import snapshot_download
+import shutil
+import threading
+import importlib.util
+from backend.worker import WorkerPool
+from backend.jobs import Job, JobQueue
+from backend.cache import ResultCache
+from backend.stages import StageStore
 
-try:
-    import xatlas
-except ImportError:
-    print("Warning: xatlas not found. UV unwrapping might fail or be slow.")
-    xatlas = None
-
-
-# Mock Nvdiffrast if missing (to avoid crashes during import checks)
-try:
-    import nvdiffrast
-except ImportError:
-    from unittest.mock import MagicMock
-    print("Warning: nvdiffrast not found. Mocking for CPU mode.")
-    sys.modules["nvdiffrast"] = MagicMock()
-    sys.modules["nvdiffrast.torch"] = MagicMock()
+# torch, huggingface_hub, xatlas and nvdiffrast are only needed by the worker
+# processes (instantmesh_wrapper.py), so this module stays cheap to import and
+# anything heavy is imported on first use.
 
 class BackendManager:
     _instance = None
@@ -27,9 +20,12 @@ class BackendManager:
         if cls._instance is None:
             cls._instance = super(BackendManager, cls).__new__(cls)
             cls._instance.pipeline = None
+            cls._instance.workers = WorkerPool(size=1)
+            cls._instance.jobs = JobQueue(cls._instance._run_job, concurrency=1)
+            cls._instance.result_cache = ResultCache()
+            cls._instance.stage_store = StageStore()
             cls._instance.model_loaded = False
-            cls._instance._is_running = False
-            cls._instance._stop_requested = False
+            cls._instance._load_lock = threading.Lock()
         return cls._instance
 
     def check_instantmesh_install(self):
@@ -42,64 +38,151 @@ class BackendManager:
         if instant_mesh_path not in sys.path:
             sys.path.append(instant_mesh_path)
 
-    def load_model(self, low_vram=False):
-        """Loads the InstantMesh model."""
-        if self.model_loaded:
-            return
+    def load_model(self, low_vram=False, on_log_callback=None):
+        """
+        Prepares the InstantMesh environment (repository check, weights download).
 
-        print("Loading InstantMesh model...")
-        self.check_instantmesh_install()
-        
-        # Import dynamically to avoid top-level errors if rep missing
-        try:
-            from src.utils.infer_util import remove_background, resize_foreground
-            # We will use the pipeline logic in pipeline.py, 
-            # but here we might want to pre-load weights if possible
-            # For now, we'll let the pipeline handle lazy loading or init
-        except ImportError as e:
-            raise ImportError(f"Failed to import InstantMesh modules: {e}")
-
-        # Check/Download Weights
-        weight_path = os.path.join(os.path.dirname(__file__), 'InstantMesh', 'ckpts')
-        if not os.path.exists(os.path.join(weight_path, 'instant_mesh_large.ckpt')):
-            print("Downloading weights from HuggingFace...")
-            snapshot_download(repo_id="TencentARC/InstantMesh", local_dir=weight_path)
-        
-        self.model_loaded = True
-        print("Model Environment Ready.")
+        The weights themselves are held by warm worker processes from
+        self.workers, which start on first use and keep the model resident
+        until unload_model() is called.
+        """
+        with self._load_lock:
+            if self.model_loaded:
+                return
+
+            print("Loading InstantMesh model...")
+            self.check_instantmesh_install()
+            
+            # Only locate the InstantMesh sources: importing them (rembg, diffusers, ...)
+            # is the worker's job and would cost seconds here
+            try:
+                found = importlib.util.find_spec("src.utils.infer_util") is not None
+            except ImportError:
+                found = False
+            if not found:
+                raise ImportError("Failed to import InstantMesh modules: src.utils.infer_util not found")
+
+            # Check/Download Weights
+            weight_path = os.path.join(os.path.dirname(__file__), 'InstantMesh', 'ckpts')
+            if not os.path.exists(os.path.join(weight_path, 'instant_mesh_large.ckpt')):
+                from huggingface_hub import snapshot_download
+                print("Downloading weights from HuggingFace...")
+                snapshot_download(repo_id="TencentARC/InstantMesh", local_dir=weight_path)
+            
+            self.model_loaded = True
+            print("Model Environment Ready.")
 
     def unload_model(self):
+        # Busy workers exit as soon as their current job is done
+        self.workers.stop_all()
+
         if self.pipeline:
             del self.pipeline
             self.pipeline = None
         
         gc.collect()
-        torch.cuda.empty_cache()
+        torch = sys.modules.get("torch") # Only worth clearing if something already imported it
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
         self.model_loaded = False
         print("Model Unloaded.")
 
+    def prewarm(self, low_vram=False, background=True, on_log_callback=None):
+        """
+        Prepares the environment and starts one worker ahead of the first job,
+        so the first generation does not pay for imports and checkpoint loading.
+
+        Args:
+            background (bool): Run on a daemon thread and return immediately.
+
+        Returns:
+            threading.Thread | None: The pre-warm thread when running in background.
+        """
+        def warm():
+            try:
+                self.load_model(low_vram, on_log_callback=on_log_callback)
+                with self.workers.acquire(on_log_callback=on_log_callback):
+                    pass # Released straight back to the pool, warm
+                print("Pre-warm finished.")
+            except Exception as e:
+                print(f"Pre-warm failed: {e}")
+
+        if not background:
+            warm()
+            return None
+        thread = threading.Thread(target=warm, name="backend-prewarm", daemon=True)
+        thread.start()
+        return thread
+
     def get_device(self):
+        import torch
+
         # Auto-switch to CPU if CUDA not available or if forced
         if not torch.cuda.is_available():
             print("CUDA not available. Using CPU.")
             return "cpu"
         return "cuda"
         
-    def set_running(self, running: bool):
-        self._is_running = running
-        if running:
-            self._stop_requested = False # Reset stop flag on start
-            
+    # --- Job queue ---
+
+    def submit_job(self, image_path, model_name="InstantMesh", low_vram=False, prompt="",
+                   options=None, priority=0, output_dir=None, memory_budget_gb=None):
+        """Queues a generation and returns its Job (see backend/jobs.py)."""
+        job = Job(image_path=image_path, model_name=model_name, low_vram=low_vram,
+                  prompt=prompt, options=dict(options or {}), priority=priority,
+                  output_dir=output_dir, memory_budget_gb=memory_budget_gb)
+        self.jobs.submit(job)
+        return job
+
+    def set_concurrency(self, concurrency, pin_cpus=None):
+        """
+        Number of jobs (and warm worker processes) running at the same time.
+        The cores are split between the workers; pin_cpus also binds each
+        worker to its own block of cores.
+        """
+        self.workers.resize(concurrency, pin_cpus=pin_cpus)
+        self.jobs.set_concurrency(concurrency)
+
+    def set_memory_budget(self, memory_budget_gb):
+        """
+        Peak RSS target in GB per worker (None or 0 turns it off). Workers then
+        start in low-memory mode: bfloat16 weights, one sub-model at a time.
+        """
+        self.workers.set_memory_budget(memory_budget_gb or None)
+
+    def cancel_job(self, job_id):
+        """Cancels one queued or running job. Running jobs have their worker killed."""
+        return self.jobs.cancel(job_id)
+
+    def _run_job(self, job, update, cancel_token):
+        from backend.pipeline import GenerationPipeline
+
+        # Every job gets its own output folder, so results never collide
+        output_dir = job.output_dir or os.path.join(os.path.abspath("output"), job.id)
+        pipeline = GenerationPipeline(self)
+        return pipeline.run(
+            job.prompt, job.image_path, job.model_name, job.low_vram,
+            on_log_callback=lambda msg: update(status=msg),
+            options=job.options,
+            output_dir=output_dir,
+            cancel_token=cancel_token,
+            on_progress_callback=lambda progress: update(progress=progress),
+            memory_budget_gb=job.memory_budget_gb,
+        )
+
     def request_stop(self):
+        """
+        Cancels every queued and running job without blocking. Running jobs
+        kill their worker process tree (freeing the model memory) and turn
+        "cancelled" with their Job.cancel_latency set.
+        """
         print("Stop requested...")
-        self._stop_requested = True
-        
-    def should_stop(self):
-        return self._stop_requested
+        self.jobs.cancel_all()
 
     def clear_output_cache(self):
         """
-        Clears files in output/ and assets/thumbnails/ directories.
+        Clears files in output/ and assets/thumbnails/ directories, plus the
+        result cache and the persisted stage intermediates.
         Returns a tuple (deleted_count, freed_space_mb).
         """
         targets = [
@@ -107,8 +190,10 @@ class BackendManager:
             os.path.join("assets", "thumbnails")
         ]
         
-        deleted_count = 0
-        freed_bytes = 0
+        deleted_count, freed_bytes = self.result_cache.clear()
+        stage_count, stage_bytes = self.stage_store.clear()
+        deleted_count += stage_count
+        freed_bytes += stage_bytes
         
         for folder in targets:
             if not os.path.exists(folder):
@@ -117,8 +202,16 @@ class BackendManager:
             for filename in os.listdir(folder):
                 file_path = os.path.join(folder, filename)
                 
-                # Skip directories and special files
+                # Job folders are removed as a whole, other directories are kept
                 if os.path.isdir(file_path):
+                    if folder == "output" and self._is_job_folder(file_path):
+                        try:
+                            count, size = self._folder_stats(file_path)
+                            shutil.rmtree(file_path)
+                            deleted_count += count
+                            freed_bytes += size
+                        except Exception as e:
+                            print(f"Failed to delete {file_path}: {e}")
                     continue
                 if filename in [".gitignore", ".DS_Store", "Thumbs.db"]:
                     continue
@@ -137,3 +230,18 @@ class BackendManager:
                     print(f"Failed to delete {file_path}: {e}")
                     
         return deleted_count, freed_bytes / (1024 * 1024)
+
+    @staticmethod
+    def _is_job_folder(path):
+        name = os.path.basename(path)
+        return len(name) == 12 and all(c in "0123456789abcdef" for c in name)
+
+    @staticmethod
+    def _folder_stats(path):
+        count = 0
+        size = 0
+        for dirpath, _, filenames in os.walk(path):
+            for filename in filenames:
+                count += 1
+                size += os.path.getsize(os.path.join(dirpath, filename))
+        return count, size
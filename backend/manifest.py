@@ -0,0 +1,94 @@
+"""
+manifest.json files describing the artifacts in a directory.
+
+The wrapper writes one next to every stage's outputs, and the pipeline
+writes one into each job's output folder, so results are found by reading
+a single file instead of scanning directories. Artifact paths are stored
+relative to the manifest, so folders can be moved as a whole.
+"""
+import os
+import json
+import hashlib
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def sha256_file(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def artifact_entry(path, directory):
+    """Describes one file: path relative to directory, size and sha256."""
+    try:
+        rel_path = os.path.relpath(path, directory)
+    except ValueError:
+        rel_path = os.path.abspath(path) # Different drive on Windows
+    return {
+        "path": rel_path,
+        "size": os.path.getsize(path),
+        "sha256": sha256_file(path),
+    }
+
+
+def write_manifest(directory, artifacts, **fields):
+    """
+    Writes directory/manifest.json atomically.
+
+    Args:
+        directory (str): Folder the manifest describes.
+        artifacts (dict): Artifact name -> file path (None entries are skipped).
+        **fields: Extra JSON-serialisable metadata (stage, timing, ...).
+
+    Returns:
+        dict: The manifest as written.
+    """
+    manifest = {"version": MANIFEST_VERSION}
+    manifest.update(fields)
+    manifest["artifacts"] = {
+        name: artifact_entry(path, directory) for name, path in artifacts.items() if path
+    }
+
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    tmp_path = f"{manifest_path}.tmp{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+    return manifest
+
+
+def read_manifest(directory):
+    """Returns the manifest in directory, or None if it is missing or unreadable."""
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("artifacts"), dict):
+        return None
+    return manifest
+
+
+def artifact_paths(manifest, directory, verify=True):
+    """
+    Resolves a manifest's artifacts to absolute paths.
+
+    With verify, every file must exist with its recorded size (a stat per
+    file, no hashing); returns None if any does not.
+    """
+    paths = {}
+    for name, entry in manifest["artifacts"].items():
+        path = os.path.normpath(os.path.join(directory, entry["path"]))
+        if verify:
+            try:
+                if os.path.getsize(path) != entry["size"]:
+                    return None
+            except OSError:
+                return None
+        paths[name] = path
+    return paths
@@ -0,0 +1,118 @@
+"""Render one mesh from many cameras with a single instanced rasterization.
+
+Thumbnails, turntables and multi-view supervision render the same triangles
+from K cameras. Instead of K rasterize / interpolate / texture / antialias
+calls, `render_views()` transforms the vertices by all K matrices into one
+instanced-mode position tensor [K, V, 4] and runs each op once for the whole
+batch, so the per-call overhead (and the antialias topology hash) is paid
+once. Vertex attributes and textures broadcast along the view axis. Works with
+CPU tensors and `RasterizeCpuContext` as well as Cuda tensors and
+`RasterizeCudaContext`.
+"""
+
+import numpy as np
+import torch
+
+from . import torch as dr
+
+#----------------------------------------------------------------------------
+# Helpers.
+#----------------------------------------------------------------------------
+
+def transform_pos(mtx, pos):
+    '''Clip-space positions [K, V, 4] of vertices `pos` [V, 3] or [V, 4] under matrices `mtx` [K, 4, 4] or [4, 4].'''
+    mtx = torch.as_tensor(mtx, dtype=torch.float32, device=pos.device)
+    if mtx.dim() == 2:
+        mtx = mtx[None]
+    if pos.shape[-1] == 3:
+        pos = torch.cat([pos, torch.ones_like(pos[:, :1])], dim=1) # (x,y,z) -> (x,y,z,1)
+    return torch.matmul(pos[None], mtx.transpose(1, 2)).contiguous()
+
+def _view_batch(x):
+    '''Per-vertex attribute [V, C] or [1|K, V, C] as an instanced-mode tensor.'''
+    return x[None] if x.dim() == 2 else x
+
+#----------------------------------------------------------------------------
+# Multi-view rendering.
+#----------------------------------------------------------------------------
+
+def render_views(glctx, mtx, pos, pos_idx, resolution, col=None, col_idx=None, uv=None, uv_idx=None, tex=None,
+                 filter_mode='auto', max_mip_level=None, enable_antialias=True, max_views=None):
+    '''Render a mesh from K cameras.
+
+    Args:
+        glctx: Rasterizer context of type `RasterizeCudaContext` or `RasterizeCpuContext`.
+        mtx: Clip-space transforms (modelview + projection) with shape [K, 4, 4], as a tensor
+             or numpy array.
+        pos: Vertex positions with shape [V, 3] or [V, 4], float32.
+        pos_idx: Triangle tensor with shape [T, 3] and dtype `torch.int32`.
+        resolution: Output resolution as integer tuple (height, width).
+        col: (Optional) Vertex colors or other attributes, [V, C] or [K, V, C].
+        col_idx: (Optional) Triangles indexing `col`; defaults to `pos_idx`.
+        uv: (Optional) Texture coordinates, [V', 2] or [K, V', 2]; requires `tex`.
+        uv_idx: (Optional) Triangles indexing `uv`; defaults to `pos_idx`.
+        tex: (Optional) Texture [H', W', C] or [1|K, H', W', C], sampled at `uv`. With mipmapped
+             filter modes, the mipmap stack is built once for all views.
+        filter_mode: Texture filter mode as in `texture()`. Mode 'auto' uses
+                     'linear-mipmap-linear', with the uv derivatives from the rasterizer.
+        max_mip_level: (Optional) Limits the mipmap levels as in `texture()`.
+        enable_antialias: Antialias the shaded image (requires `col` or `tex`).
+        max_views: (Optional) Render at most this many views per batch, to bound memory.
+
+    Returns:
+        Dict with 'rast' [K, H, W, 4] (the rasterizer output), 'mask' [K, H, W, 1] (coverage)
+        and, if `col` or `tex` is given, 'color' [K, H, W, C]. With both, the texture is
+        modulated by the interpolated `col`.
+    '''
+    assert isinstance(pos, torch.Tensor) and isinstance(pos_idx, torch.Tensor)
+    assert (uv is None) == (tex is None), "uv and tex must be given together"
+    col_idx = pos_idx if col_idx is None else col_idx
+    uv_idx = pos_idx if uv_idx is None else uv_idx
+    if filter_mode == 'auto':
+        filter_mode = 'linear-mipmap-linear'
+    enable_mip = tex is not None and 'mipmap' in filter_mode
+    resolution = tuple(resolution)
+
+    pos_clip = transform_pos(mtx if not isinstance(mtx, np.ndarray) else torch.from_numpy(mtx), pos)
+    num_views = pos_clip.shape[0]
+    max_views = num_views if max_views is None else max(1, int(max_views))
+    shading = col is not None or tex is not None
+
+    # Shared by all batches.
+    if tex is not None:
+        tex = tex[None] if tex.dim() == 3 else tex
+        mip = dr.texture_construct_mip(tex, max_mip_level) if enable_mip and tex.shape[0] == 1 else None
+    topology_hash = dr.antialias_construct_topology_hash(pos_idx) if shading and enable_antialias else None
+
+    outputs = {'rast': [], 'mask': [], 'color': []}
+    for start in range(0, num_views, max_views):
+        views = slice(start, start + max_views)
+        clip = pos_clip[views]
+        rast, rast_db = dr.rasterize(glctx, clip, pos_idx, resolution, grad_db=enable_mip)
+        outputs['rast'].append(rast)
+        outputs['mask'].append((rast[..., 3:] > 0).to(clip.dtype))
+        if not shading:
+            continue
+
+        color = None
+        if col is not None:
+            c = _view_batch(col)
+            color, _ = dr.interpolate(c[views] if c.shape[0] > 1 else c, rast, col_idx)
+        if tex is not None:
+            u = _view_batch(uv)
+            u = u[views] if u.shape[0] > 1 else u
+            t = tex[views] if tex.shape[0] > 1 else tex
+            if enable_mip:
+                texc, texd = dr.interpolate(u, rast, uv_idx, rast_db=rast_db, diff_attrs='all')
+                texel = dr.texture(t, texc, texd, mip=mip, filter_mode=filter_mode, max_mip_level=max_mip_level)
+            else:
+                texc, _ = dr.interpolate(u, rast, uv_idx)
+                texel = dr.texture(t, texc, filter_mode=filter_mode)
+            color = texel if color is None else texel * color
+        if enable_antialias:
+            color = dr.antialias(color.contiguous(), rast, clip, pos_idx, topology_hash=topology_hash)
+        outputs['color'].append(color)
+
+    return {k: torch.cat(v) for k, v in outputs.items() if v}
+
+#----------------------------------------------------------------------------
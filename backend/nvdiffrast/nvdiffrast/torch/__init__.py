@@ -6,5 +6,5 @@
 # distribution of this software and related documentation without an express
 # license agreement from NVIDIA CORPORATION is strictly prohibited.
 
-from .ops import RasterizeCudaContext, get_log_level, set_log_level, rasterize, DepthPeeler, interpolate, texture, texture_construct_mip, antialias, antialias_construct_topology_hash, RasterizeGLContext
-__all__ = ["RasterizeCudaContext", "get_log_level", "set_log_level", "rasterize", "DepthPeeler", "interpolate", "texture", "texture_construct_mip", "antialias", "antialias_construct_topology_hash", "RasterizeGLContext"]
+from .ops import RasterizeCudaContext, RasterizeCpuContext, get_log_level, set_log_level, set_mip_cache_size, get_mip_cache_stats, set_topology_hash_cache_size, get_topology_hash_cache_stats, profile, rasterize, DepthPeeler, interpolate, texture, texture_construct_mip, antialias, antialias_construct_topology_hash, RasterizeGLContext
+__all__ = ["RasterizeCudaContext", "RasterizeCpuContext", "get_log_level", "set_log_level", "set_mip_cache_size", "get_mip_cache_stats", "set_topology_hash_cache_size", "get_topology_hash_cache_stats", "profile", "rasterize", "DepthPeeler", "interpolate", "texture", "texture_construct_mip", "antialias", "antialias_construct_topology_hash", "RasterizeGLContext"]
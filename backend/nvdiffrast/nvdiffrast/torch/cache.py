@@ -0,0 +1,148 @@
+"""Bounded caches of data derived from input tensors, used by ops.py.
+
+A cache entry is stored under a key naming the source tensor and remembers the
+tensor's version counter at the time it was built. In-place modification bumps
+the version, so a later lookup finds a stale entry, drops it and reports a
+miss. Entries are evicted in least-recently-used order when the byte or entry
+limit is exceeded.
+"""
+
+import threading
+import weakref
+from collections import OrderedDict
+
+#----------------------------------------------------------------------------
+# Helpers.
+#----------------------------------------------------------------------------
+
+def tensor_version(x):
+    '''Version counter of `x`, or None for tensors without one (inference mode).'''
+    try:
+        return x._version
+    except RuntimeError:
+        return None
+
+def storage_key(x):
+    '''Key naming the memory a tensor views, shared by all tensors viewing it the same way.'''
+    return (x.device, x.dtype, x.untyped_storage().data_ptr(), x.storage_offset(), tuple(x.shape), tuple(x.stride()))
+
+def identity_guard(cache, x, key):
+    '''Weak reference to `x` that drops `key` from `cache` when `x` is freed.'''
+    return weakref.ref(x, lambda _: cache.discard(key))
+
+#----------------------------------------------------------------------------
+# LRU cache.
+#----------------------------------------------------------------------------
+
+class _Entry:
+    __slots__ = ('version', 'value', 'nbytes', 'guard')
+
+    def __init__(self, version, value, nbytes, guard):
+        self.version = version
+        self.value = value
+        self.nbytes = nbytes
+        self.guard = guard
+
+class TensorCache:
+    def __init__(self, max_bytes=None, max_entries=None):
+        '''Create an LRU cache of values derived from tensors.
+
+        Args:
+          max_bytes (Optional): Limit on the summed sizes of the cached values.
+                                Zero disables the cache, None means no limit.
+          max_entries (Optional): Limit on the number of entries. Zero disables
+                                  the cache, None means no limit.
+        '''
+        self._lock = threading.RLock() # Weakref callbacks may discard entries during garbage collection.
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_bytes != 0 and self.max_entries != 0
+
+    def lookup(self, key, version, guard=None):
+        '''Return the value cached under `key` for this version, or None.
+
+        If `guard` is given, the entry's guard must be a weak reference to it,
+        which tells a tensor apart from a later one that got the same id().
+        '''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry.version != version or (guard is not None and entry.guard() is not guard)):
+                self._drop(key)
+                self.invalidations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def insert(self, key, version, value, nbytes, guard=None):
+        '''Cache `value` of size `nbytes` under `key`.
+
+        `guard` is kept with the entry: a weak reference to the source tensor for
+        identity keys, or the tensor itself for storage keys so that its memory,
+        and with it the key, cannot be reused while the entry exists.
+        '''
+        with self._lock:
+            if not self.enabled or (self.max_bytes is not None and nbytes > self.max_bytes):
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = _Entry(version, value, nbytes, guard)
+            self._bytes += nbytes
+            self._evict()
+
+    def discard(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+
+    def resize(self, max_bytes=None, max_entries=None):
+        '''Change the limits, evicting as needed; zero for either disables and clears the cache.'''
+        with self._lock:
+            self.max_bytes = max_bytes
+            self.max_entries = max_entries
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        '''Counters and current size as a dict.'''
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'max_entries': self.max_entries,
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def _drop(self, key):
+        self._bytes -= self._entries.pop(key).nbytes
+
+    def _evict(self):
+        while self._entries and ((self.max_bytes is not None and self._bytes > self.max_bytes) or
+                                 (self.max_entries is not None and len(self._entries) > self.max_entries)):
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+#----------------------------------------------------------------------------
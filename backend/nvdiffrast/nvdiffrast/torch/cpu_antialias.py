@@ -0,0 +1,320 @@
+"""CPU implementation of nvdiffrast antialiasing in plain PyTorch.
+
+Kernels that ops.py runs for `antialias()` and
+`antialias_construct_topology_hash()` when the inputs are in CPU memory,
+including instanced and range mode positions. The topology hash is a sorted table of edge keys built
+by sorting all triangle edges at once. Only a cheap comparison of triangle IDs
+touches every pixel; the edge analysis, blending and gradients run on the
+gathered list of pixel pairs whose triangle IDs differ, so their cost follows
+the number of discontinuity pixels. The math follows csrc/common/antialias.cu.
+"""
+
+import torch
+
+from .cpu_rasterize import check, float_to_triidx
+
+F32_MAX = 3.402823466e+38
+
+#----------------------------------------------------------------------------
+# Topology hash.
+#----------------------------------------------------------------------------
+
+class TopologyHashCpu:
+    '''Edge topology from `antialias_construct_topology_hash()`, the CPU counterpart of TopologyHashWrapper.
+
+    `keys` holds the sorted edge keys (min vertex << 32 | max vertex) and
+    `opposite` the first two distinct vertices opposite to each edge, or -1.
+    '''
+    def __init__(self, keys, opposite):
+        self.keys = keys
+        self.opposite = opposite
+
+def _edge_key(va, vb):
+    return (torch.minimum(va, vb) << 32) | torch.maximum(va, vb)
+
+def construct_topology_hash_cpu(tri):
+    '''Collects the vertices opposite to every edge of the non-degenerate triangles in `tri`.'''
+    check(tri.device.type == 'cpu', "CPU antialias requires inputs in CPU memory")
+    check(tri.dim() == 2 and tri.shape[0] > 0 and tri.shape[1] == 3, "tri must have shape [>0, 3]")
+    tri = tri.to(torch.int64)
+    v0, v1, v2 = tri.unbind(-1)
+    ok = (tri >= 0).all(-1) & (v0 != v1) & (v1 != v2) & (v2 != v0)
+    v0, v1, v2 = v0[ok], v1[ok], v2[ok]
+
+    # All edges with their opposite vertex, sorted by (edge, opposite vertex).
+    keys = torch.cat([_edge_key(v1, v2), _edge_key(v2, v0), _edge_key(v0, v1)])
+    vals = torch.cat([v0, v1, v2])
+    order = torch.sort(vals, stable=True).indices
+    order = order[torch.sort(keys[order], stable=True).indices]
+    keys, vals = keys[order], vals[order]
+    first = torch.ones_like(keys, dtype=torch.bool)
+    first[1:] = (keys[1:] != keys[:-1]) | (vals[1:] != vals[:-1])
+    keys, vals = keys[first], vals[first] # Unique (edge, opposite vertex) pairs.
+
+    # Keep the first two opposite vertices of each edge, like the two slots of a CUDA hash entry.
+    start = torch.ones_like(keys, dtype=torch.bool)
+    start[1:] = keys[1:] != keys[:-1]
+    starts = start.nonzero().squeeze(-1)
+    ends = torch.cat([starts[1:], torch.tensor([keys.shape[0]])])
+    second = torch.where(starts + 1 < ends, vals[(starts + 1).clamp(max=max(keys.shape[0] - 1, 0))], -1)
+    return TopologyHashCpu(keys[starts], torch.stack([vals[starts], second], dim=-1))
+
+def _find_opposite(topology_hash, va, vb, vr):
+    '''Vertex across edge (va, vb) from the one at vr, or -1 if the edge is a boundary.'''
+    key = _edge_key(va, vb)
+    keys = topology_hash.keys
+    if keys.shape[0] == 0:
+        return torch.full_like(key, -1)
+    slot = torch.searchsorted(keys, key).clamp(max=keys.shape[0] - 1)
+    found = (keys[slot] == key) & (va != vb)
+    ops = topology_hash.opposite[slot]
+    res = torch.where(ops[:, 0] == vr, ops[:, 1], torch.where(ops[:, 1] == vr, ops[:, 0], -1))
+    return torch.where(found, res, -1)
+
+#----------------------------------------------------------------------------
+# Forward and gradient.
+#----------------------------------------------------------------------------
+
+def _same_sign(a, b):
+    return torch.signbit(a) == torch.signbit(b)
+
+def _rational_gt(n0, n1, d0, d1):
+    return (n0 * d1 > n1 * d0) == _same_sign(d0, d1)
+
+def _max_idx3(n0, n1, n2, d0, d1, d2):
+    g10 = _rational_gt(n1, n0, d1, d0)
+    g20 = _rational_gt(n2, n0, d2, d0)
+    g21 = _rational_gt(n2, n1, d2, d1)
+    return torch.where(g20 & g21, 2, torch.where(g10, 1, 0))
+
+def _check_inputs(color, rast, pos, tri):
+    check(all(x.device.type == 'cpu' for x in (color, rast, pos, tri)), "CPU antialias requires inputs in CPU memory")
+    check(color.dtype == torch.float32 and rast.dtype == torch.float32 and pos.dtype == torch.float32, "color, rast and pos must be float32 tensors")
+    check(color.dim() == 4 and color.shape[0] > 0 and color.shape[1] > 0 and color.shape[2] > 0 and color.shape[3] > 0, "color must have shape[>0, >0, >0, >0]")
+    check(rast.dim() == 4 and rast.shape[0] > 0 and rast.shape[1] > 0 and rast.shape[2] > 0 and rast.shape[3] == 4, "rast must have shape[>0, >0, >0, 4]")
+    check(tri.dim() == 2 and tri.shape[0] > 0 and tri.shape[1] == 3, "tri must have shape [>0, 3]")
+    check(color.shape[1] == rast.shape[1] and color.shape[2] == rast.shape[2], "color and rast inputs must have same spatial dimensions")
+    if pos.dim() == 3:
+        check(pos.shape[0] > 0 and pos.shape[1] > 0 and pos.shape[2] == 4, "pos must have shape [>0, >0, 4] or [>0, 4]")
+        check(rast.shape[0] == color.shape[0] and pos.shape[0] == color.shape[0], "minibatch size mismatch between inputs color, rast, pos")
+    else:
+        check(pos.dim() == 2 and pos.shape[0] > 0 and pos.shape[1] == 4, "pos must have shape [>0, >0, 4] or [>0, 4]")
+        check(rast.shape[0] == color.shape[0], "minibatch size mismatch between inputs color, rast")
+
+class AntialiasWork:
+    '''Silhouette pixel pairs found by the forward pass, reused by the gradient.
+
+    One entry per pair that was blended: the two pixels, their coordinates,
+    whether the pair is vertical, the edge index, whether the triangle came
+    from the second pixel, the triangle, and the blend factor alpha.
+    '''
+    def __init__(self, pixel0, pixel1, px, py, pz, d, di, tri1, tri, alpha):
+        self.pixel0, self.pixel1 = pixel0, pixel1
+        self.px, self.py, self.pz = px, py, pz
+        self.d, self.di, self.tri1, self.tri, self.alpha = d, di, tri1, tri, alpha
+
+def _discontinuities(rast):
+    '''Pixel pairs (right and down neighbors) whose triangle IDs differ, like the discontinuity kernel.'''
+    t = rast[..., 3]
+    right = torch.zeros(t.shape, dtype=torch.bool)
+    down = torch.zeros(t.shape, dtype=torch.bool)
+    right[:, :, :-1] = t[:, :, 1:] != t[:, :, :-1]
+    down[:, :-1, :] = t[:, 1:, :] != t[:, :-1, :]
+    pz0, py0, px0 = right.nonzero().unbind(-1)
+    pz1, py1, px1 = down.nonzero().unbind(-1)
+    d = torch.cat([torch.zeros_like(px0), torch.ones_like(px1)])
+    return torch.cat([px0, px1]), torch.cat([py0, py1]), torch.cat([pz0, pz1]), d
+
+def _project(pos, vi, px, py, xh, yh):
+    '''Vertex positions in pixel space relative to the pixel center.'''
+    p = pos[vi]
+    w = 1.0 / p[:, 3]
+    fx = px.float() + 0.5 - xh
+    fy = py.float() + 0.5 - yh
+    return p[:, 0] * w * xh - fx, p[:, 1] * w * yh - fy
+
+def antialias_fwd_cpu(color, rast, pos, tri, topology_hash):
+    '''Forward antialiasing; returns (out, work) like `antialias_fwd`.'''
+    _check_inputs(color, rast, pos, tri)
+    n, height, width, channels = color.shape
+    instance_mode = pos.dim() > 2
+    num_vertices = pos.shape[-2]
+    num_triangles = tri.shape[0]
+    xh, yh = 0.5 * width, 0.5 * height
+    pos_flat = pos.detach().reshape(-1, 4)
+    color_flat = color.detach().reshape(-1, channels)
+    tri = tri.to(torch.int64)
+    out = color_flat.clone()
+
+    # Candidate pixel pairs.
+    px, py, pz, d = _discontinuities(rast.detach())
+    pixel0 = px + width * (py + height * pz)
+    pixel1 = pixel0 + torch.where(d == 1, width, 1)
+    zt = rast.detach().reshape(-1, 4)
+    z0, z1 = zt[pixel0, 2], zt[pixel1, 2]
+    tri0 = float_to_triidx(zt[pixel0, 3]) - 1
+    tri1 = float_to_triidx(zt[pixel1, 3]) - 1
+
+    # Select triangle based on background / depth, and compute relative to the pixel it covers.
+    sel = torch.where(tri0 >= 0, tri0, tri1)
+    sel = torch.where((tri0 >= 0) & (tri1 >= 0), torch.where(z0 < z1, tri0, tri1), sel)
+    from1 = sel == tri1
+    px = px + torch.where(from1, 1 - d, 0)
+    py = py + torch.where(from1, d, 0)
+
+    # Drop corrupt triangle and vertex indices.
+    keep = (sel >= 0) & (sel < num_triangles)
+    vi = tri[sel.clamp(0, num_triangles - 1)]
+    keep &= ((vi >= 0) & (vi < num_vertices)).all(-1)
+    px, py, pz, d, pixel0, pixel1, from1, sel, vi = [x[keep] for x in (px, py, pz, d, pixel0, pixel1, from1, sel, vi)]
+    vi0, vi1, vi2 = vi.unbind(-1)
+
+    # Opposite vertices; the vertex itself (always silhouette) if there is none.
+    op0 = _find_opposite(topology_hash, vi2, vi1, vi0)
+    op1 = _find_opposite(topology_hash, vi0, vi2, vi1)
+    op2 = _find_opposite(topology_hash, vi1, vi0, vi2)
+    op0, op1, op2 = torch.where(op0 >= 0, op0, vi0), torch.where(op1 >= 0, op1, vi1), torch.where(op2 >= 0, op2, vi2)
+    if instance_mode:
+        vbase = pz * num_vertices
+        vi0, vi1, vi2, op0, op1, op2 = [v + vbase for v in (vi0, vi1, vi2, op0, op1, op2)]
+
+    x0, y0 = _project(pos_flat, vi0, px, py, xh, yh)
+    x1, y1 = _project(pos_flat, vi1, px, py, xh, yh)
+    x2, y2 = _project(pos_flat, vi2, px, py, xh, yh)
+    ox0, oy0 = _project(pos_flat, op0, px, py, xh, yh)
+    ox1, oy1 = _project(pos_flat, op1, px, py, xh, yh)
+    ox2, oy2 = _project(pos_flat, op2, px, py, xh, yh)
+
+    # Signs to kill non-silhouette edges.
+    bb = (x1-x0)*(y2-y0) - (x2-x0)*(y1-y0) # Triangle itself.
+    a0 = (x1-ox0)*(y2-oy0) - (x2-ox0)*(y1-oy0) # Wings.
+    a1 = (x2-ox1)*(y0-oy1) - (x0-ox1)*(y2-oy1)
+    a2 = (x0-ox2)*(y1-oy2) - (x1-ox2)*(y0-oy2)
+    s0, s1, s2 = _same_sign(a0, bb), _same_sign(a1, bb), _same_sign(a2, bb)
+
+    # XY flip for horizontal edges.
+    flip = d == 1
+    x0, y0 = torch.where(flip, y0, x0), torch.where(flip, x0, y0)
+    x1, y1 = torch.where(flip, y1, x1), torch.where(flip, x1, y1)
+    x2, y2 = torch.where(flip, y2, x2), torch.where(flip, x2, y2)
+
+    dx0, dx1, dx2 = x2 - x1, x0 - x2, x1 - x0
+    dy0, dy1, dy2 = y2 - y1, y0 - y2, y1 - y0
+
+    # Check if an edge crosses between us and the neighbor pixel.
+    ds = torch.where(from1, -1.0, 1.0)
+    d0 = ds * (x1*dy0 - y1*dx0)
+    d1 = ds * (x2*dy1 - y2*dx1)
+    d2 = ds * (x0*dy2 - y0*dx2)
+    e0, e1, e2 = _same_sign(y1, y2), _same_sign(y2, y0), _same_sign(y0, y1)
+    d0, dy0 = torch.where(e0, -F32_MAX, d0), torch.where(e0, 1.0, dy0)
+    d1, dy1 = torch.where(e1, -F32_MAX, d1), torch.where(e1, 1.0, dy1)
+    d2, dy2 = torch.where(e2, -F32_MAX, d2), torch.where(e2, 1.0, dy2)
+
+    di = _max_idx3(d0, d1, d2, dy0, dy1, dy2)
+    dc = torch.full_like(d0, -F32_MAX)
+    dc = torch.where((di == 0) & s0 & (dy0.abs() >= dx0.abs()), d0 / dy0, dc)
+    dc = torch.where((di == 1) & s1 & (dy1.abs() >= dx1.abs()), d1 / dy1, dc)
+    dc = torch.where((di == 2) & s2 & (dy2.abs() >= dx2.abs()), d2 / dy2, dc)
+    eps = 0.0625 # Expect no more than 1/16 pixel inaccuracy.
+
+    # Adjust output image where a suitable edge was found.
+    hit = (s0 | s1 | s2) & (dc > -eps) & (dc < 1.0 + eps)
+    alpha = ds * (0.5 - dc.clamp(0.0, 1.0))
+    hit_idx = hit.nonzero().squeeze(-1)
+    pixel0, pixel1, alpha = pixel0[hit_idx], pixel1[hit_idx], alpha[hit_idx]
+    target = torch.where(alpha > 0.0, pixel0, pixel1)
+    out.index_add_(0, target, alpha[:, None] * (color_flat[pixel1] - color_flat[pixel0]))
+
+    # Original pixel coordinates, as in the rewritten work items.
+    px, py = px[hit_idx], py[hit_idx]
+    from1, d = from1[hit_idx], d[hit_idx]
+    px = px - torch.where(from1, 1 - d, 0)
+    py = py - torch.where(from1, d, 0)
+    work = AntialiasWork(pixel0, pixel1, px, py, pz[hit_idx], d, di[hit_idx], from1, sel[hit_idx], alpha)
+    return out.view(color.shape), work
+
+def antialias_grad_cpu(color, rast, pos, tri, dy, work):
+    '''Gradients (g_color, g_pos) like `antialias_grad`.'''
+    n, height, width, channels = color.shape
+    instance_mode = pos.dim() > 2
+    num_vertices = pos.shape[-2]
+    pos_flat = pos.detach().reshape(-1, 4)
+    color_flat = color.detach().reshape(-1, channels)
+    dy_flat = dy.reshape(-1, channels).float()
+    tri = tri.to(torch.int64)
+    g_color = dy_flat.clone() # Use dy as base.
+    g_pos = torch.zeros_like(pos_flat)
+
+    # Items with an effect.
+    live = (work.alpha != 0.0).nonzero().squeeze(-1)
+    pixel0, pixel1, alpha = work.pixel0[live], work.pixel1[live], work.alpha[live]
+    px, py, pz, d, di, from1, sel = [x[live] for x in (work.px, work.py, work.pz, work.d, work.di, work.tri1, work.tri)]
+
+    # Color gradients and position gradient weight.
+    g = dy_flat[torch.where(alpha > 0.0, pixel0, pixel1)]
+    dd = (g * (color_flat[pixel1] - color_flat[pixel0])).sum(-1)
+    v = alpha[:, None] * g
+    g_color.index_add_(0, pixel0, -v)
+    g_color.index_add_(0, pixel1, v)
+
+    # Position gradients where the weight is nonzero and alpha is not saturated.
+    keep = ((dd != 0.0) & (alpha.abs() < 0.5)).nonzero().squeeze(-1)
+    px, py, pz, d, di, from1, sel, alpha, dd = [x[keep] for x in (px, py, pz, d, di, from1, sel, alpha, dd)]
+    px = px + torch.where(from1, 1 - d, 0)
+    py = py + torch.where(from1, d, 0)
+
+    # Vertices of the active edge.
+    i1 = torch.where(di < 2, di + 1, 0)
+    i2 = torch.where(i1 < 2, i1 + 1, 0)
+    vi1 = tri[sel, i1]
+    vi2 = tri[sel, i2]
+    if instance_mode:
+        vi1 = vi1 + pz * num_vertices
+        vi2 = vi2 + pz * num_vertices
+
+    # Project vertices to pixel space, XY flipped for horizontal edges.
+    flip = d == 1
+    p1, p2 = pos_flat[vi1], pos_flat[vi2]
+    p1x, p1y = torch.where(flip, p1[:, 1], p1[:, 0]), torch.where(flip, p1[:, 0], p1[:, 1])
+    p2x, p2y = torch.where(flip, p2[:, 1], p2[:, 0]), torch.where(flip, p2[:, 0], p2[:, 1])
+    pxh = torch.where(flip, 0.5 * height, 0.5 * width)
+    pyh = torch.where(flip, 0.5 * width, 0.5 * height)
+    fx = px.float() + 0.5 - 0.5 * width
+    fy = py.float() + 0.5 - 0.5 * height
+    fx, fy = torch.where(flip, fy, fx), torch.where(flip, fx, fy)
+
+    # Gradient calculation setup.
+    w1 = 1.0 / p1[:, 3]
+    w2 = 1.0 / p2[:, 3]
+    x1 = p1x * w1 * pxh - fx
+    y1 = p1y * w1 * pyh - fy
+    x2 = p2x * w2 * pxh - fx
+    y2 = p2y * w2 * pyh - fy
+    dx = x2 - x1
+    dy_ = y2 - y1
+    db = x1*dy_ - y1*dx
+
+    # Inverse delta-y with epsilon of ~1/1000 pixel.
+    iy = 1.0 / (dy_ + torch.copysign(torch.full_like(dy_, 1e-3), dy_))
+
+    # Position gradients.
+    dby = db * iy
+    iw1 = -w1 * iy * dd
+    iw2 = w2 * iy * dd
+    gp1x = iw1 * pxh * y2
+    gp2x = iw2 * pxh * y1
+    gp1y = iw1 * pyh * (dby - x2)
+    gp2y = iw2 * pyh * (dby - x1)
+    gp1w = -(p1x * gp1x + p1y * gp1y) * w1
+    gp2w = -(p2x * gp2x + p2y * gp2y) * w2
+
+    # XY flip the gradients back and accumulate; z gets no gradient.
+    zero = torch.zeros_like(gp1w)
+    g1 = torch.stack([torch.where(flip, gp1y, gp1x), torch.where(flip, gp1x, gp1y), zero, gp1w], dim=-1)
+    g2 = torch.stack([torch.where(flip, gp2y, gp2x), torch.where(flip, gp2x, gp2y), zero, gp2w], dim=-1)
+    g_pos.index_add_(0, vi1, g1)
+    g_pos.index_add_(0, vi2, g2)
+    return g_color.view(color.shape), g_pos.view(pos.shape)
+
+#----------------------------------------------------------------------------
@@ -0,0 +1,153 @@
+"""CPU implementation of nvdiffrast attribute interpolation in plain PyTorch.
+
+Forward and gradient kernels that ops.py runs for `interpolate()` when the
+inputs are in CPU memory, including the instanced (with minibatch
+broadcasting) and range modes and image-space attribute derivatives through
+`rast_db` / `diff_attrs`.
+Every step handles all pixels of a band of image rows at once; bands bound the
+temporaries ([pixels, 3, num_attributes] gathered vertex attributes) at high
+resolutions. The math follows csrc/common/interpolate.cu.
+"""
+
+import torch
+
+from .cpu_rasterize import check, float_to_triidx
+
+MAX_CHUNK_ELEMENTS = 1 << 23    # Gathered attribute values per row band, bounds temporaries.
+
+#----------------------------------------------------------------------------
+# Shared setup.
+#----------------------------------------------------------------------------
+
+def _check_inputs(attr, rast, tri, rast_db):
+    check(attr.device.type == 'cpu' and rast.device.type == 'cpu' and tri.device.type == 'cpu', "CPU interpolate requires inputs in CPU memory")
+    check(rast.dim() == 4 and rast.shape[0] > 0 and rast.shape[1] > 0 and rast.shape[2] > 0 and rast.shape[3] == 4, "rast must have shape[>0, >0, >0, 4]")
+    check(tri.dim() == 2 and tri.shape[0] > 0 and tri.shape[1] == 3, "tri must have shape [>0, 3]")
+    check(attr.dim() in (2, 3) and attr.shape[0] > 0 and attr.shape[1] > 0 and (attr.dim() == 2 or attr.shape[2] > 0), "attr must have shape [>0, >0, >0] or [>0, >0]")
+    if attr.dim() == 3:
+        check(attr.shape[0] == rast.shape[0] or attr.shape[0] == 1, "minibatch size mismatch between inputs rast, attr")
+    if rast_db is not None:
+        check(rast_db.dim() == 4 and rast_db.shape[0] > 0 and rast_db.shape[1] > 0 and rast_db.shape[2] > 0 and rast_db.shape[3] == 4, "rast_db must have shape[>0, >0, >0, 4]")
+        check(rast_db.shape[1] == rast.shape[1] and rast_db.shape[2] == rast.shape[2], "spatial size mismatch between inputs rast and rast_db")
+        check(rast_db.shape[0] == rast.shape[0], "minibatch size mismatch between inputs rast, rast_db")
+
+def _diff_attr_index(num_attr, diff_attrs_all, diff_attrs_list):
+    '''Attribute index per differentiated attribute (Python-style negatives wrap), and a validity mask.'''
+    if diff_attrs_all:
+        j = torch.arange(num_attr)
+    else:
+        j = torch.as_tensor(list(diff_attrs_list), dtype=torch.int64).reshape(-1)
+        j = torch.where(j < 0, j + num_attr, j)
+    valid = (j >= 0) & (j < num_attr)
+    return torch.where(valid, j, 0), valid
+
+def _row_bands(attr, rast):
+    '''Row ranges such that a band's gathered attributes stay under MAX_CHUNK_ELEMENTS.'''
+    depth, height, width = rast.shape[:3]
+    per_row = depth * width * (3 * attr.shape[-1] + 8)
+    rows = max(1, MAX_CHUNK_ELEMENTS // per_row)
+    for y0 in range(0, height, rows):
+        yield y0, min(height, y0 + rows)
+
+def _gather(attr, tri, rast_band):
+    '''Vertex indices into the flattened attributes and validity of a band of pixels.
+
+    Returns:
+      (vidx [B, h, W, 3], valid [B, h, W]); invalid pixels point at vertex 0.
+    '''
+    num_vertices = attr.shape[-2]
+    tri_idx = float_to_triidx(rast_band[..., 3]) - 1
+    valid = (tri_idx >= 0) & (tri_idx < tri.shape[0])
+    vidx = tri[torch.where(valid, tri_idx, 0)]
+    valid &= ((vidx >= 0) & (vidx < num_vertices)).all(-1) # Corrupt indices: no output.
+    vidx = torch.where(valid[..., None], vidx, 0)
+    if attr.dim() == 3 and attr.shape[0] > 1: # Instance mode without broadcasting.
+        layer = torch.arange(rast_band.shape[0]).view(-1, 1, 1, 1)
+        vidx = vidx + layer * num_vertices
+    return vidx, valid
+
+#----------------------------------------------------------------------------
+# Forward and gradient.
+#----------------------------------------------------------------------------
+
+def interpolate_fwd_cpu(attr, rast, tri, rast_db=None, diff_attrs_all=False, diff_attrs_list=()):
+    '''Forward interpolation; returns (out, out_da) like `interpolate_fwd_da`.'''
+    _check_inputs(attr, rast, tri, rast_db)
+    num_attr = attr.shape[-1]
+    attr_flat = attr.detach().to(torch.float32).reshape(-1, num_attr)
+    tri = tri.to(torch.int64)
+    enable_da = rast_db is not None and (diff_attrs_all or len(diff_attrs_list) > 0)
+    j, j_valid = _diff_attr_index(num_attr, diff_attrs_all, diff_attrs_list) if enable_da else (None, None)
+    num_diff = j.shape[0] if enable_da else 0
+
+    depth, height, width = rast.shape[:3]
+    out = torch.zeros(depth, height, width, num_attr)
+    out_da = torch.zeros(depth, height, width, 2 * num_diff)
+    for y0, y1 in _row_bands(attr, rast):
+        r = rast[:, y0:y1].to(torch.float32)
+        vidx, valid = _gather(attr, tri, r)
+        a = attr_flat[vidx] # [B, h, W, 3, A]
+        b0 = torch.where(valid, r[..., 0], 0.0)[..., None]
+        b1 = torch.where(valid, r[..., 1], 0.0)[..., None]
+        b2 = torch.where(valid, 1.0 - r[..., 0] - r[..., 1], 0.0)[..., None]
+        out[:, y0:y1] = b0 * a[..., 0, :] + b1 * a[..., 1, :] + b2 * a[..., 2, :]
+
+        if enable_da:
+            db = torch.where(valid[..., None], rast_db[:, y0:y1].to(torch.float32), 0.0)
+            s = a[..., j] # [B, h, W, 3, D]
+            dsdu = s[..., 0, :] - s[..., 2, :]
+            dsdv = s[..., 1, :] - s[..., 2, :]
+            dsdx = db[..., 0:1] * dsdu + db[..., 2:3] * dsdv
+            dsdy = db[..., 1:2] * dsdu + db[..., 3:4] * dsdv
+            da = torch.stack([dsdx, dsdy], dim=-1) * j_valid[:, None] # Invalid indices give zeros.
+            out_da[:, y0:y1] = da.reshape(*da.shape[:3], 2 * num_diff)
+    return out, out_da
+
+def interpolate_grad_cpu(attr, rast, tri, dy, rast_db=None, dda=None, diff_attrs_all=False, diff_attrs_list=()):
+    '''Gradients (g_attr, g_rast, g_rast_db) like `interpolate_grad_da`; g_rast_db is None without dda.'''
+    num_attr = attr.shape[-1]
+    attr_flat = attr.detach().to(torch.float32).reshape(-1, num_attr)
+    tri = tri.to(torch.int64)
+    enable_da = dda is not None and rast_db is not None and (diff_attrs_all or len(diff_attrs_list) > 0)
+    if enable_da:
+        j, j_valid = _diff_attr_index(num_attr, diff_attrs_all, diff_attrs_list)
+
+    g_attr = torch.zeros(attr_flat.shape)
+    g_rast = torch.zeros(rast.shape)
+    g_rast_db = torch.zeros(rast.shape) if enable_da else None
+    for y0, y1 in _row_bands(attr, rast):
+        r = rast[:, y0:y1].to(torch.float32)
+        vidx, valid = _gather(attr, tri, r)
+        a = attr_flat[vidx]
+        g = torch.where(valid[..., None], dy[:, y0:y1].to(torch.float32), 0.0) # [B, h, W, A]
+        b0 = r[..., 0:1]
+        b1 = r[..., 1:2]
+        b2 = 1.0 - b0 - b1
+
+        # Barycentric gradients.
+        g_rast[:, y0:y1, :, 0] = (g * (a[..., 0, :] - a[..., 2, :])).sum(-1)
+        g_rast[:, y0:y1, :, 1] = (g * (a[..., 1, :] - a[..., 2, :])).sum(-1)
+
+        # Attribute gradients, scattered to the three vertices.
+        ga = torch.stack([b0 * g, b1 * g, b2 * g], dim=-2) # [B, h, W, 3, A]
+
+        if enable_da:
+            db = rast_db[:, y0:y1].to(torch.float32)
+            gda = dda[:, y0:y1].to(torch.float32).reshape(*db.shape[:3], -1, 2)
+            gda = torch.where(valid[..., None, None] & j_valid[:, None], gda, 0.0)
+            dsdx, dsdy = gda[..., 0], gda[..., 1] # [B, h, W, D]
+            s = a[..., j]
+            dsdu = s[..., 0, :] - s[..., 2, :]
+            dsdv = s[..., 1, :] - s[..., 2, :]
+            g_rast_db[:, y0:y1] = torch.stack([(dsdu * dsdx).sum(-1), (dsdu * dsdy).sum(-1),
+                                               (dsdv * dsdx).sum(-1), (dsdv * dsdy).sum(-1)], dim=-1)
+            du = dsdx * db[..., 0:1] + dsdy * db[..., 1:2]
+            dv = dsdx * db[..., 2:3] + dsdy * db[..., 3:4]
+            ga_da = torch.zeros_like(ga)
+            ga_da.index_add_(-1, j, torch.stack([du, dv, -du - dv], dim=-2))
+            ga += ga_da
+
+        g_attr.index_add_(0, vidx.reshape(-1), ga.reshape(-1, num_attr))
+    return g_attr.view(attr.shape).to(attr.dtype), g_rast.to(rast.dtype), (g_rast_db.to(rast_db.dtype) if enable_da else None)
+
+#----------------------------------------------------------------------------
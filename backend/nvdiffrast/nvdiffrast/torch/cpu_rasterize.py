@@ -0,0 +1,429 @@
+"""CPU implementation of nvdiffrast rasterization in plain PyTorch.
+
+Forward and gradient kernels that ops.py runs for `rasterize()` and
+`DepthPeeler` when the inputs are in CPU memory. The stages follow cudaraster:
+every triangle is set up once (culling, screen bounding box, edge and depth
+plane equations, as in TriangleSetup) and binned to the tiles its bounding box
+touches (BinRaster / CoarseRaster); triangles small enough to fit a 2x2 or 4x4
+pixel stamp get a single stamp at their bounding box instead. The screen is
+split into bands of whole tile rows that are rasterized in parallel by a
+thread pool (FineRaster): in each band, all (triangle, tile) pairs of one size
+are evaluated as one batched tensor expression, and the closest fragment per
+pixel wins through a scatter-min over packed (depth, triangle) keys. Torch
+releases the GIL inside its ops, so the bands scale across cores.
+
+The per-pixel outputs and their gradients follow the CUDA shader and gradient
+kernels in csrc/common/rasterize.cu exactly: barycentrics (u, v), z/w, the
+triangle index, and image-space barycentric derivatives.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+TILE_SIZE = 8                   # Tile edge in pixels, same as CR_TILE_SIZE in cudaraster.
+MAX_CHUNK_PIXELS = 1 << 21      # Pixels evaluated per vectorized step, bounds temporaries.
+BANDS_PER_THREAD = 4            # Screen bands per worker thread, for load balancing.
+
+_EMPTY_KEY = torch.iinfo(torch.int64).max
+
+#----------------------------------------------------------------------------
+# Helpers shared with the other CPU ops.
+#----------------------------------------------------------------------------
+
+def triidx_to_float(x):
+    '''Encode 1-based triangle indices as in the CUDA kernels (exact above 2^24).'''
+    x = x.to(torch.int32)
+    big = (x + 0x4a800000).view(torch.float32)
+    return torch.where(x <= 0x01000000, x.to(torch.float32), big)
+
+def float_to_triidx(x):
+    '''Decode the triangle index channel of a rasterizer output tensor.'''
+    x = x.to(torch.float32).contiguous()
+    big = x.view(torch.int32) - 0x4a800000
+    return torch.where(x <= 16777216.0, x.to(torch.int32), big).to(torch.int64)
+
+def pixel_transform(height, width):
+    '''Pixel center to clip-space transform (xs, xo, ys, yo), as in torch_rasterize.cpp.'''
+    return 2.0 / width, 1.0 / width - 1.0, 2.0 / height, 1.0 / height - 1.0
+
+def check(condition, message):
+    if not condition:
+        raise RuntimeError(message)
+
+#----------------------------------------------------------------------------
+# CPU rasterizer state.
+#----------------------------------------------------------------------------
+
+class RasterizeCpuContext:
+    def __init__(self, device=None, tile_size=TILE_SIZE, num_threads=None):
+        '''Create a new CPU rasterizer context.
+
+        Args:
+          device (Optional): Accepted for compatibility with `RasterizeCudaContext`.
+                             Must be None or a CPU device.
+          tile_size (Optional): Screen tile edge in pixels used for binning.
+          num_threads (Optional): Worker threads rasterizing screen bands in parallel.
+                                  If not specified, `torch.get_num_threads()` at the
+                                  time of rasterization is used.
+        Returns:
+          The newly created CPU rasterizer context.
+        '''
+        if device is not None and torch.device(device).type != 'cpu':
+            raise ValueError("RasterizeCpuContext requires a CPU device, got %s" % (device,))
+        self.device = torch.device('cpu')
+        self.tile_size = int(tile_size)
+        self.num_threads = None if num_threads is None else max(1, int(num_threads))
+        self.active_depth_peeler = None
+        self.depth_buffer = None # Winning (depth, triangle) keys of the last rasterized layer; input to depth peeling.
+
+_thread_pools = {}
+_thread_pools_lock = threading.Lock()
+
+def _thread_pool(num_threads):
+    '''Shared worker pool with the given number of threads.'''
+    with _thread_pools_lock:
+        pool = _thread_pools.get(num_threads)
+        if pool is None:
+            pool = _thread_pools[num_threads] = ThreadPoolExecutor(num_threads, thread_name_prefix='nvdiffrast-cpu')
+        return pool
+
+#----------------------------------------------------------------------------
+# Triangle setup, binning and coverage.
+#----------------------------------------------------------------------------
+
+def _ordered_depth(zw):
+    '''Map float32 depths to int64 values with the same ordering.'''
+    bits = zw.contiguous().view(torch.int32).to(torch.int64)
+    return torch.where(bits < 0, bits ^ 0x7fffffff, bits)
+
+def _setup_triangles(v, height, width):
+    '''Cull triangles and compute plane equations and tile ranges.
+
+    Args:
+      v: Clip-space vertices of the triangles, shape [T, 3, 4].
+    Returns:
+      (index of surviving triangles, plane coefficients [T', 5, 3], pixel bounding boxes [T', 4])
+      Planes are (a0, a1, a2, z*a, w*a) as c0 * fx + c1 * fy + c2 in clip space,
+      flipped to positive area so a pixel is covered if a0, a1, a2 >= 0 and w*a > 0.
+    '''
+    x, y, z, w = v.unbind(-1)
+
+    # Trivially outside one of the clip planes, or behind the camera.
+    outside = torch.zeros(v.shape[0], dtype=torch.bool)
+    for c in (x, y, z):
+        outside |= (c > w).all(1) | (c < -w).all(1)
+    outside |= (w <= 0).all(1)
+
+    # Edge functions a_i(fx, fy), linear in the pixel's clip-space position.
+    i1, i2 = [1, 2, 0], [2, 0, 1]
+    x1, y1, w1 = x[:, i1], y[:, i1], w[:, i1]
+    x2, y2, w2 = x[:, i2], y[:, i2], w[:, i2]
+    edge = torch.stack([y1 * w2 - w1 * y2, w1 * x2 - x1 * w2, x1 * y2 - y1 * x2], dim=-1) # [T, 3, 3]
+
+    # Their sum is constant over the screen: zero means degenerate in homogeneous space.
+    area = edge[:, :, 2].sum(1)
+    keep = ~outside & (area != 0) & torch.isfinite(area)
+    idx = keep.nonzero()[:, 0]
+    edge, v = edge[idx] * torch.sign(area[idx])[:, None, None], v[idx]
+    zplane = (v[:, :, 2:3] * edge).sum(1)
+    wplane = (v[:, :, 3:4] * edge).sum(1)
+    planes = torch.cat([edge, zplane[:, None], wplane[:, None]], dim=1)
+
+    # Screen bounding box; triangles crossing w = 0 may cover the whole screen.
+    w = v[:, :, 3]
+    front = (w > 0).all(1)
+    ndc = v[:, :, :2] / torch.where(front[:, None], w, torch.ones_like(w))[:, :, None]
+    lo = ndc.amin(1).clamp(-1, 1)
+    hi = ndc.amax(1).clamp(-1, 1)
+    size = torch.tensor([width, height], dtype=v.dtype)
+    lo = torch.where(front[:, None], ((lo + 1) * size * 0.5 - 0.5).floor(), torch.zeros_like(lo))
+    hi = torch.where(front[:, None], ((hi + 1) * size * 0.5 - 0.5).ceil(), size - 1)
+    lo = torch.maximum(lo, torch.zeros_like(lo)).to(torch.int64)
+    hi = torch.minimum(hi, size - 1).to(torch.int64)
+    bbox = torch.cat([lo, hi], dim=1) # (x0, y0, x1, y1), inclusive
+    nonempty = (hi >= lo).all(1)
+    return idx[nonempty], planes[nonempty], bbox[nonempty]
+
+def _bin_triangles(bbox, tile_size):
+    '''Group triangles into stamps of equal size.
+
+    Returns:
+      List of (stamp size, triangle index, stamp origin x, stamp origin y).
+      Triangles whose bounding box fits a stamp smaller than a tile get one
+      stamp at the box; larger ones get one tile-aligned stamp per tile.
+    '''
+    extent = (bbox[:, 2:] - bbox[:, :2] + 1).amax(1)
+    groups = []
+    stamp, smaller = 2, 0
+    while stamp < tile_size:
+        t = ((extent > smaller) & (extent <= stamp)).nonzero()[:, 0]
+        if t.numel():
+            groups.append((stamp, t, bbox[t, 0], bbox[t, 1]))
+        stamp, smaller = stamp * 2, stamp
+
+    large = (extent > smaller).nonzero()[:, 0]
+    tiles = torch.div(bbox[large], tile_size, rounding_mode='floor')
+    ntx = tiles[:, 2] - tiles[:, 0] + 1
+    nty = tiles[:, 3] - tiles[:, 1] + 1
+    counts = ntx * nty
+    rep = torch.repeat_interleave(torch.arange(large.shape[0]), counts)
+    first = torch.cumsum(counts, 0) - counts
+    local = torch.arange(rep.shape[0]) - first[rep]
+    tx = tiles[rep, 0] + local % ntx[rep]
+    ty = tiles[rep, 1] + local // ntx[rep]
+    if rep.numel():
+        groups.append((tile_size, large[rep], tx * tile_size, ty * tile_size))
+    return groups
+
+def _screen_bands(height, tile_size, num_threads):
+    '''Split the screen into bands of whole tile rows; returns (band height in pixels, band count).'''
+    tile_rows = -(-height // tile_size)
+    count = min(tile_rows, BANDS_PER_THREAD * num_threads) if num_threads > 1 else 1
+    band_rows = -(-tile_rows // count) * tile_size
+    return band_rows, -(-height // band_rows)
+
+def _split_bands(groups, band_rows, num_bands, height):
+    '''Distribute the stamps of `_bin_triangles()` to the bands they overlap.
+
+    Tile stamps never cross a band boundary. Smaller stamps sit at their
+    triangle's bounding box and may overlap two bands; they go to both, and
+    each band keeps only the fragments in its own rows.
+    '''
+    bands = [[] for _ in range(num_bands)]
+    for stamp, t, ox, oy in groups:
+        first = torch.div(oy, band_rows, rounding_mode='floor')
+        last = torch.div((oy + stamp - 1).clamp(max=height - 1), band_rows, rounding_mode='floor')
+        cross = (last != first).nonzero()[:, 0]
+        band = torch.cat([first, last[cross]])
+        order = torch.sort(band, stable=True).indices
+        counts = torch.bincount(band, minlength=num_bands).tolist()
+        parts = [torch.cat([x, x[cross]])[order].split(counts) for x in (t, ox, oy)]
+        for b, (bt, bx, by) in enumerate(zip(*parts)):
+            if bt.numel():
+                bands[b].append((stamp, bt, bx, by))
+    return bands
+
+def _cover(planes, stamp, tri, ox, oy, keys, peel_keys, height, width, y0, y1, chunk_pixels):
+    '''Evaluate stamps of one size and scatter-min their fragments in rows [y0, y1) into keys [(y1 - y0) * W].
+
+    With `peel_keys` [H * W] (the winning keys of the previous depth layer), only
+    fragments ordered after the previous layer's fragment at their pixel are kept.
+    Comparing keys rather than depths peels every (pixel, triangle) exactly once,
+    also when triangles tie in depth.
+    '''
+    xs, xo, ys, yo = pixel_transform(height, width)
+    local = torch.arange(stamp * stamp)
+    lx, ly = local % stamp, local // stamp
+    offsets = torch.stack([xs * lx, ys * ly]).to(planes.dtype) # Clip-space offsets within the stamp, [2, P]
+    per_step = max(1, chunk_pixels // (stamp * stamp))
+    for start in range(0, tri.shape[0], per_step):
+        t = tri[start:start + per_step]
+        sx, sy = ox[start:start + per_step], oy[start:start + per_step]
+        p = planes[t] # [C, 5, 3]
+        gradient = p[:, :, :2]
+        origin = p[:, :, 2] + gradient[:, :, 0] * (xs * sx + xo)[:, None] + gradient[:, :, 1] * (ys * sy + yo)[:, None]
+        a = torch.matmul(gradient, offsets).add_(origin[:, :, None]) # [C, 5, P]
+
+        # Covered: all edge functions and w >= 0 (w == 0 fails the depth range test below).
+        c, i = (torch.minimum(a[:, :3].amin(1), a[:, 4]) >= 0).nonzero().unbind(1)
+        px, py = sx[c] + lx[i], sy[c] + ly[i]
+        zw = a[c, 3, i] / a[c, 4, i]
+        ok = (zw >= -1) & (zw <= 1) & (px < width) & (py >= y0) & (py < y1)
+        pix = py * width + px
+        key = (_ordered_depth(zw) << 32) | t[c]
+        if peel_keys is not None:
+            ok &= key > peel_keys[pix.clamp(max=height * width - 1)]
+        if not ok.all():
+            key, pix = key[ok], pix[ok]
+        if pix.numel():
+            keys.scatter_reduce_(0, pix - y0 * width, key, 'amin')
+
+#----------------------------------------------------------------------------
+# Pixel shading, as in RasterizeCudaFwdShaderKernel / RasterizeGradKernel.
+#----------------------------------------------------------------------------
+
+def _shade(p0, p1, p2, fx, fy, xs, ys, grad_mode=False):
+    '''Barycentrics, z/w and barycentric pixel differentials of pixels.
+
+    In grad_mode the inverse area gets the epsilon of the gradient kernel and
+    nothing is clamped, so autograd through this function reproduces it.
+    '''
+    p0x = p0[:, 0] - fx * p0[:, 3]
+    p0y = p0[:, 1] - fy * p0[:, 3]
+    p1x = p1[:, 0] - fx * p1[:, 3]
+    p1y = p1[:, 1] - fy * p1[:, 3]
+    p2x = p2[:, 0] - fx * p2[:, 3]
+    p2y = p2[:, 1] - fy * p2[:, 3]
+    a0 = p1x * p2y - p1y * p2x
+    a1 = p2x * p0y - p2y * p0x
+    a2 = p0x * p1y - p0y * p1x
+
+    at = a0 + a1 + a2
+    if grad_mode:
+        iw = 1.0 / (at + torch.where(at < 0, -1e-6, 1e-6))
+    else:
+        iw = 1.0 / at
+    b0 = a0 * iw
+    b1 = a1 * iw
+
+    zw = None
+    if not grad_mode:
+        z = p0[:, 2] * a0 + p1[:, 2] * a1 + p2[:, 2] * a2
+        w = p0[:, 3] * a0 + p1[:, 3] * a1 + p2[:, 3] * a2
+        zw = (z / w).clamp(-1, 1)
+
+    dfxdx = xs * iw
+    dfydy = ys * iw
+    da0dx = p2[:, 1] * p1[:, 3] - p1[:, 1] * p2[:, 3]
+    da0dy = p1[:, 0] * p2[:, 3] - p2[:, 0] * p1[:, 3]
+    da1dx = p0[:, 1] * p2[:, 3] - p2[:, 1] * p0[:, 3]
+    da1dy = p2[:, 0] * p0[:, 3] - p0[:, 0] * p2[:, 3]
+    da2dx = p1[:, 1] * p0[:, 3] - p0[:, 1] * p1[:, 3]
+    da2dy = p0[:, 0] * p1[:, 3] - p1[:, 0] * p0[:, 3]
+    datdx = da0dx + da1dx + da2dx
+    datdy = da0dy + da1dy + da2dy
+
+    if not grad_mode:
+        # Clamps to avoid NaNs, applied after the differentials' b0/b1 in the CUDA kernel too.
+        b0 = b0.clamp(0, 1)
+        b1 = b1.clamp(0, 1)
+        bs = 1.0 / torch.clamp(b0 + b1, min=1.0)
+        b0 = b0 * bs
+        b1 = b1 * bs
+    db = torch.stack([dfxdx * (b0 * datdx - da0dx),
+                      dfydy * (b0 * datdy - da0dy),
+                      dfxdx * (b1 * datdx - da1dx),
+                      dfydy * (b1 * datdy - da1dy)], dim=-1)
+    return b0, b1, zw, db
+
+def _layers(pos, tri, ranges):
+    '''Yield (layer, vertex offset, triangle index range) per minibatch entry.'''
+    if pos.dim() == 3:
+        for d in range(pos.shape[0]):
+            yield d, d * pos.shape[1], 0, tri.shape[0]
+    else:
+        for d, (start, count) in enumerate(ranges.tolist()):
+            start = max(0, min(start, tri.shape[0]))
+            yield d, 0, start, min(tri.shape[0], start + max(0, count))
+
+def _check_inputs(pos, tri, ranges):
+    if pos.dim() > 2:
+        check(pos.dim() == 3 and pos.shape[0] > 0 and pos.shape[1] > 0 and pos.shape[2] == 4, "instance mode - pos must have shape [>0, >0, 4]")
+    else:
+        check(pos.dim() == 2 and pos.shape[0] > 0 and pos.shape[1] == 4, "range mode - pos must have shape [>0, 4]")
+        check(ranges.dim() == 2 and ranges.shape[0] > 0 and ranges.shape[1] == 2, "range mode - ranges must have shape [>0, 2]")
+    check(tri.dim() == 2 and tri.shape[0] > 0 and tri.shape[1] == 3, "tri must have shape [>0, 3]")
+    check(pos.device.type == 'cpu' and tri.device.type == 'cpu', "CPU rasterizer requires pos and tri in CPU memory")
+
+def rasterize_fwd_cpu(raster_ctx, pos, tri, resolution, ranges, peeling_idx):
+    '''Forward rasterization; returns (out, out_db) like `rasterize_fwd_cuda`.'''
+    _check_inputs(pos, tri, ranges)
+    height, width = resolution
+    check(height > 0 and width > 0, "resolution must be [>0, >0]")
+    depth = pos.shape[0] if pos.dim() == 3 else ranges.shape[0]
+    num_vertices = pos.shape[-2]
+    pos = pos.detach().to(torch.float32)
+    pos_flat = pos.reshape(-1, 4)
+    tri = tri.detach().to(torch.int64)
+    xs, xo, ys, yo = pixel_transform(height, width)
+    tile_size = raster_ctx.tile_size
+    num_threads = raster_ctx.num_threads or torch.get_num_threads()
+    band_rows, num_bands = _screen_bands(height, tile_size, num_threads)
+    chunk_pixels = max(1 << 16, MAX_CHUNK_PIXELS // min(num_threads, num_bands))
+
+    peel = peeling_idx > 0
+    if peel:
+        prev = raster_ctx.depth_buffer
+        check(prev is not None and tuple(prev.shape) == (depth, height, width), "depth peeling requires the previous layer of the same shape")
+
+    out = torch.zeros(depth, height, width, 4)
+    out_db = torch.zeros(depth, height, width, 4)
+    depth_buffer = torch.full((depth, height, width), _EMPTY_KEY, dtype=torch.int64)
+    for d, vertex_offset, tri_begin, tri_end in _layers(pos, tri, ranges):
+        layer_tri = tri[tri_begin:tri_end]
+        valid = ((layer_tri >= 0) & (layer_tri < num_vertices)).all(1) # Corrupt indices are skipped.
+        tri_ids = valid.nonzero()[:, 0] + tri_begin
+        if tri_ids.numel() == 0:
+            continue
+        vidx = tri[tri_ids] + vertex_offset
+        idx, planes, bbox = _setup_triangles(pos_flat[vidx], height, width)
+        if idx.numel() == 0:
+            continue
+        tri_ids = tri_ids[idx]
+        vidx = vidx[idx]
+        peel_keys = prev[d].reshape(-1) if peel else None
+        bands = _split_bands(_bin_triangles(bbox, tile_size), band_rows, num_bands, height)
+
+        def raster_band(b):
+            # Coverage and shading of one band; bands write disjoint rows of the outputs.
+            y0, y1 = b * band_rows, min((b + 1) * band_rows, height)
+            keys = torch.full(((y1 - y0) * width,), _EMPTY_KEY, dtype=torch.int64)
+            for stamp, t, ox, oy in bands[b]:
+                _cover(planes, stamp, t, ox, oy, keys, peel_keys, height, width, y0, y1, chunk_pixels)
+            depth_buffer[d, y0:y1] = keys.view(y1 - y0, width)
+
+            pix = (keys != _EMPTY_KEY).nonzero()[:, 0]
+            t = keys[pix] & 0xffffffff
+            for start in range(0, pix.shape[0], chunk_pixels):
+                p, tt = pix[start:start + chunk_pixels], t[start:start + chunk_pixels]
+                v = pos_flat[vidx[tt]]
+                fx = xs * (p % width).to(torch.float32) + xo
+                fy = ys * (p // width + y0).to(torch.float32) + yo
+                b0, b1, zw, db = _shade(v[:, 0], v[:, 1], v[:, 2], fx, fy, xs, ys)
+                out[d, y0:y1].view(-1, 4)[p] = torch.stack([b0, b1, zw, triidx_to_float(tri_ids[tt] + 1)], dim=-1)
+                out_db[d, y0:y1].view(-1, 4)[p] = db
+
+        busy = [b for b in range(num_bands) if bands[b]]
+        if num_threads > 1 and len(busy) > 1:
+            list(_thread_pool(num_threads).map(raster_band, busy)) # Re-raises worker exceptions.
+        else:
+            for b in busy:
+                raster_band(b)
+
+    raster_ctx.depth_buffer = depth_buffer
+    return out, out_db
+
+def rasterize_grad_cpu(pos, tri, out, dy, ddb=None):
+    '''Position gradients, like `rasterize_grad` / `rasterize_grad_db`.'''
+    depth, height, width = out.shape[:3]
+    xs, xo, ys, yo = pixel_transform(height, width)
+    num_vertices = pos.shape[-2]
+    instance_mode = pos.dim() == 3
+    tri = tri.to(torch.int64)
+
+    # Only pixels with a triangle and a nonzero incoming gradient contribute.
+    tri_idx = float_to_triidx(out[..., 3]) - 1
+    active = (tri_idx >= 0) & (tri_idx < tri.shape[0]) & (dy[..., :2] != 0).any(-1)
+    if ddb is not None:
+        active |= (tri_idx >= 0) & (tri_idx < tri.shape[0]) & (ddb != 0).any(-1)
+    pix = active.reshape(-1).nonzero()[:, 0]
+
+    g_pos = torch.zeros(pos.shape, dtype=torch.float32)
+    g_flat = g_pos.view(-1, 4)
+    pos_flat = pos.detach().to(torch.float32).reshape(-1, 4)
+    dy_flat = dy.reshape(-1, dy.shape[-1])
+    ddb_flat = ddb.reshape(-1, 4) if ddb is not None else None
+    for start in range(0, pix.shape[0], MAX_CHUNK_PIXELS):
+        p = pix[start:start + MAX_CHUNK_PIXELS]
+        d = p // (height * width)
+        vidx = tri[tri_idx.reshape(-1)[p]]
+        if instance_mode:
+            vidx = vidx + (d * num_vertices)[:, None]
+        vidx = torch.where((vidx >= 0) & (vidx < pos_flat.shape[0]), vidx, 0)
+        fx = xs * (p % width).to(torch.float32) + xo
+        fy = ys * ((p // width) % height).to(torch.float32) + yo
+        with torch.enable_grad():
+            v = pos_flat[vidx].requires_grad_(True)
+            b0, b1, _, db = _shade(v[:, 0], v[:, 1], v[:, 2], fx, fy, xs, ys, grad_mode=True)
+            outputs, grads = [b0, b1], [dy_flat[p, 0], dy_flat[p, 1]]
+            if ddb_flat is not None:
+                outputs.append(db)
+                grads.append(ddb_flat[p])
+            g_v, = torch.autograd.grad(outputs, [v], grads)
+        g_v[..., 2] = 0 # z/w carries no gradient, as in CUDA.
+        g_flat.index_add_(0, vidx.reshape(-1), g_v.reshape(-1, 4))
+    return g_pos.to(pos.dtype)
+
+#----------------------------------------------------------------------------
@@ -0,0 +1,570 @@
+"""CPU implementation of nvdiffrast texture sampling in plain PyTorch.
+
+Kernels that ops.py runs for `texture()` and `texture_construct_mip()` when
+the inputs are in CPU memory. They cover all filter modes, the 'wrap',
+'clamp', 'zero' and 'cube' boundary modes, prebuilt, internally built and
+custom mipmap stacks, `max_mip_level`, and gradients for the texture, the mip
+stack, `uv`, `uv_da` and `mip_level_bias`. All levels of the mip stack live in
+one texel buffer, so a pixel batch is sampled with one gather of four taps per
+level regardless of which mip level each pixel picks. The math follows
+csrc/common/texture_kernel.cu.
+"""
+
+import torch
+
+from .cpu_rasterize import check
+
+MAX_CHUNK_ELEMENTS = 1 << 23    # Gathered texel values per pixel chunk, bounds temporaries.
+TEX_MAX_MIP_LEVEL = 16          # Same texture size limit as the CUDA version.
+
+FILTER_MODES = ('nearest', 'linear', 'linear-mipmap-nearest', 'linear-mipmap-linear')
+BOUNDARY_MODES = ('cube', 'wrap', 'clamp', 'zero')
+
+#----------------------------------------------------------------------------
+# Cube map wrapping for smooth filtering across edges and corners. At corners,
+# one of the taps is missing and takes the average of the other three. Same
+# tables as in texture_kernel.cu.
+#----------------------------------------------------------------------------
+
+_CUBE_WRAP_MASK1 = torch.tensor([
+    0x1530a440, 0x1133a550, 0x6103a110, 0x1515aa44, 0x6161aa11, 0x40154a04, 0x44115a05, 0x04611a01,
+    0x2630a440, 0x2233a550, 0x5203a110, 0x2626aa44, 0x5252aa11, 0x40264a04, 0x44225a05, 0x04521a01,
+    0x32608064, 0x3366a055, 0x13062091, 0x32328866, 0x13132299, 0x50320846, 0x55330a55, 0x05130219,
+    0x42508064, 0x4455a055, 0x14052091, 0x42428866, 0x14142299, 0x60420846, 0x66440a55, 0x06140219,
+    0x5230a044, 0x5533a055, 0x1503a011, 0x5252aa44, 0x1515aa11, 0x40520a44, 0x44550a55, 0x04150a11,
+    0x6130a044, 0x6633a055, 0x2603a011, 0x6161aa44, 0x2626aa11, 0x40610a44, 0x44660a55, 0x04260a11,
+], dtype=torch.int64)
+
+_CUBE_WRAP_MASK2 = torch.tensor([
+    0x26, 0x33, 0x11, 0x05, 0x00, 0x09, 0x0c, 0x04, 0x04, 0x00, 0x00, 0x05, 0x00, 0x81, 0xc0, 0x40,
+    0x02, 0x03, 0x09, 0x00, 0x0a, 0x00, 0x00, 0x02, 0x64, 0x30, 0x90, 0x55, 0xa0, 0x99, 0xcc, 0x64,
+    0x24, 0x30, 0x10, 0x05, 0x00, 0x01, 0x00, 0x00, 0x06, 0x03, 0x01, 0x05, 0x00, 0x89, 0xcc, 0x44,
+], dtype=torch.int64)
+
+def _wrap_cube_map(face, ix0, ix1, iy0, iy1, w):
+    '''Texel indices within a cube of the four taps of a quad crossing a face edge.
+
+    Returns:
+      (idx [P, 4], valid [P, 4]); at corners one tap is invalid.
+    '''
+    cx = torch.where(ix0 < 0, 0, torch.where(ix1 >= w, 2, 1))
+    cy = torch.where(iy0 < 0, 0, torch.where(iy1 >= w, 6, 3))
+    c = cx + cy
+    c = torch.where(c >= 5, c - 1, c) + (face << 3)
+    m = _CUBE_WRAP_MASK1[c]
+    f = _CUBE_WRAP_MASK2[c]
+
+    def coord(shift, a, b):
+        code = (m >> shift) & 3
+        return torch.where(code == 0, 0, torch.where(code == 1, a, b))
+
+    xs = [coord(0, ix0, iy0), coord(2, ix1, iy0), coord(4, ix0, iy1), coord(6, ix1, iy1)]
+    ys = [coord(8, ix0, iy0), coord(10, ix1, iy0), coord(12, ix0, iy1), coord(14, ix1, iy1)]
+    faces = [((m >> shift) & 15) - 1 for shift in (16, 20, 24, 28)]
+    idx = []
+    for k in range(4):
+        x = torch.where((f >> k) & 1 == 1, w - 1 - xs[k], xs[k])         # Flips.
+        y = torch.where((f >> (k + 4)) & 1 == 1, w - 1 - ys[k], ys[k])
+        idx.append(x + (y + faces[k] * w) * w)
+    faces = torch.stack(faces, dim=-1)
+    return torch.stack(idx, dim=-1), faces >= 0
+
+#----------------------------------------------------------------------------
+# Cube map indexing. Faces are +x, -x, +y, -y, +z, -z.
+#----------------------------------------------------------------------------
+
+def _cube_face(uvw):
+    '''Face index of 3D lookup vectors.'''
+    x, y, z = uvw.unbind(-1)
+    ax, ay, az = x.abs(), y.abs(), z.abs()
+    zmajor = az > torch.maximum(ax, ay)
+    ymajor = ~zmajor & (ay > ax)
+    face = torch.where(zmajor, 4, torch.where(ymajor, 2, 0))
+    c = torch.where(zmajor, z, torch.where(ymajor, y, x))
+    return face + (c < 0).long()
+
+def _major(uvw, face):
+    x, y, z = uvw.unbind(-1)
+    return torch.where(face >= 4, z, torch.where(face >= 2, y, x))
+
+def _cube_st(uvw, face):
+    '''Unclamped face coordinates (s, t) of 3D lookup vectors; differentiable.'''
+    x, y, z = uvw.unbind(-1)
+    c = _major(uvw, face)
+    ns = torch.where(face < 2, z, x)
+    nt = torch.where((face == 2) | (face == 3), z, y)
+    m = 0.5 / c.abs()
+    s = ns * torch.where((face == 0) | (face == 5), -m, m) + 0.5
+    t = nt * torch.where(face == 2, m, -m) + 0.5
+    return s, t
+
+def _cube_st_da(uvw, uvw_da, face):
+    '''Pixel differentials (ds/dX, ds/dY, dt/dX, dt/dY) of the face coordinates; differentiable.
+
+    `uvw_da` holds (dx/dX, dx/dY, dy/dX, dy/dY, dz/dX, dz/dY) as in `uv_da`.
+    '''
+    x, y, z = uvw.unbind(-1)
+    c = _major(uvw, face)
+    dx, dy, dz = uvw_da[..., 0:2], uvw_da[..., 2:4], uvw_da[..., 4:6]
+    xface, yface = (face < 2)[:, None], ((face == 2) | (face == 3))[:, None]
+    ns = torch.where(face < 2, z, x)[:, None]
+    nt = torch.where((face == 2) | (face == 3), z, y)[:, None]
+    dns = torch.where(xface, dz, dx)
+    dnt = torch.where(yface, dz, dy)
+    dc = torch.where(xface, dx, torch.where(yface, dy, dz))
+    m = (0.5 / c.abs())[:, None]
+    ms = torch.where(((face == 0) | (face == 5))[:, None], -m, m)
+    mt = torch.where((face == 2)[:, None], m, -m)
+    ds = ms * (dns - ns / c[:, None] * dc)
+    dt = mt * (dnt - nt / c[:, None] * dc)
+    return ds[:, 0], ds[:, 1], dt[:, 0], dt[:, 1]
+
+def _finite_rows(*tensors):
+    '''Per-pixel mask of rows where all given [P] or [P, k] tensors are finite.'''
+    ok = None
+    for t in tensors:
+        t = torch.isfinite(t)
+        t = t.all(-1) if t.dim() > 1 else t
+        ok = t if ok is None else ok & t
+    return ok
+
+#----------------------------------------------------------------------------
+# Mip stack construction.
+#----------------------------------------------------------------------------
+
+def _raise_mip_size_error(width, height):
+    msg = "Mip-map size error - cannot downsample an odd extent greater than 1. Resize the texture so that both spatial extents are powers of two, or limit the number of mip maps using max_mip_level argument.\n"
+    msg += "Attempted mip stack construction:\n"
+    msg += "level  width height\n"
+    msg += "-----  ----- ------\n"
+    msg += "base   %5d  %5d\n" % (width, height)
+    w, h, ew, eh, level = width, height, False, False, 0
+    while (w | h) > 1 and not (ew or eh): # Stop at first impossible size.
+        level += 1
+        ew = ew or (w > 1 and (w & 1))
+        eh = eh or (h > 1 and (h & 1))
+        w, h = max(w >> 1, 1), max(h >> 1, 1)
+        msg += "mip %-2d " % level
+        msg += "  err  " if ew else "%5d  " % w
+        msg += "  err\n" if eh else "%5d\n" % h
+    raise RuntimeError(msg)
+
+def _mip_level_sizes(width, height, max_mip_level):
+    '''Sizes (w, h) of mip levels 1, 2, ... like calculateMipInfo(); -1 means down to 1x1.'''
+    sizes = []
+    if max_mip_level == 0:
+        return sizes
+    w, h = width, height
+    while (w | h) > 1:
+        if (w > 1 and (w & 1)) or (h > 1 and (h & 1)):
+            _raise_mip_size_error(width, height)
+        w, h = max(w >> 1, 1), max(h >> 1, 1)
+        sizes.append((w, h))
+        if max_mip_level >= 0 and len(sizes) == max_mip_level:
+            break
+    return sizes
+
+class TextureMipCpu:
+    '''Mipmap stack built by `texture_construct_mip()`, the CPU counterpart of TextureMipWrapper.
+
+    Levels 1.. are stored back to back in the 1-D tensor `mip`, each laid out
+    like the texture.
+    '''
+    def __init__(self, mip, max_mip_level, texture_size, cube_mode):
+        self.mip = mip
+        self.max_mip_level = max_mip_level
+        self.texture_size = texture_size
+        self.cube_mode = cube_mode
+
+def _check_tex(tex, cube_mode):
+    check(tex.device.type == 'cpu', "CPU texture requires inputs in CPU memory")
+    check(tex.dtype == torch.float32, "tex must be a float32 tensor")
+    if not cube_mode:
+        check(tex.dim() == 4 and tex.shape[0] > 0 and tex.shape[1] > 0 and tex.shape[2] > 0 and tex.shape[3] > 0, "tex must have shape[>0, >0, >0, >0]")
+    else:
+        check(tex.dim() == 5 and tex.shape[0] > 0 and tex.shape[1] == 6 and tex.shape[2] > 0 and tex.shape[3] > 0 and tex.shape[4] > 0, "tex must have shape[>0, 6, >0, >0, >0] in cube map mode")
+        check(tex.shape[2] == tex.shape[3], "texture shape must be square in cube map mode")
+    check(tex.shape[-2] <= (1 << TEX_MAX_MIP_LEVEL) and tex.shape[-3] <= (1 << TEX_MAX_MIP_LEVEL), "texture size too large")
+
+def construct_mip_cpu(tex, max_mip_level, cube_mode):
+    '''Builds the mip stack of `tex` by repeated 2x2 box filtering (2x1 for one-texel extents).'''
+    _check_tex(tex, cube_mode)
+    height, width, channels = tex.shape[-3:]
+    depth = tex.shape[0] * (6 if cube_mode else 1)
+    level = tex.detach().reshape(depth, height, width, channels)
+    parts = []
+    for w, h in _mip_level_sizes(width, height, max_mip_level):
+        fh, fw = level.shape[1] // h, level.shape[2] // w
+        level = level.reshape(depth, h, fh, w, fw, channels).mean(dim=(2, 4))
+        parts.append(level.reshape(-1))
+    mip = torch.cat(parts) if parts else torch.zeros(0)
+    return TextureMipCpu(mip, max_mip_level, tuple(tex.shape), cube_mode)
+
+def _texel_buffer(tex, cube_mode, enable_mip, mip_wrapper, mip_stack):
+    '''All texture levels as one [texels, C] buffer.
+
+    Returns:
+      (buffer, offsets, sizes): first texel and (w, h) of each level.
+    '''
+    height, width, channels = tex.shape[-3:]
+    depth = tex.shape[0] * (6 if cube_mode else 1)
+    parts = [tex.detach().reshape(-1, channels)]
+    sizes = [(width, height)]
+    if enable_mip:
+        if mip_stack:
+            level_sizes = [(max(width >> i, 1), max(height >> i, 1)) for i in range(1, len(mip_stack) + 1)]
+            for i, (t, (w, h)) in enumerate(zip(mip_stack, level_sizes)):
+                check(t.dtype == torch.float32 and t.device.type == 'cpu', "mip stack inputs must be float32 tensors in CPU memory")
+                if not cube_mode:
+                    check(t.dim() == 4 and t.shape[0] == tex.shape[0] and t.shape[1] == h and t.shape[2] == w and t.shape[3] == channels, "mip level size mismatch in custom mip stack")
+                else:
+                    check(t.dim() == 5 and t.shape[0] == tex.shape[0] and t.shape[1] == 6 and t.shape[2] == h and t.shape[3] == w and t.shape[4] == channels, "mip level size mismatch in mip stack")
+                if w == 1 and h == 1:
+                    check(i == len(mip_stack) - 1, "mip level size mismatch in mip stack")
+                parts.append(t.detach().reshape(-1, channels))
+        else:
+            check(tuple(tex.shape) == tuple(mip_wrapper.texture_size) and cube_mode == mip_wrapper.cube_mode, "mip does not match texture size")
+            level_sizes = _mip_level_sizes(width, height, mip_wrapper.max_mip_level)
+            check(mip_wrapper.mip.numel() == sum(w * h for w, h in level_sizes) * depth * channels, "wrapped mip tensor size mismatch")
+            parts.append(mip_wrapper.mip.view(-1, channels))
+        sizes += level_sizes
+    offsets = [0]
+    for w, h in sizes[:-1]:
+        offsets.append(offsets[-1] + depth * w * h)
+    return (torch.cat(parts) if len(parts) > 1 else parts[0]), offsets, sizes
+
+#----------------------------------------------------------------------------
+# Texel addressing.
+#----------------------------------------------------------------------------
+
+class _Lookup:
+    '''Per-pixel lookup coordinates of a chunk of pixels.'''
+    def __init__(self, uv, tz, boundary_mode):
+        self.uv = uv
+        self.tz = tz
+        self.cube = boundary_mode == 'cube'
+        self.boundary_mode = boundary_mode
+        if self.cube:
+            self.face = _cube_face(uv)
+            s, t = _cube_st(uv, self.face)
+            self.valid = torch.isfinite(s) & torch.isfinite(t)
+            self.s = torch.where(self.valid, s.clamp(0.0, 1.0), 0.0)
+            self.t = torch.where(self.valid, t.clamp(0.0, 1.0), 0.0)
+        else:
+            self.valid = torch.isfinite(uv).all(-1)
+            self.s = torch.where(self.valid, uv[:, 0], 0.0)
+            self.t = torch.where(self.valid, uv[:, 1], 0.0)
+            if boundary_mode == 'wrap':
+                self.s = self.s - torch.floor(self.s)
+                self.t = self.t - torch.floor(self.t)
+
+    def nearest(self, width, height):
+        '''Base level texel index per pixel, -1 outside the texture.'''
+        iu = torch.floor(self.s * width).long()
+        iv = torch.floor(self.t * height).long()
+        valid = self.valid
+        if self.boundary_mode == 'zero':
+            valid = valid & (iu >= 0) & (iu < width) & (iv >= 0) & (iv < height)
+        tz = 6 * self.tz + self.face if self.cube else self.tz
+        idx = iu.clamp(0, width - 1) + width * (iv.clamp(0, height - 1) + tz * height)
+        return torch.where(valid, idx, -1)
+
+    def linear(self, level, offsets, sizes):
+        '''Bilinear taps at a per-pixel mip level.
+
+        Returns:
+          (idx [P, 4], fu, fv): texel buffer indices (-1 for missing taps) of
+          the quad in order 00, 10, 01, 11, and the fractional position.
+        '''
+        w = torch.tensor([s[0] for s in sizes])[level]
+        h = torch.tensor([s[1] for s in sizes])[level]
+        u = self.s * w - 0.5
+        v = self.t * h - 0.5
+        clamp_u = clamp_v = False
+        if self.boundary_mode == 'clamp':
+            u = torch.minimum(u.clamp(min=0.0), w - 1.0) # Clamp to center of edge texels.
+            v = torch.minimum(v.clamp(min=0.0), h - 1.0)
+            clamp_u = (u == 0.0) | (u == w - 1.0)
+            clamp_v = (v == 0.0) | (v == h - 1.0)
+        iu0 = torch.floor(u).long()
+        iv0 = torch.floor(v).long()
+        iu1 = iu0 + (~clamp_u if self.boundary_mode == 'clamp' else 1) # Zero u/v gradients when clamped.
+        iv1 = iv0 + (~clamp_v if self.boundary_mode == 'clamp' else 1)
+        fu = u - iu0
+        fv = v - iv0
+
+        if self.cube:
+            tz = 6 * self.tz + self.face
+            idx = torch.stack([iu0 + w * (iv0 + tz * h), iu1 + w * (iv0 + tz * h),
+                               iu0 + w * (iv1 + tz * h), iu1 + w * (iv1 + tz * h)], dim=-1)
+            wrap = (iu0 < 0) | (iv0 < 0) | (iu1 >= w) | (iv1 >= h)
+            widx, wvalid = _wrap_cube_map(self.face, iu0, iu1, iv0, iv1, w)
+            idx = torch.where(wrap[:, None], widx + (6 * self.tz * w * h)[:, None], idx)
+            valid = torch.where(wrap[:, None], wvalid, True) & self.valid[:, None]
+        else:
+            if self.boundary_mode == 'wrap':
+                iu0 = torch.where(iu0 < 0, iu0 + w, iu0)
+                iv0 = torch.where(iv0 < 0, iv0 + h, iv0)
+                iu1 = torch.where(iu1 >= w, iu1 - w, iu1)
+                iv1 = torch.where(iv1 >= h, iv1 - h, iv1)
+            base = self.tz * w * h
+            idx = torch.stack([base + iu0 + w * iv0, base + iu1 + w * iv0,
+                               base + iu0 + w * iv1, base + iu1 + w * iv1], dim=-1)
+            valid = self.valid[:, None].expand(-1, 4)
+            if self.boundary_mode == 'zero':
+                u_in = torch.stack([(iu0 >= 0) & (iu0 < w), (iu1 >= 0) & (iu1 < w)] * 2, dim=-1)
+                v_in = torch.stack([(iv0 >= 0) & (iv0 < h)] * 2 + [(iv1 >= 0) & (iv1 < h)] * 2, dim=-1)
+                valid = valid & u_in & v_in
+        idx = torch.where(valid, idx + torch.tensor(offsets)[level][:, None], -1)
+        return idx, fu, fv
+
+def _fetch(buf, idx, cube):
+    '''Gathers the taps [P, 4, C]; missing cube corner taps average the other three.'''
+    valid = (idx >= 0)[..., None]
+    a = buf.index_select(0, idx.clamp(min=0).view(-1)).view(*idx.shape, buf.shape[-1])
+    a = torch.where(valid, a, 0.0)
+    if cube:
+        corner = (~valid).any(1, keepdim=True)
+        a = torch.where(valid, a, torch.where(corner, a.sum(1, keepdim=True) * 0.33333333, 0.0))
+    return a
+
+def _accum(g_buf, idx, c, cube):
+    '''Scatters tap gradients [P, 4, C] into the texel buffer gradient.'''
+    valid = (idx >= 0)[..., None]
+    if cube: # A missing corner tap passes its gradient to the other three.
+        c = c + (c * ~valid).sum(1, keepdim=True) * 0.33333333
+    c = torch.where(valid, c, 0.0)
+    g_buf.index_add_(0, idx.clamp(min=0).reshape(-1), c.reshape(-1, c.shape[-1]))
+
+def _bilerp(a, fu, fv):
+    fu, fv = fu[:, None], fv[:, None]
+    a0 = a[:, 0] + fu * (a[:, 1] - a[:, 0])
+    a1 = a[:, 2] + fu * (a[:, 3] - a[:, 2])
+    return a0 + fv * (a1 - a0)
+
+def _bilerp_grad_uv(a, fu, fv, dy, w, h):
+    '''Gradient of a bilinear lookup w.r.t. texel space (u, v), scaled to unit texture coordinates.'''
+    ad = a[:, 3] + a[:, 0] - a[:, 1] - a[:, 2]
+    gu = (dy * ((a[:, 1] - a[:, 0]) + fv[:, None] * ad)).sum(-1) * w
+    gv = (dy * ((a[:, 2] - a[:, 0]) + fu[:, None] * ad)).sum(-1) * h
+    return gu, gv
+
+#----------------------------------------------------------------------------
+# Mip level selection.
+#----------------------------------------------------------------------------
+
+def _mip_level_raw(lookup, uv, uv_da, mip_level_bias, width, height):
+    '''Unclamped fractional mip level per pixel; differentiable w.r.t. uv, uv_da and bias.'''
+    flevel = 0.0
+    if uv_da is not None:
+        if lookup.cube:
+            da = _cube_st_da(uv, uv_da, lookup.face) # d{s,t}/d{X,Y}
+            ok = _finite_rows(*da)
+            dsdx, dsdy, dtdx, dtdy = [torch.where(ok, d, 0.0) for d in da]
+        else:
+            dsdx, dsdy, dtdx, dtdy = uv_da.unbind(-1)
+        dsdx, dsdy = dsdx * width, dsdy * width
+        dtdx, dtdy = dtdx * height, dtdy * height
+
+        # Footprint axis lengths.
+        A = dsdx * dsdx + dtdx * dtdx
+        B = dsdy * dsdy + dtdy * dtdy
+        C = dsdx * dsdy + dtdx * dtdy
+        l2b = 0.5 * (A + B)
+        l2a = torch.sqrt(0.25 * (A - B) * (A - B) + C * C)
+        flevel = 0.5 * torch.log2(l2b + l2a)
+    if mip_level_bias is not None:
+        flevel = flevel + mip_level_bias
+    return flevel
+
+def _mip_levels(lookup, uv_da, mip_level_bias, filter_mode, width, height, mip_level_max):
+    '''Discrete levels and the blend factor between them, like calculateMipLevel().'''
+    with torch.no_grad():
+        flevel = _mip_level_raw(lookup, lookup.uv, uv_da, mip_level_bias, width, height)
+    flevel = torch.nan_to_num(torch.as_tensor(flevel, dtype=torch.float32).expand(lookup.uv.shape[0]), nan=0.0)
+    flevel = flevel.clamp(0.0, float(mip_level_max))
+    level0 = torch.floor(flevel).long()
+    if filter_mode != 'linear-mipmap-linear':
+        return level0, level0, torch.zeros_like(flevel)
+    blend = flevel > 0.0 # Zero in magnification.
+    level1 = torch.where(blend, torch.clamp(level0 + 1, max=mip_level_max), 0)
+    return level0, level1, torch.where(blend, flevel - level0, 0.0)
+
+#----------------------------------------------------------------------------
+# Forward and gradient.
+#----------------------------------------------------------------------------
+
+def _check_inputs(tex, uv, uv_da, mip_level_bias, filter_mode, boundary_mode):
+    check(filter_mode in FILTER_MODES, "filter_mode unsupported")
+    check(boundary_mode in BOUNDARY_MODES, "boundary_mode unsupported")
+    cube_mode = boundary_mode == 'cube'
+    _check_tex(tex, cube_mode)
+    check(uv.device.type == 'cpu' and uv.dtype == torch.float32, "uv must be a float32 tensor in CPU memory")
+    k = 3 if cube_mode else 2
+    check(uv.dim() == 4 and uv.shape[0] > 0 and uv.shape[1] > 0 and uv.shape[2] > 0 and uv.shape[3] == k, "uv must have shape [>0, >0, >0, %d]%s" % (k, " in cube map mode" if cube_mode else ""))
+    check(tex.shape[0] == 1 or tex.shape[0] == uv.shape[0], "minibatch size mismatch between inputs tex, uv")
+    if 'mipmap' in filter_mode:
+        check(uv_da is not None or mip_level_bias is not None, "mipmapping filter mode requires uv_da and/or mip_level_bias input")
+        if uv_da is not None:
+            check(uv_da.shape == uv.shape[:3] + (2 * k,), "uv_da must have shape [minibatch_size, height, width, %d]%s" % (2 * k, " in cube map mode" if cube_mode else ""))
+        if mip_level_bias is not None:
+            check(mip_level_bias.shape == uv.shape[:3], "mip_level_bias must have shape [minibatch_size, height, width]")
+
+def _chunks(uv, tex, channels):
+    '''Pixel ranges of the flattened minibatch, and the texture layer of every pixel.'''
+    n, height, width = uv.shape[:3]
+    pixels = n * height * width
+    tz = torch.arange(n).repeat_interleave(height * width) if tex.shape[0] > 1 else torch.zeros(pixels, dtype=torch.int64)
+    step = max(1, MAX_CHUNK_ELEMENTS // (8 * channels + 32))
+    for p0 in range(0, pixels, step):
+        yield p0, min(pixels, p0 + step), tz[p0:p0 + step]
+
+def texture_fwd_cpu(tex, uv, filter_mode, boundary_mode, uv_da=None, mip_level_bias=None, mip_wrapper=None, mip_stack=()):
+    '''Forward texture sampling like `texture_fwd_mip`.'''
+    _check_inputs(tex, uv, uv_da, mip_level_bias, filter_mode, boundary_mode)
+    cube = boundary_mode == 'cube'
+    enable_mip = 'mipmap' in filter_mode
+    buf, offsets, sizes = _texel_buffer(tex, cube, enable_mip, mip_wrapper, mip_stack)
+    channels = buf.shape[-1]
+    width, height = sizes[0]
+
+    uv_flat = uv.detach().reshape(-1, uv.shape[-1])
+    uv_da_flat = uv_da.detach().reshape(-1, uv_da.shape[-1]).float() if (enable_mip and uv_da is not None) else None
+    bias_flat = mip_level_bias.detach().reshape(-1).float() if (enable_mip and mip_level_bias is not None) else None
+    out = torch.zeros(uv_flat.shape[0], channels)
+    for p0, p1, tz in _chunks(uv, tex, channels):
+        lookup = _Lookup(uv_flat[p0:p1], tz, boundary_mode)
+        if filter_mode == 'nearest':
+            idx = lookup.nearest(width, height)
+            out[p0:p1] = torch.where((idx >= 0)[:, None], buf[idx.clamp(min=0)], 0.0)
+            continue
+
+        if enable_mip:
+            level0, level1, blend = _mip_levels(lookup, uv_da_flat[p0:p1] if uv_da_flat is not None else None,
+                                                bias_flat[p0:p1] if bias_flat is not None else None,
+                                                filter_mode, width, height, len(sizes) - 1)
+        else:
+            level0 = torch.zeros(p1 - p0, dtype=torch.int64)
+        idx0, fu0, fv0 = lookup.linear(level0, offsets, sizes)
+        a = _bilerp(_fetch(buf, idx0, cube), fu0, fv0)
+        if filter_mode == 'linear-mipmap-linear':
+            idx1, fu1, fv1 = lookup.linear(level1, offsets, sizes)
+            b = _bilerp(_fetch(buf, idx1, cube), fu1, fv1)
+            a = a + blend[:, None] * (b - a) # Interpolate between levels.
+        out[p0:p1] = a
+    return out.view(*uv.shape[:3], channels)
+
+def _pull_mip_grad(g_buf, tex, cube, offsets, sizes):
+    '''Adds the gradients of mip levels to the base texture, like the mip gradient puller kernel.'''
+    channels = g_buf.shape[-1]
+    depth = tex.shape[0] * (6 if cube else 1)
+    levels = [g_buf[o:o + depth * w * h].view(depth, h, w, channels) for o, (w, h) in zip(offsets, sizes)]
+    for i in range(len(levels) - 1, 0, -1):
+        (w, h), (pw, ph) = sizes[i], sizes[i - 1]
+        fh, fw = ph // h, pw // w
+        up = levels[i][:, :, None, :, None, :].expand(depth, h, fh, w, fw, channels).reshape(depth, ph, pw, channels)
+        levels[i - 1] += up * (1.0 / (fh * fw))
+    return levels[0]
+
+def texture_grad_cpu(tex, uv, dy, filter_mode, boundary_mode, uv_da=None, mip_level_bias=None, mip_wrapper=None, mip_stack=()):
+    '''Gradients like `texture_grad_linear_mipmap_linear`.
+
+    Returns:
+      (g_tex, g_uv, g_uv_da, g_mip_level_bias, g_mip_stack); entries that the
+      filter mode does not produce are None.
+    '''
+    cube = boundary_mode == 'cube'
+    enable_mip = 'mipmap' in filter_mode
+    trilinear = filter_mode == 'linear-mipmap-linear'
+    buf, offsets, sizes = _texel_buffer(tex, cube, enable_mip, mip_wrapper, mip_stack)
+    channels = buf.shape[-1]
+    width, height = sizes[0]
+    sizes_w = torch.tensor([s[0] for s in sizes], dtype=torch.float32)
+    sizes_h = torch.tensor([s[1] for s in sizes], dtype=torch.float32)
+
+    uv_flat = uv.detach().reshape(-1, uv.shape[-1])
+    dy_flat = dy.reshape(-1, channels).float()
+    uv_da_flat = uv_da.detach().reshape(-1, uv_da.shape[-1]).float() if (enable_mip and uv_da is not None) else None
+    bias_flat = mip_level_bias.detach().reshape(-1).float() if (enable_mip and mip_level_bias is not None) else None
+    g_buf = torch.zeros_like(buf)
+    g_uv = torch.zeros_like(uv_flat) if filter_mode != 'nearest' else None
+    g_uv_da = torch.zeros_like(uv_da_flat) if (trilinear and uv_da_flat is not None) else None
+    g_bias = torch.zeros_like(bias_flat) if (trilinear and bias_flat is not None) else None
+
+    for p0, p1, tz in _chunks(uv, tex, channels):
+        lookup = _Lookup(uv_flat[p0:p1], tz, boundary_mode)
+        g = dy_flat[p0:p1]
+        if filter_mode == 'nearest':
+            idx = lookup.nearest(width, height)
+            g_buf.index_add_(0, idx.clamp(min=0), torch.where((idx >= 0)[:, None], g, 0.0))
+            continue
+
+        pix_da = uv_da_flat[p0:p1] if uv_da_flat is not None else None
+        pix_bias = bias_flat[p0:p1] if bias_flat is not None else None
+        if enable_mip:
+            level0, level1, blend = _mip_levels(lookup, pix_da, pix_bias, filter_mode, width, height, len(sizes) - 1)
+        else:
+            level0 = torch.zeros(p1 - p0, dtype=torch.int64)
+            blend = torch.zeros(p1 - p0)
+
+        # First level: texture and uv gradients.
+        idx0, fu0, fv0 = lookup.linear(level0, offsets, sizes)
+        a = _fetch(buf, idx0, cube)
+        g0 = (1.0 - blend)[:, None] * g
+        tw0 = torch.stack([(1 - fu0) * (1 - fv0), fu0 * (1 - fv0), (1 - fu0) * fv0, fu0 * fv0], dim=-1)
+        _accum(g_buf, idx0, tw0[..., None] * g0[:, None], cube)
+        gu, gv = _bilerp_grad_uv(a, fu0, fv0, g0, sizes_w[level0], sizes_h[level0])
+
+        # Second level and mip level gradient.
+        if trilinear:
+            idx1, fu1, fv1 = lookup.linear(level1, offsets, sizes)
+            b = _fetch(buf, idx1, cube)
+            g1 = blend[:, None] * g
+            tw1 = torch.stack([(1 - fu1) * (1 - fv1), fu1 * (1 - fv1), (1 - fu1) * fv1, fu1 * fv1], dim=-1)
+            _accum(g_buf, idx1, tw1[..., None] * g1[:, None], cube)
+            gu1, gv1 = _bilerp_grad_uv(b, fu1, fv1, g1, sizes_w[level1], sizes_h[level1])
+            gu, gv = gu + gu1, gv + gv1
+            df = torch.where(blend > 0.0, ((_bilerp(b, fu1, fv1) - _bilerp(a, fu0, fv0)) * g).sum(-1), 0.0)
+
+        # UV gradients; cube maps chain them through the face projection.
+        if cube:
+            with torch.enable_grad():
+                uvw = lookup.uv.clone().requires_grad_(True)
+                s, t = _cube_st(uvw, lookup.face)
+                g_uvw, = torch.autograd.grad((s, t), uvw, (gu, gv))
+            g_uv[p0:p1] = torch.where(_finite_rows(g_uvw)[:, None], g_uvw, 0.0)
+        else:
+            g_uv[p0:p1] = torch.stack([gu, gv], dim=-1)
+
+        if trilinear:
+            if g_bias is not None:
+                g_bias[p0:p1] = df
+            if pix_da is not None:
+                # Footprint vs. mip level gradient, and in cube maps also texture coordinate vs. mip level.
+                with torch.enable_grad():
+                    uvw = lookup.uv.clone().requires_grad_(cube)
+                    da = pix_da.clone().requires_grad_(True)
+                    flevel = _mip_level_raw(lookup, uvw, da, None, width, height)
+                    grads = torch.autograd.grad(flevel, [da, uvw] if cube else [da], df)
+                ok = _finite_rows(*grads)
+                g_uv_da[p0:p1] = torch.where(ok[:, None], grads[0], 0.0)
+                if cube:
+                    g_uv[p0:p1] += torch.where(ok[:, None], grads[1], 0.0)
+
+    # Texture gradients: pull mip levels to the base texture, or hand them to the custom stack.
+    g_mip_stack = []
+    if enable_mip and mip_stack:
+        depth = tex.shape[0] * (6 if cube else 1)
+        for t, o, (w, h) in zip(mip_stack, offsets[1:], sizes[1:]):
+            g_mip_stack.append(g_buf[o:o + depth * w * h].view(t.shape))
+        g_tex = g_buf[:offsets[1]].view(tex.shape) if len(offsets) > 1 else g_buf.view(tex.shape)
+    elif enable_mip:
+        g_tex = _pull_mip_grad(g_buf, tex, cube, offsets, sizes).reshape(tex.shape)
+    else:
+        g_tex = g_buf.view(tex.shape)
+
+    view = lambda x, shape: x.view(shape) if x is not None else None
+    return (g_tex, view(g_uv, uv.shape), view(g_uv_da, uv_da.shape if uv_da is not None else None),
+            view(g_bias, mip_level_bias.shape if mip_level_bias is not None else None), g_mip_stack)
+
+#----------------------------------------------------------------------------
@@ -6,10 +6,35 @@
 # distribution of this software and related documentation without an express
 # license agreement from NVIDIA CORPORATION is strictly prohibited.
 
+import contextlib
 import numpy as np
 import torch
 import warnings
-import _nvdiffrast_c
+
+from . import cpu_rasterize, cpu_interpolate, cpu_texture, cpu_antialias
+from .cpu_rasterize import RasterizeCpuContext
+from .cache import TensorCache, tensor_version, storage_key, identity_guard
+from .profiler import Profiler
+
+#----------------------------------------------------------------------------
+# C++/Cuda plugin loader.
+#----------------------------------------------------------------------------
+
+_cached_plugin = None
+_log_level = 1 # Applied to the plugin when it is loaded.
+
+def _get_plugin():
+    '''Import the compiled extension on first use, i.e., with the first Cuda tensors.'''
+    global _cached_plugin
+    if _cached_plugin is None:
+        import _nvdiffrast_c
+        _nvdiffrast_c.set_log_level(_log_level)
+        _cached_plugin = _nvdiffrast_c
+    return _cached_plugin
+
+def _is_cpu(x):
+    '''True if the op runs on the CPU implementation, chosen by the device of its main input.'''
+    return x.device.type == 'cpu'
 
 #----------------------------------------------------------------------------
 # Log level.
@@ -21,7 +46,9 @@ def get_log_level():
     Returns:
       Current log level in nvdiffrast. See `set_log_level()` for possible values.
     '''
-    return _nvdiffrast_c.get_log_level()
+    if _cached_plugin is not None:
+        return _cached_plugin.get_log_level()
+    return _log_level
 
 def set_log_level(level):
     '''Set log level.
@@ -38,7 +65,143 @@ def set_log_level(level):
              severity or higher will be printed, while messages of lower
              severity will be silent.
     '''
-    _nvdiffrast_c.set_log_level(level)
+    global _log_level
+    _log_level = level
+    if _cached_plugin is not None:
+        _cached_plugin.set_log_level(level)
+
+#----------------------------------------------------------------------------
+# Mipmap cache.
+#----------------------------------------------------------------------------
+
+_mip_cache = TensorCache(max_bytes=0) # Disabled until set_mip_cache_size() is called.
+
+def set_mip_cache_size(max_bytes):
+    '''Set the memory limit of the mipmap cache.
+
+    When the limit is nonzero, `texture()` calls that need a mipmap stack but get
+    no `mip` argument reuse the stack built for the same texture tensor in an
+    earlier call instead of constructing and discarding one every time. Entries
+    are keyed on the identity of the texture tensor and its version counter, so
+    modifying the texture in place (e.g., an optimizer step) or freeing it
+    invalidates its entry. Changes made through `.data` bypass the version
+    counter and are not detected. Least recently used stacks are evicted to stay
+    within the limit.
+
+    Args:
+      max_bytes: Limit on the summed size of cached mipmap stacks in bytes.
+                 Zero disables the cache and releases all entries, None
+                 removes the limit. The cache is disabled by default.
+    '''
+    assert max_bytes is None or int(max_bytes) >= 0
+    _mip_cache.resize(max_bytes=None if max_bytes is None else int(max_bytes))
+    if not _mip_cache.enabled:
+        _mip_cache.clear()
+
+def get_mip_cache_stats():
+    '''Get mipmap cache statistics.
+
+    Returns:
+      Dict with `hits`, `misses`, `hit_rate`, `evictions`, `invalidations` (entries
+      dropped because the texture changed), current `entries` and `bytes`, and
+      the `max_bytes` limit.
+    '''
+    stats = _mip_cache.stats()
+    del stats['max_entries']
+    return stats
+
+#----------------------------------------------------------------------------
+# Topology hash cache.
+#----------------------------------------------------------------------------
+
+_topology_hash_cache = TensorCache(max_entries=16)
+
+def set_topology_hash_cache_size(max_entries):
+    '''Set the number of topology hashes kept by `antialias()`.
+
+    `antialias()` calls without `topology_hash` look the hash up by the memory
+    of the `tri` tensor (storage, offset, shape and strides) and its version
+    counter, so rendering the same triangle tensor again, e.g., from another
+    view, reuses the hash while modifying it in place rebuilds it. A cached hash
+    keeps its `tri` tensor alive. Least recently used hashes are evicted.
+
+    Args:
+      max_entries: Number of cached hashes. Zero disables the cache and
+                   releases all entries. The default is 16.
+    '''
+    assert int(max_entries) >= 0
+    _topology_hash_cache.resize(max_entries=int(max_entries))
+
+def get_topology_hash_cache_stats():
+    '''Get topology hash cache statistics.
+
+    Returns:
+      Dict with `hits`, `misses`, `hit_rate`, `evictions`, `invalidations` (entries
+      dropped because the triangles changed), current `entries`, and the
+      `max_entries` limit.
+    '''
+    stats = _topology_hash_cache.stats()
+    del stats['bytes'], stats['max_bytes']
+    return stats
+
+#----------------------------------------------------------------------------
+# Profiling.
+#----------------------------------------------------------------------------
+
+_profiler = None # Set while a profile() block is active.
+_not_profiled = contextlib.nullcontext()
+
+@contextlib.contextmanager
+def profile(trace_path=None, sync_cuda=True):
+    '''Record the time and input sizes of every op called inside the block.
+
+    The forward pass of `rasterize()`, `DepthPeeler.rasterize_next_layer()`,
+    `interpolate()`, `texture()` and `antialias()`, their backward passes, and the
+    mipmap and topology hash constructions done for them are each recorded as an
+    event with its wall time and the number of triangles, pixels and texels it
+    processed. Backward passes run after the block ends are not recorded. With no
+    active block, the ops only check a global and record nothing.
+
+    Example:
+        with dr.profile('trace.json') as prof:
+            loss = render(...)
+            loss.backward()
+        print(prof.summary())
+
+    Args:
+      trace_path (Optional): Write the events to this file as a Chrome trace when
+                             the block ends, for chrome://tracing or Perfetto.
+      sync_cuda: Synchronize before and after each op on Cuda tensors, so that
+                 asynchronous kernels are timed rather than their launches.
+
+    Returns:
+      A `Profiler` whose `summary()` gives a table per op and phase, `stats()` the
+      same as a list of dicts, and `export_chrome_trace(path)` writes a trace.
+    '''
+    global _profiler
+    if _profiler is not None:
+        raise RuntimeError("Cannot nest profile() blocks")
+    profiler = Profiler(sync_cuda=sync_cuda)
+    _profiler = profiler
+    try:
+        yield profiler
+    finally:
+        _profiler = None
+        if trace_path is not None:
+            profiler.export_chrome_trace(trace_path)
+
+def _profiled(name, phase, device, sizes=None):
+    '''Context recording an op event in the active profiler, or a shared no-op context.'''
+    if _profiler is None:
+        return _not_profiled
+    return _profiler.record(name, phase, device, sizes)
+
+def _pixels(x):
+    '''Pixel count of an image tensor [minibatch_size, height, width, channels].'''
+    return x.shape[0] * x.shape[1] * x.shape[2]
+
+def _rasterize_op_name(peeling_idx):
+    return 'rasterize' if peeling_idx < 0 else 'DepthPeeler.rasterize_next_layer'
 
 #----------------------------------------------------------------------------
 # CudaRaster state wrapper.
@@ -55,17 +218,34 @@ class RasterizeCudaContext:
           device (Optional): Cuda device on which the context is created. Type can be
                              `torch.device`, string (e.g., `'cuda:1'`), or int. If not
                              specified, context will be created on currently active Cuda
-                             device.
+                             device, or without one if Cuda is not available or the
+                             device is `'cpu'`.
         Returns:
-          The newly created Cuda rasterizer context.
+          The newly created Cuda rasterizer context. The Cuda rasterizer state is
+          created when the context is first used with Cuda tensors; with CPU tensors
+          the context rasterizes on the CPU like `RasterizeCpuContext`.
         '''
         if device is None:
-            cuda_device_idx = torch.cuda.current_device()
+            cuda_device_idx = torch.cuda.current_device() if torch.cuda.is_available() else None
+        elif torch.device(device).type == 'cpu':
+            cuda_device_idx = None
         else:
             with torch.cuda.device(device):
                 cuda_device_idx = torch.cuda.current_device()
-        self.cpp_wrapper = _nvdiffrast_c.RasterizeCRStateWrapper(cuda_device_idx)
+        self.cuda_device_idx = cuda_device_idx
+        self._cpp_wrapper = None
         self.active_depth_peeler = None
+        self.tile_size = cpu_rasterize.TILE_SIZE # CPU rasterizer state, see RasterizeCpuContext.
+        self.num_threads = None
+        self.depth_buffer = None
+
+    @property
+    def cpp_wrapper(self):
+        if self._cpp_wrapper is None:
+            if self.cuda_device_idx is None:
+                raise RuntimeError("Cuda is not available; use CPU tensors to rasterize on the CPU")
+            self._cpp_wrapper = _get_plugin().RasterizeCRStateWrapper(self.cuda_device_idx)
+        return self._cpp_wrapper
 
 
 #----------------------------------------------------------------------------
@@ -75,18 +255,25 @@ class RasterizeCudaContext:
 class _rasterize_func(torch.autograd.Function):
     @staticmethod
     def forward(ctx, raster_ctx, pos, tri, resolution, ranges, grad_db, peeling_idx):
-        out, out_db = _nvdiffrast_c.rasterize_fwd_cuda(raster_ctx.cpp_wrapper, pos, tri, resolution, ranges, peeling_idx)
+        if _is_cpu(pos) or isinstance(raster_ctx, RasterizeCpuContext):
+            out, out_db = cpu_rasterize.rasterize_fwd_cpu(raster_ctx, pos, tri, resolution, ranges, peeling_idx)
+        else:
+            out, out_db = _get_plugin().rasterize_fwd_cuda(raster_ctx.cpp_wrapper, pos, tri, resolution, ranges, peeling_idx)
         ctx.save_for_backward(pos, tri, out)
         ctx.saved_grad_db = grad_db
+        ctx.saved_peeling_idx = peeling_idx
         return out, out_db
 
     @staticmethod
     def backward(ctx, dy, ddb):
         pos, tri, out = ctx.saved_tensors
-        if ctx.saved_grad_db:
-            g_pos = _nvdiffrast_c.rasterize_grad_db(pos, tri, out, dy, ddb)
-        else:
-            g_pos = _nvdiffrast_c.rasterize_grad(pos, tri, out, dy)
+        with _profiled(_rasterize_op_name(ctx.saved_peeling_idx), 'backward', pos.device, lambda: dict(triangles=tri.shape[0], pixels=_pixels(out))):
+            if _is_cpu(pos):
+                g_pos = cpu_rasterize.rasterize_grad_cpu(pos, tri, out, dy, ddb if ctx.saved_grad_db else None)
+            elif ctx.saved_grad_db:
+                g_pos = _get_plugin().rasterize_grad_db(pos, tri, out, dy, ddb)
+            else:
+                g_pos = _get_plugin().rasterize_grad(pos, tri, out, dy)
         return None, g_pos, None, None, None, None, None
 
 # Op wrapper.
@@ -95,10 +282,12 @@ def rasterize(glctx, pos, tri, resolution, ranges=None, grad_db=True):
 
     All input tensors must be contiguous and reside in GPU memory except for
     the `ranges` tensor that, if specified, has to reside in CPU memory. The
-    output tensors will be contiguous and reside in GPU memory.
+    output tensors will be contiguous and reside in GPU memory. If `pos` and
+    `tri` reside in CPU memory, rasterization runs on the CPU and the outputs
+    reside in CPU memory.
 
     Args:
-        glctx: Rasterizer context of type `RasterizeCudaContext`.
+        glctx: Rasterizer context of type `RasterizeCudaContext` or `RasterizeCpuContext`.
         pos: Vertex position tensor with dtype `torch.float32`. To enable range
              mode, this tensor should have a 2D shape [num_vertices, 4]. To enable
              instanced mode, use a 3D shape [minibatch_size, num_vertices, 4].
@@ -116,7 +305,7 @@ def rasterize(glctx, pos, tri, resolution, ranges=None, grad_db=True):
         (u, v, z/w, triangle_id). The second output tensor contains image-space
         derivatives of barycentrics in order (du/dX, du/dY, dv/dX, dv/dY).
     '''
-    assert isinstance(glctx, RasterizeCudaContext)
+    assert isinstance(glctx, (RasterizeCudaContext, RasterizeCpuContext))
     assert grad_db is True or grad_db is False
 
     # Sanitize inputs.
@@ -132,7 +321,12 @@ def rasterize(glctx, pos, tri, resolution, ranges=None, grad_db=True):
         return RuntimeError("Cannot call rasterize() during depth peeling operation, use rasterize_next_layer() instead")
 
     # Instantiate the function.
-    return _rasterize_func.apply(glctx, pos, tri, resolution, ranges, grad_db, -1)
+    with _profiled('rasterize', 'forward', pos.device, lambda: _rasterize_sizes(pos, tri, resolution, ranges)):
+        return _rasterize_func.apply(glctx, pos, tri, resolution, ranges, grad_db, -1)
+
+def _rasterize_sizes(pos, tri, resolution, ranges):
+    minibatch_size = pos.shape[0] if pos.dim() == 3 else ranges.shape[0]
+    return dict(triangles=tri.shape[0], pixels=minibatch_size * resolution[0] * resolution[1])
 
 #----------------------------------------------------------------------------
 # Depth peeler context manager for rasterizing multiple depth layers.
@@ -147,7 +341,7 @@ class DepthPeeler:
         Returns:
           The newly created depth peeler.
         '''
-        assert isinstance(glctx, RasterizeCudaContext)
+        assert isinstance(glctx, (RasterizeCudaContext, RasterizeCpuContext))
         assert grad_db is True or grad_db is False
 
         # Sanitize inputs as usual.
@@ -199,7 +393,8 @@ class DepthPeeler:
         '''
         assert self.raster_ctx.active_depth_peeler is self
         assert self.peeling_idx >= 0
-        result = _rasterize_func.apply(self.raster_ctx, self.pos, self.tri, self.resolution, self.ranges, self.grad_db, self.peeling_idx)
+        with _profiled(_rasterize_op_name(self.peeling_idx), 'forward', self.pos.device, lambda: _rasterize_sizes(self.pos, self.tri, self.resolution, self.ranges)):
+            result = _rasterize_func.apply(self.raster_ctx, self.pos, self.tri, self.resolution, self.ranges, self.grad_db, self.peeling_idx)
         self.peeling_idx += 1
         return result
 
@@ -211,7 +406,10 @@ class DepthPeeler:
 class _interpolate_func_da(torch.autograd.Function):
     @staticmethod
     def forward(ctx, attr, rast, tri, rast_db, diff_attrs_all, diff_attrs_list):
-        out, out_da = _nvdiffrast_c.interpolate_fwd_da(attr, rast, tri, rast_db, diff_attrs_all, diff_attrs_list)
+        if _is_cpu(attr):
+            out, out_da = cpu_interpolate.interpolate_fwd_cpu(attr, rast, tri, rast_db, diff_attrs_all, diff_attrs_list)
+        else:
+            out, out_da = _get_plugin().interpolate_fwd_da(attr, rast, tri, rast_db, diff_attrs_all, diff_attrs_list)
         ctx.save_for_backward(attr, rast, tri, rast_db)
         ctx.saved_misc = diff_attrs_all, diff_attrs_list
         return out, out_da
@@ -220,21 +418,32 @@ class _interpolate_func_da(torch.autograd.Function):
     def backward(ctx, dy, dda):
         attr, rast, tri, rast_db = ctx.saved_tensors
         diff_attrs_all, diff_attrs_list = ctx.saved_misc
-        g_attr, g_rast, g_rast_db = _nvdiffrast_c.interpolate_grad_da(attr, rast, tri, dy, rast_db, dda, diff_attrs_all, diff_attrs_list)
+        with _profiled('interpolate', 'backward', attr.device, lambda: dict(triangles=tri.shape[0], pixels=_pixels(rast))):
+            if _is_cpu(attr):
+                g_attr, g_rast, g_rast_db = cpu_interpolate.interpolate_grad_cpu(attr, rast, tri, dy, rast_db, dda, diff_attrs_all, diff_attrs_list)
+            else:
+                g_attr, g_rast, g_rast_db = _get_plugin().interpolate_grad_da(attr, rast, tri, dy, rast_db, dda, diff_attrs_all, diff_attrs_list)
         return g_attr, g_rast, None, g_rast_db, None, None
 
 # No pixel differential for any attribute.
 class _interpolate_func(torch.autograd.Function):
     @staticmethod
     def forward(ctx, attr, rast, tri):
-        out, out_da = _nvdiffrast_c.interpolate_fwd(attr, rast, tri)
+        if _is_cpu(attr):
+            out, out_da = cpu_interpolate.interpolate_fwd_cpu(attr, rast, tri)
+        else:
+            out, out_da = _get_plugin().interpolate_fwd(attr, rast, tri)
         ctx.save_for_backward(attr, rast, tri)
         return out, out_da
 
     @staticmethod
     def backward(ctx, dy, _):
         attr, rast, tri = ctx.saved_tensors
-        g_attr, g_rast = _nvdiffrast_c.interpolate_grad(attr, rast, tri, dy)
+        with _profiled('interpolate', 'backward', attr.device, lambda: dict(triangles=tri.shape[0], pixels=_pixels(rast))):
+            if _is_cpu(attr):
+                g_attr, g_rast, _ = cpu_interpolate.interpolate_grad_cpu(attr, rast, tri, dy)
+            else:
+                g_attr, g_rast = _get_plugin().interpolate_grad(attr, rast, tri, dy)
         return g_attr, g_rast, None
 
 # Op wrapper.
@@ -242,7 +451,8 @@ def interpolate(attr, rast, tri, rast_db=None, diff_attrs=None):
     """Interpolate vertex attributes.
 
     All input tensors must be contiguous and reside in GPU memory. The output tensors
-    will be contiguous and reside in GPU memory.
+    will be contiguous and reside in GPU memory. If `attr` resides in CPU memory, all
+    inputs must, and interpolation runs on the CPU.
 
     Args:
         attr: Attribute tensor with dtype `torch.float32`. 
@@ -285,10 +495,11 @@ def interpolate(attr, rast, tri, rast_db=None, diff_attrs=None):
         assert isinstance(rast_db, torch.Tensor)
 
     # Choose stub.
-    if diff_attrs:
-        return _interpolate_func_da.apply(attr, rast, tri, rast_db, diff_attrs_all, diff_attrs_list)
-    else:
-        return _interpolate_func.apply(attr, rast, tri)
+    with _profiled('interpolate', 'forward', attr.device, lambda: dict(triangles=tri.shape[0], pixels=_pixels(rast))):
+        if diff_attrs:
+            return _interpolate_func_da.apply(attr, rast, tri, rast_db, diff_attrs_all, diff_attrs_list)
+        else:
+            return _interpolate_func.apply(attr, rast, tri)
 
 #----------------------------------------------------------------------------
 # Texture
@@ -298,14 +509,19 @@ def interpolate(attr, rast, tri, rast_db=None, diff_attrs=None):
 class _texture_func_mip(torch.autograd.Function):
     @staticmethod
     def forward(ctx, filter_mode, tex, uv, uv_da, mip_level_bias, mip_wrapper, filter_mode_enum, boundary_mode_enum, *mip_stack):
+        if _is_cpu(tex):
+            out = cpu_texture.texture_fwd_cpu(tex, uv, filter_mode, cpu_texture.BOUNDARY_MODES[boundary_mode_enum], uv_da, mip_level_bias, mip_wrapper, mip_stack)
+            ctx.save_for_backward(tex, uv, uv_da, mip_level_bias, *mip_stack)
+            ctx.saved_misc = filter_mode, mip_wrapper, filter_mode_enum, boundary_mode_enum
+            return out
         empty = torch.tensor([])
         if uv_da is None:
             uv_da = empty
         if mip_level_bias is None:
             mip_level_bias = empty
         if mip_wrapper is None:
-            mip_wrapper = _nvdiffrast_c.TextureMipWrapper()
-        out = _nvdiffrast_c.texture_fwd_mip(tex, uv, uv_da, mip_level_bias, mip_wrapper, mip_stack, filter_mode_enum, boundary_mode_enum)
+            mip_wrapper = _get_plugin().TextureMipWrapper()
+        out = _get_plugin().texture_fwd_mip(tex, uv, uv_da, mip_level_bias, mip_wrapper, mip_stack, filter_mode_enum, boundary_mode_enum)
         ctx.save_for_backward(tex, uv, uv_da, mip_level_bias, *mip_stack)
         ctx.saved_misc = filter_mode, mip_wrapper, filter_mode_enum, boundary_mode_enum
         return out
@@ -314,18 +530,27 @@ class _texture_func_mip(torch.autograd.Function):
     def backward(ctx, dy):
         tex, uv, uv_da, mip_level_bias, *mip_stack = ctx.saved_tensors
         filter_mode, mip_wrapper, filter_mode_enum, boundary_mode_enum = ctx.saved_misc
-        if filter_mode == 'linear-mipmap-linear':
-            g_tex, g_uv, g_uv_da, g_mip_level_bias, g_mip_stack = _nvdiffrast_c.texture_grad_linear_mipmap_linear(tex, uv, dy, uv_da, mip_level_bias, mip_wrapper, mip_stack, filter_mode_enum, boundary_mode_enum)
-            return (None, g_tex, g_uv, g_uv_da, g_mip_level_bias, None, None, None) + tuple(g_mip_stack)
-        else: # linear-mipmap-nearest
-            g_tex, g_uv, g_mip_stack = _nvdiffrast_c.texture_grad_linear_mipmap_nearest(tex, uv, dy, uv_da, mip_level_bias, mip_wrapper, mip_stack, filter_mode_enum, boundary_mode_enum)
-            return (None, g_tex, g_uv, None, None, None, None, None) + tuple(g_mip_stack)
+        with _profiled('texture', 'backward', tex.device, lambda: _texture_sizes(tex, uv)):
+            if _is_cpu(tex):
+                g_tex, g_uv, g_uv_da, g_mip_level_bias, g_mip_stack = cpu_texture.texture_grad_cpu(tex, uv, dy, filter_mode, cpu_texture.BOUNDARY_MODES[boundary_mode_enum], uv_da, mip_level_bias, mip_wrapper, mip_stack)
+                if filter_mode == 'linear-mipmap-nearest':
+                    g_uv_da, g_mip_level_bias = None, None
+                return (None, g_tex, g_uv, g_uv_da, g_mip_level_bias, None, None, None) + tuple(g_mip_stack)
+            if filter_mode == 'linear-mipmap-linear':
+                g_tex, g_uv, g_uv_da, g_mip_level_bias, g_mip_stack = _get_plugin().texture_grad_linear_mipmap_linear(tex, uv, dy, uv_da, mip_level_bias, mip_wrapper, mip_stack, filter_mode_enum, boundary_mode_enum)
+                return (None, g_tex, g_uv, g_uv_da, g_mip_level_bias, None, None, None) + tuple(g_mip_stack)
+            else: # linear-mipmap-nearest
+                g_tex, g_uv, g_mip_stack = _get_plugin().texture_grad_linear_mipmap_nearest(tex, uv, dy, uv_da, mip_level_bias, mip_wrapper, mip_stack, filter_mode_enum, boundary_mode_enum)
+                return (None, g_tex, g_uv, None, None, None, None, None) + tuple(g_mip_stack)
 
 # Linear and nearest: Mipmaps disabled.
 class _texture_func(torch.autograd.Function):
     @staticmethod
     def forward(ctx, filter_mode, tex, uv, filter_mode_enum, boundary_mode_enum):
-        out = _nvdiffrast_c.texture_fwd(tex, uv, filter_mode_enum, boundary_mode_enum)
+        if _is_cpu(tex):
+            out = cpu_texture.texture_fwd_cpu(tex, uv, filter_mode, cpu_texture.BOUNDARY_MODES[boundary_mode_enum])
+        else:
+            out = _get_plugin().texture_fwd(tex, uv, filter_mode_enum, boundary_mode_enum)
         ctx.save_for_backward(tex, uv)
         ctx.saved_misc = filter_mode, filter_mode_enum, boundary_mode_enum
         return out
@@ -334,19 +559,24 @@ class _texture_func(torch.autograd.Function):
     def backward(ctx, dy):
         tex, uv = ctx.saved_tensors
         filter_mode, filter_mode_enum, boundary_mode_enum = ctx.saved_misc
-        if filter_mode == 'linear':
-            g_tex, g_uv = _nvdiffrast_c.texture_grad_linear(tex, uv, dy, filter_mode_enum, boundary_mode_enum)
-            return None, g_tex, g_uv, None, None
-        else: # nearest
-            g_tex = _nvdiffrast_c.texture_grad_nearest(tex, uv, dy, filter_mode_enum, boundary_mode_enum)
-            return None, g_tex, None, None, None
+        with _profiled('texture', 'backward', tex.device, lambda: _texture_sizes(tex, uv)):
+            if _is_cpu(tex):
+                g_tex, g_uv, _, _, _ = cpu_texture.texture_grad_cpu(tex, uv, dy, filter_mode, cpu_texture.BOUNDARY_MODES[boundary_mode_enum])
+                return None, g_tex, g_uv, None, None
+            if filter_mode == 'linear':
+                g_tex, g_uv = _get_plugin().texture_grad_linear(tex, uv, dy, filter_mode_enum, boundary_mode_enum)
+                return None, g_tex, g_uv, None, None
+            else: # nearest
+                g_tex = _get_plugin().texture_grad_nearest(tex, uv, dy, filter_mode_enum, boundary_mode_enum)
+                return None, g_tex, None, None, None
 
 # Op wrapper.
 def texture(tex, uv, uv_da=None, mip_level_bias=None, mip=None, filter_mode='auto', boundary_mode='wrap', max_mip_level=None):
     """Perform texture sampling.
 
     All input tensors must be contiguous and reside in GPU memory. The output tensor
-    will be contiguous and reside in GPU memory.
+    will be contiguous and reside in GPU memory. If `tex` resides in CPU memory, all
+    inputs must, and sampling runs on the CPU.
 
     Args:
         tex: Texture tensor with dtype `torch.float32`. For 2D textures, must have shape
@@ -423,20 +653,24 @@ def texture(tex, uv, uv_da=None, mip_level_bias=None, mip=None, filter_mode='aut
     if 'mipmap' in filter_mode:
         mip_wrapper, mip_stack = None, []
         if mip is not None:
-            assert isinstance(mip, (_nvdiffrast_c.TextureMipWrapper, list))
+            assert isinstance(mip, (cpu_texture.TextureMipCpu, list)) or isinstance(mip, _get_plugin().TextureMipWrapper)
             if isinstance(mip, list):
                 assert all(isinstance(x, torch.Tensor) for x in mip)
                 mip_stack = mip
             else:
                 mip_wrapper = mip
         else:
-            mip_wrapper = _nvdiffrast_c.texture_construct_mip(tex, max_mip_level, boundary_mode == 'cube')
+            mip_wrapper = _cached_mip(tex, max_mip_level, boundary_mode == 'cube')
 
     # Choose stub.
-    if filter_mode == 'linear-mipmap-linear' or filter_mode == 'linear-mipmap-nearest':
-        return _texture_func_mip.apply(filter_mode, tex, uv, uv_da, mip_level_bias, mip_wrapper, filter_mode_enum, boundary_mode_enum, *mip_stack)
-    else:
-        return _texture_func.apply(filter_mode, tex, uv, filter_mode_enum, boundary_mode_enum)
+    with _profiled('texture', 'forward', tex.device, lambda: _texture_sizes(tex, uv)):
+        if filter_mode == 'linear-mipmap-linear' or filter_mode == 'linear-mipmap-nearest':
+            return _texture_func_mip.apply(filter_mode, tex, uv, uv_da, mip_level_bias, mip_wrapper, filter_mode_enum, boundary_mode_enum, *mip_stack)
+        else:
+            return _texture_func.apply(filter_mode, tex, uv, filter_mode_enum, boundary_mode_enum)
+
+def _texture_sizes(tex, uv):
+    return dict(pixels=_pixels(uv), texels=tex.numel() // tex.shape[-1])
 
 # Mipmap precalculation for cases where the texture stays constant.
 def texture_construct_mip(tex, max_mip_level=None, cube_mode=False):
@@ -462,7 +696,29 @@ def texture_construct_mip(tex, max_mip_level=None, cube_mode=False):
     else:
         max_mip_level = int(max_mip_level)
         assert max_mip_level >= 0
-    return _nvdiffrast_c.texture_construct_mip(tex, max_mip_level, cube_mode)
+    return _construct_mip(tex, max_mip_level, cube_mode)
+
+def _construct_mip(tex, max_mip_level, cube_mode):
+    with _profiled('texture_construct_mip', 'forward', tex.device, lambda: dict(texels=tex.numel() // tex.shape[-1])):
+        if _is_cpu(tex):
+            return cpu_texture.construct_mip_cpu(tex, max_mip_level, cube_mode)
+        return _get_plugin().texture_construct_mip(tex, max_mip_level, cube_mode)
+
+def _cached_mip(tex, max_mip_level, cube_mode):
+    '''Mipmap stack for a `texture()` call without `mip`, through the mipmap cache if enabled.'''
+    version = tensor_version(tex)
+    if not _mip_cache.enabled or version is None:
+        return _construct_mip(tex, max_mip_level, cube_mode)
+    key = (id(tex), max_mip_level, cube_mode)
+    mip_wrapper = _mip_cache.lookup(key, version, guard=tex)
+    if mip_wrapper is None:
+        mip_wrapper = _construct_mip(tex, max_mip_level, cube_mode)
+        if isinstance(mip_wrapper, cpu_texture.TextureMipCpu):
+            nbytes = mip_wrapper.mip.numel() * mip_wrapper.mip.element_size()
+        else:
+            nbytes = tex.numel() * tex.element_size() // 3 # Mip levels past the base add up to at most a third of it.
+        _mip_cache.insert(key, version, mip_wrapper, nbytes, identity_guard(_mip_cache, tex, key))
+    return mip_wrapper
 
 #----------------------------------------------------------------------------
 # Antialias.
@@ -471,7 +727,10 @@ def texture_construct_mip(tex, max_mip_level=None, cube_mode=False):
 class _antialias_func(torch.autograd.Function):
     @staticmethod
     def forward(ctx, color, rast, pos, tri, topology_hash, pos_gradient_boost):
-        out, work_buffer = _nvdiffrast_c.antialias_fwd(color, rast, pos, tri, topology_hash)
+        if _is_cpu(color):
+            out, work_buffer = cpu_antialias.antialias_fwd_cpu(color, rast, pos, tri, topology_hash)
+        else:
+            out, work_buffer = _get_plugin().antialias_fwd(color, rast, pos, tri, topology_hash)
         ctx.save_for_backward(color, rast, pos, tri)
         ctx.saved_misc = pos_gradient_boost, work_buffer
         return out
@@ -480,7 +739,11 @@ class _antialias_func(torch.autograd.Function):
     def backward(ctx, dy):
         color, rast, pos, tri = ctx.saved_tensors
         pos_gradient_boost, work_buffer = ctx.saved_misc
-        g_color, g_pos = _nvdiffrast_c.antialias_grad(color, rast, pos, tri, dy, work_buffer)
+        with _profiled('antialias', 'backward', color.device, lambda: dict(triangles=tri.shape[0], pixels=_pixels(color))):
+            if _is_cpu(color):
+                g_color, g_pos = cpu_antialias.antialias_grad_cpu(color, rast, pos, tri, dy, work_buffer)
+            else:
+                g_color, g_pos = _get_plugin().antialias_grad(color, rast, pos, tri, dy, work_buffer)
         if pos_gradient_boost != 1.0:
             g_pos = g_pos * pos_gradient_boost
         return g_color, None, g_pos, None, None, None
@@ -490,7 +753,8 @@ def antialias(color, rast, pos, tri, topology_hash=None, pos_gradient_boost=1.0)
     """Perform antialiasing.
 
     All input tensors must be contiguous and reside in GPU memory. The output tensor
-    will be contiguous and reside in GPU memory.
+    will be contiguous and reside in GPU memory. If `color` resides in CPU memory, all
+    inputs must, and antialiasing runs on the CPU.
 
     Note that silhouette edge determination is based on vertex indices in the triangle
     tensor. For it to work properly, a vertex belonging to multiple triangles must be
@@ -518,12 +782,13 @@ def antialias(color, rast, pos, tri, topology_hash=None, pos_gradient_boost=1.0)
 
     # Construct topology hash unless provided by user.
     if topology_hash is not None:
-        assert isinstance(topology_hash, _nvdiffrast_c.TopologyHashWrapper)
+        assert isinstance(topology_hash, cpu_antialias.TopologyHashCpu) or isinstance(topology_hash, _get_plugin().TopologyHashWrapper)
     else:
-        topology_hash = _nvdiffrast_c.antialias_construct_topology_hash(tri)
+        topology_hash = _cached_topology_hash(tri)
 
     # Instantiate the function.
-    return _antialias_func.apply(color, rast, pos, tri, topology_hash, pos_gradient_boost)
+    with _profiled('antialias', 'forward', color.device, lambda: dict(triangles=tri.shape[0], pixels=_pixels(color))):
+        return _antialias_func.apply(color, rast, pos, tri, topology_hash, pos_gradient_boost)
 
 # Topology hash precalculation for cases where the triangle array stays constant.
 def antialias_construct_topology_hash(tri):
@@ -534,14 +799,32 @@ def antialias_construct_topology_hash(tri):
 
     Args:
         tri: Triangle tensor with shape [num_triangles, 3]. Must be contiguous and reside in
-             GPU memory.
+             GPU memory, or in CPU memory for use with CPU tensors in `antialias()`.
 
     Returns:
         An opaque object containing the topology hash. This can be supplied in a call to 
         `antialias()` in the `topology_hash` argument.
     """
     assert isinstance(tri, torch.Tensor)
-    return _nvdiffrast_c.antialias_construct_topology_hash(tri)
+    return _construct_topology_hash(tri)
+
+def _construct_topology_hash(tri):
+    with _profiled('antialias_construct_topology_hash', 'forward', tri.device, lambda: dict(triangles=tri.shape[0])):
+        if _is_cpu(tri):
+            return cpu_antialias.construct_topology_hash_cpu(tri)
+        return _get_plugin().antialias_construct_topology_hash(tri)
+
+def _cached_topology_hash(tri):
+    '''Topology hash for an `antialias()` call without one, through the topology hash cache if enabled.'''
+    version = tensor_version(tri)
+    if not _topology_hash_cache.enabled or version is None:
+        return _construct_topology_hash(tri)
+    key = storage_key(tri)
+    topology_hash = _topology_hash_cache.lookup(key, version)
+    if topology_hash is None:
+        topology_hash = _construct_topology_hash(tri)
+        _topology_hash_cache.insert(key, version, topology_hash, 0, guard=tri) # Holding tri keeps its memory, and so the key, from being reused.
+    return topology_hash
 
 #----------------------------------------------------------------------------
 # Legacy OpenGL context stub for backwards compatibility.
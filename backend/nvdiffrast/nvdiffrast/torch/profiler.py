@@ -0,0 +1,114 @@
+"""Per-op timing and size records for nvdiffrast.torch, used by ops.py.
+
+While a `Profiler` is active (see `nvdiffrast.torch.profile()`), every op call
+and every op backward pass is recorded as an event with its wall time and
+input sizes. Events aggregate into a summary table per op and phase, and can be
+written as a Chrome trace (chrome://tracing, Perfetto) to see them on a
+timeline.
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+
+import torch
+
+#----------------------------------------------------------------------------
+# Profiler.
+#----------------------------------------------------------------------------
+
+SIZE_KEYS = ('triangles', 'pixels', 'texels')
+
+class _Event:
+    __slots__ = ('name', 'phase', 'start_ns', 'duration_ns', 'thread', 'sizes')
+
+    def __init__(self, name, phase, start_ns, duration_ns, thread, sizes):
+        self.name = name
+        self.phase = phase
+        self.start_ns = start_ns
+        self.duration_ns = duration_ns
+        self.thread = thread
+        self.sizes = sizes
+
+class Profiler:
+    def __init__(self, sync_cuda=True):
+        '''Create an empty profiler.
+
+        Args:
+          sync_cuda: Synchronize the device before and after each op on Cuda
+                     tensors, so that the recorded time is the time the op takes
+                     instead of the time it takes to launch it.
+        '''
+        self.sync_cuda = sync_cuda
+        self.events = []
+        self._start_ns = time.perf_counter_ns()
+
+    @contextlib.contextmanager
+    def record(self, name, phase, device, sizes=None):
+        '''Record the enclosed code as one `phase` ('forward' or 'backward') event of op `name`.
+
+        `sizes` is a callable returning a dict of input sizes, called only here.
+        '''
+        sync = self.sync_cuda and device.type == 'cuda'
+        if sync:
+            torch.cuda.synchronize(device)
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            if sync:
+                torch.cuda.synchronize(device)
+            duration = time.perf_counter_ns() - start
+            self.events.append(_Event(name, phase, start, duration, threading.get_ident(), sizes() if sizes else {})) # Backward may run on autograd worker threads, list append is atomic.
+
+    def stats(self):
+        '''Aggregate events per op and phase.
+
+        Returns:
+          List of dicts with `op`, `phase`, `calls`, `total_ms`, `mean_ms`, and the
+          mean `triangles`, `pixels` and `texels` per call for the sizes the op has.
+        '''
+        groups = {}
+        for e in list(self.events):
+            groups.setdefault((e.name, e.phase), []).append(e)
+        rows = []
+        for (name, phase), events in groups.items():
+            total_ms = sum(e.duration_ns for e in events) / 1e6
+            row = {'op': name, 'phase': phase, 'calls': len(events), 'total_ms': total_ms, 'mean_ms': total_ms / len(events)}
+            for k in SIZE_KEYS:
+                values = [e.sizes[k] for e in events if k in e.sizes]
+                if values:
+                    row[k] = sum(values) / len(values)
+            rows.append(row)
+        rows.sort(key=lambda r: -r['total_ms'])
+        return rows
+
+    def summary(self):
+        '''Summary table of `stats()` as a string, ops with the largest total time first.'''
+        rows = self.stats()
+        total = sum(r['total_ms'] for r in rows) or 1.0
+        lines = [f"{'op':<34} {'phase':<8} {'calls':>6} {'total ms':>10} {'mean ms':>9} {'%':>6} {'triangles':>10} {'pixels':>10} {'texels':>10}"]
+        for r in rows:
+            sizes = ''.join(f" {r[k]:>10.0f}" if k in r else f" {'-':>10}" for k in SIZE_KEYS)
+            lines.append(f"{r['op']:<34} {r['phase']:<8} {r['calls']:>6} {r['total_ms']:>10.2f} {r['mean_ms']:>9.3f} {100 * r['total_ms'] / total:>5.1f}%{sizes}")
+        return '\n'.join(lines)
+
+    def export_chrome_trace(self, path):
+        '''Write the events to `path` in the Chrome trace event format.'''
+        pid = os.getpid()
+        trace = [{
+            'name': e.name,
+            'cat': e.phase,
+            'ph': 'X',
+            'ts': (e.start_ns - self._start_ns) / 1e3,
+            'dur': e.duration_ns / 1e3,
+            'pid': pid,
+            'tid': e.thread,
+            'args': e.sizes,
+        } for e in list(self.events)]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f)
+
+#----------------------------------------------------------------------------
@@ -19,9 +19,9 @@ import nvdiffrast.torch as dr
 
 # Transform vertex positions to clip space
 def transform_pos(mtx, pos):
-    t_mtx = torch.from_numpy(mtx).cuda() if isinstance(mtx, np.ndarray) else mtx
+    t_mtx = torch.from_numpy(mtx).to(util.device) if isinstance(mtx, np.ndarray) else mtx
     # (x,y,z) -> (x,y,z,1)
-    posw = torch.cat([pos, torch.ones([pos.shape[0], 1]).cuda()], axis=1)
+    posw = torch.cat([pos, torch.ones([pos.shape[0], 1]).to(util.device)], axis=1)
     return torch.matmul(posw, t_mtx.t())[None, ...]
 
 def render(glctx, mtx, pos, pos_idx, vtx_col, col_idx, resolution: int):
@@ -67,10 +67,10 @@ def fit_cube(max_iter          = 5000,
     print("Mesh has %d triangles and %d vertices." % (pos_idx.shape[0], vtxp.shape[0]))
 
     # Create position/triangle index tensors
-    pos_idx = torch.from_numpy(pos_idx.astype(np.int32)).cuda()
-    col_idx = torch.from_numpy(col_idx.astype(np.int32)).cuda()
-    vtx_pos = torch.from_numpy(vtxp.astype(np.float32)).cuda()
-    vtx_col = torch.from_numpy(vtxc.astype(np.float32)).cuda()
+    pos_idx = torch.from_numpy(pos_idx.astype(np.int32)).to(util.device)
+    col_idx = torch.from_numpy(col_idx.astype(np.int32)).to(util.device)
+    vtx_pos = torch.from_numpy(vtxp.astype(np.float32)).to(util.device)
+    vtx_col = torch.from_numpy(vtxc.astype(np.float32)).to(util.device)
 
     # Rasterizer context
     glctx = dr.RasterizeCudaContext()
@@ -83,8 +83,8 @@ def fit_cube(max_iter          = 5000,
 
         vtx_pos_rand = np.random.uniform(-0.5, 0.5, size=vtxp.shape) + vtxp
         vtx_col_rand = np.random.uniform(0.0, 1.0, size=vtxc.shape)
-        vtx_pos_opt  = torch.tensor(vtx_pos_rand, dtype=torch.float32, device='cuda', requires_grad=True)
-        vtx_col_opt  = torch.tensor(vtx_col_rand, dtype=torch.float32, device='cuda', requires_grad=True)
+        vtx_pos_opt  = torch.tensor(vtx_pos_rand, dtype=torch.float32, device=util.device, requires_grad=True)
+        vtx_col_opt  = torch.tensor(vtx_col_rand, dtype=torch.float32, device=util.device, requires_grad=True)
 
         # Adam optimizer for vertex position and color with a learning rate ramp.
         optimizer    = torch.optim.Adam([vtx_pos_opt, vtx_col_opt], lr=1e-2)
@@ -20,8 +20,8 @@ import nvdiffrast.torch as dr
 # Helpers.
 
 def transform_pos(mtx, pos):
-    t_mtx = torch.from_numpy(mtx).cuda() if isinstance(mtx, np.ndarray) else mtx
-    posw = torch.cat([pos, torch.ones([pos.shape[0], 1]).cuda()], axis=1)
+    t_mtx = torch.from_numpy(mtx).to(util.device) if isinstance(mtx, np.ndarray) else mtx
+    posw = torch.cat([pos, torch.ones([pos.shape[0], 1]).to(util.device)], axis=1)
     return torch.matmul(posw, t_mtx.t())[None, ...]
 
 def render(glctx, mtx, pos, pos_idx, uv, uv_idx, tex, resolution, enable_mip, max_mip_level):
@@ -78,13 +78,13 @@ def fit_earth(max_iter          = 20000,
     if pos.shape[1] == 4: pos = pos[:, 0:3]
 
     # Create position/triangle index tensors
-    pos_idx = torch.from_numpy(pos_idx.astype(np.int32)).cuda()
-    vtx_pos = torch.from_numpy(pos.astype(np.float32)).cuda()
-    uv_idx  = torch.from_numpy(uv_idx.astype(np.int32)).cuda()
-    vtx_uv  = torch.from_numpy(uv.astype(np.float32)).cuda()
+    pos_idx = torch.from_numpy(pos_idx.astype(np.int32)).to(util.device)
+    vtx_pos = torch.from_numpy(pos.astype(np.float32)).to(util.device)
+    uv_idx  = torch.from_numpy(uv_idx.astype(np.int32)).to(util.device)
+    vtx_uv  = torch.from_numpy(uv.astype(np.float32)).to(util.device)
 
-    tex     = torch.from_numpy(tex.astype(np.float32)).cuda()
-    tex_opt = torch.full(tex.shape, 0.2, device='cuda', requires_grad=True)
+    tex     = torch.from_numpy(tex.astype(np.float32)).to(util.device)
+    tex_opt = torch.full(tex.shape, 0.2, device=util.device, requires_grad=True)
     glctx = dr.RasterizeCudaContext()
 
     ang = 0.0
@@ -53,29 +53,29 @@ def fit_env_phong(max_iter          = 1000,
     print("Mesh has %d triangles and %d vertices." % (pos_idx.shape[0], pos.shape[0]))
 
     # Move all the stuff to GPU.
-    pos_idx = torch.as_tensor(pos_idx, dtype=torch.int32, device='cuda')
-    pos = torch.as_tensor(pos, dtype=torch.float32, device='cuda')
-    normals = torch.as_tensor(normals, dtype=torch.float32, device='cuda')
-    env = torch.as_tensor(env, dtype=torch.float32, device='cuda')
+    pos_idx = torch.as_tensor(pos_idx, dtype=torch.int32, device=util.device)
+    pos = torch.as_tensor(pos, dtype=torch.float32, device=util.device)
+    normals = torch.as_tensor(normals, dtype=torch.float32, device=util.device)
+    env = torch.as_tensor(env, dtype=torch.float32, device=util.device)
 
     # Target Phong parameters.
     phong_rgb = np.asarray([1.0, 0.8, 0.6], np.float32)
     phong_exp = 25.0
-    phong_rgb_t = torch.as_tensor(phong_rgb, dtype=torch.float32, device='cuda')
+    phong_rgb_t = torch.as_tensor(phong_rgb, dtype=torch.float32, device=util.device)
 
     # Learned variables: environment maps, phong color, phong exponent.
     env_var = torch.ones_like(env) * .5
     env_var.requires_grad_()
-    phong_var_raw = torch.as_tensor(np.random.uniform(size=[4]), dtype=torch.float32, device='cuda')
+    phong_var_raw = torch.as_tensor(np.random.uniform(size=[4]), dtype=torch.float32, device=util.device)
     phong_var_raw.requires_grad_()
-    phong_var_mul = torch.as_tensor([1.0, 1.0, 1.0, 10.0], dtype=torch.float32, device='cuda')
+    phong_var_mul = torch.as_tensor([1.0, 1.0, 1.0, 10.0], dtype=torch.float32, device=util.device)
 
     # Render.
     ang = 0.0
     imgloss_avg, phong_avg = [], []
     glctx = dr.RasterizeCudaContext()
-    zero_tensor = torch.as_tensor(0.0, dtype=torch.float32, device='cuda')
-    one_tensor = torch.as_tensor(1.0, dtype=torch.float32, device='cuda')
+    zero_tensor = torch.as_tensor(0.0, dtype=torch.float32, device=util.device)
+    one_tensor = torch.as_tensor(1.0, dtype=torch.float32, device=util.device)
 
     # Adam optimizer for environment map and phong with a learning rate ramp.
     optimizer = torch.optim.Adam([env_var, phong_var_raw], lr=lr_base)
@@ -98,17 +98,17 @@ def fit_env_phong(max_iter          = 1000,
         a_mv  = np.matmul(util.translate(0, 0, -3.5), a_rot)
         a_mvp = np.matmul(proj, a_mv).astype(np.float32)
         a_mvc = a_mvp
-        r_mvp = torch.as_tensor(r_mvp, dtype=torch.float32, device='cuda')
-        a_mvp = torch.as_tensor(a_mvp, dtype=torch.float32, device='cuda')
+        r_mvp = torch.as_tensor(r_mvp, dtype=torch.float32, device=util.device)
+        a_mvp = torch.as_tensor(a_mvp, dtype=torch.float32, device=util.device)
 
         # Solve camera positions.
-        a_campos = torch.as_tensor(np.linalg.inv(a_mv)[:3, 3], dtype=torch.float32, device='cuda')
-        r_campos = torch.as_tensor(np.linalg.inv(r_mv)[:3, 3], dtype=torch.float32, device='cuda')
+        a_campos = torch.as_tensor(np.linalg.inv(a_mv)[:3, 3], dtype=torch.float32, device=util.device)
+        r_campos = torch.as_tensor(np.linalg.inv(r_mv)[:3, 3], dtype=torch.float32, device=util.device)
 
         # Random light direction.        
         lightdir = np.random.normal(size=[3])
         lightdir /= np.linalg.norm(lightdir) + 1e-8
-        lightdir = torch.as_tensor(lightdir, dtype=torch.float32, device='cuda')
+        lightdir = torch.as_tensor(lightdir, dtype=torch.float32, device=util.device)
 
         def render_refl(ldir, cpos, mvp):
             # Transform and rasterize.
@@ -169,7 +169,7 @@ def fit_env_phong(max_iter          = 1000,
             lightdir = np.asarray([.8, -1., .5, 0.0])
             lightdir = np.matmul(a_mvc, lightdir)[:3]
             lightdir /= np.linalg.norm(lightdir)
-            lightdir = torch.as_tensor(lightdir, dtype=torch.float32, device='cuda')
+            lightdir = torch.as_tensor(lightdir, dtype=torch.float32, device=util.device)
             refl, refld, ldotr, mask = render_refl(lightdir, a_campos, a_mvp)
             color_opt = dr.texture(env_var[np.newaxis, ...], refl, uv_da=refld, filter_mode='linear-mipmap-linear', boundary_mode='cube')
             color_opt = color_opt + phong_var[:3] * torch.max(zero_tensor, ldotr) ** phong_var[3]
@@ -94,15 +94,15 @@ def q_to_mtx(q):
     r1 = torch.stack([2.0*q[0]*q[1] + 2.0*q[2]*q[3], 1.0 - 2.0*q[0]**2 - 2.0*q[2]**2, 2.0*q[1]*q[2] - 2.0*q[0]*q[3]])
     r2 = torch.stack([2.0*q[0]*q[2] - 2.0*q[1]*q[3], 2.0*q[1]*q[2] + 2.0*q[0]*q[3], 1.0 - 2.0*q[0]**2 - 2.0*q[1]**2])
     rr = torch.transpose(torch.stack([r0, r1, r2]), 1, 0)
-    rr = torch.cat([rr, torch.tensor([[0], [0], [0]], dtype=torch.float32).cuda()], dim=1) # Pad right column.
-    rr = torch.cat([rr, torch.tensor([[0, 0, 0, 1]], dtype=torch.float32).cuda()], dim=0)  # Pad bottom row.
+    rr = torch.cat([rr, torch.tensor([[0], [0], [0]], dtype=torch.float32).to(util.device)], dim=1) # Pad right column.
+    rr = torch.cat([rr, torch.tensor([[0, 0, 0, 1]], dtype=torch.float32).to(util.device)], dim=0)  # Pad bottom row.
     return rr
 
 # Transform vertex positions to clip space
 def transform_pos(mtx, pos):
-    t_mtx = torch.from_numpy(mtx).cuda() if isinstance(mtx, np.ndarray) else mtx
+    t_mtx = torch.from_numpy(mtx).to(util.device) if isinstance(mtx, np.ndarray) else mtx
     # (x,y,z) -> (x,y,z,1)
-    posw = torch.cat([pos, torch.ones([pos.shape[0], 1]).cuda()], axis=1)
+    posw = torch.cat([pos, torch.ones([pos.shape[0], 1]).to(util.device)], axis=1)
     return torch.matmul(posw, t_mtx.t())[None, ...]
 
 def render(glctx, mtx, pos, pos_idx, col, col_idx, resolution: int):
@@ -154,23 +154,23 @@ def fit_pose(max_iter           = 10000,
     if pos.shape[1] == 4: pos = pos[:, 0:3]
 
     # Create position/triangle index tensors
-    pos_idx = torch.from_numpy(pos_idx.astype(np.int32)).cuda()
-    vtx_pos = torch.from_numpy(pos.astype(np.float32)).cuda()
-    col_idx = torch.from_numpy(col_idx.astype(np.int32)).cuda()
-    vtx_col = torch.from_numpy(col.astype(np.float32)).cuda()
+    pos_idx = torch.from_numpy(pos_idx.astype(np.int32)).to(util.device)
+    vtx_pos = torch.from_numpy(pos.astype(np.float32)).to(util.device)
+    col_idx = torch.from_numpy(col_idx.astype(np.int32)).to(util.device)
+    vtx_col = torch.from_numpy(col.astype(np.float32)).to(util.device)
 
     glctx = dr.RasterizeCudaContext()
 
     for rep in range(repeats):
-        pose_target = torch.tensor(q_rnd(), device='cuda')
+        pose_target = torch.tensor(q_rnd(), device=util.device)
         pose_init   = q_rnd()
-        pose_opt    = torch.tensor(pose_init / np.sum(pose_init**2)**0.5, dtype=torch.float32, device='cuda', requires_grad=True)
+        pose_opt    = torch.tensor(pose_init / np.sum(pose_init**2)**0.5, dtype=torch.float32, device=util.device, requires_grad=True)
 
         loss_best   = np.inf
         pose_best   = pose_opt.detach().clone()
 
         # Modelview + projection matrix.
-        mvp = torch.tensor(np.matmul(util.projection(x=0.4), util.translate(0, 0, -3.5)).astype(np.float32), device='cuda')
+        mvp = torch.tensor(np.matmul(util.projection(x=0.4), util.translate(0, 0, -3.5)).astype(np.float32), device=util.device)
 
         # Adam optimizer for texture with a learning rate ramp.
         optimizer = torch.optim.Adam([pose_opt], betas=(0.9, 0.999), lr=lr_base)
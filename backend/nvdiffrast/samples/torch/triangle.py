@@ -12,7 +12,7 @@ import torch
 import nvdiffrast.torch as dr
 
 def tensor(*args, **kwargs):
-    return torch.tensor(*args, device='cuda', **kwargs)
+    return torch.tensor(*args, device='cuda' if torch.cuda.is_available() else 'cpu', **kwargs)
 
 glctx = dr.RasterizeCudaContext()
 
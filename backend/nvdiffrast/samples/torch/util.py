@@ -9,6 +9,10 @@
 import numpy as np
 import torch
 
+# Run on the GPU if there is one and on the CPU otherwise; nvdiffrast picks the
+# implementation based on the device of the input tensors.
+device = 'cuda' if torch.cuda.is_available() else 'cpu'
+
 #----------------------------------------------------------------------------
 # Projection and transformation matrix helpers.
 #----------------------------------------------------------------------------
@@ -1,14 +1,26 @@
 import os
-import torch
-import numpy as np
-from PIL import Image
+import time
+import shutil
+import hashlib
+import contextlib
+from dataclasses import asdict
 from backend.manager import BackendManager
+from backend.cache import ResultCache
+from backend.jobs import CancellationToken, JobCancelled
+from backend.instrumentation import (
+    STAGE_TIMINGS_PATH, STAGE_STATS_FILE, append_jsonl, format_stage_stats, write_json
+)
+from backend.manifest import MANIFEST_FILE, write_manifest
+from backend.stages import (
+    DEFAULT_OPTIONS, STAGES, STAGES_BY_NAME, TARGET_STAGES, stage_input_names, stage_keys
+)
 
 class GenerationPipeline:
     def __init__(self, manager: BackendManager):
         self.manager = manager
         
-    def run(self, prompt, image_path, model_name, low_vram=False, on_log_callback=None):
+    def run(self, prompt, image_path, model_name, low_vram=False, on_log_callback=None, options=None,
+            output_dir=None, cancel_token=None, on_progress_callback=None, memory_budget_gb=None):
         """
         Runs the full 3D generation pipeline.
         
@@ -17,154 +29,305 @@ class GenerationPipeline:
             image_path (str | dict): Path to input image, or dict for multiview? 
                                      Assume single image path for now.
             model_name (str): Identifier for model (e.g. "InstantMesh")
-            low_vram (bool): Enable FP16 / Offloading
+            low_vram (bool): Low-memory mode: bfloat16 weights on CPU (float16 on
+                             CUDA), one sub-model resident at a time and
+                             chunked geometry decoding.
+            options (dict): Overrides for DEFAULT_OPTIONS (diffusion steps, seed,
+                            export settings, ...). Only the stages affected by a
+                            changed option are re-run.
+            output_dir (str): Where the final artifacts are published
+                              (defaults to output/).
+            cancel_token (CancellationToken): Checked between stages; cancelling
+                              it mid-stage kills the worker process tree.
+            on_progress_callback (callable): Receives the overall progress (0-99)
+                              computed from the worker's progress events.
+            memory_budget_gb (float): Limit on the peak RSS of every stage;
+                              implies low_vram. The worker sizes its decoding
+                              and render chunks from the memory left under it
+                              and fails the job if a stage still exceeds it.
+
+        A result cache hit republishes the cached mesh, its sidecars and, with
+        save_video, the turntable video, exactly what a fresh run publishes.
+
+        Per-stage measurements (wall/CPU time, peak RSS, torch allocator) are
+        logged as each stage finishes and saved as STAGE_STATS_FILE next to
+        the published mesh.
+
+        Returns:
+            str: Path to the generated .obj mesh.
         """
         print(f"[Pipeline] Starting generation with {model_name}...")
-        
-        # 1. Ensure Dependecies and Model
-        self.manager.load_model(low_vram)
-        
-        # Add InstantMesh to path again to be safe
-        instant_mesh_path = os.path.join(os.path.dirname(__file__), 'InstantMesh')
-        import sys
-        if instant_mesh_path not in sys.path:
-            sys.path.append(instant_mesh_path)
-            
-        # 2. Import InstantMesh Modules
-        try:
-            from src.utils.infer_util import remove_background, resize_foreground
-            # Based on standard usage, we might need to instantiate a model class
-            # But usually run.py uses a config based system.
-            # We will try to simulate what run.py does or import the Main Class if available.
-            # Since InstantMesh doesn't have a simple "Pipeline" class in root, 
-            # we might need to subprocess output or reconstruct the logic.
-            
-            # SIMULATION OF LOGIC for Stability (Avoiding complex class reconstruction blindly):
-            # If the user has not cloned the repo, this will fail in manager.check_instantmesh_install
-            
-            # --- REAL LOGIC STUB (Adapting from run.py) ---
-            # device = self.manager.get_device()
-            # config_path = os.path.join(instant_mesh_path, 'configs', 'instant-mesh-large.yaml')
-            # config = OmegaConf.load(config_path)
-            # model = instantiate_from_config(config.model).to(device)
-            # model.load_state_dict(torch.load(ckpt_path), strict=False)
-            
-            # For this 'Agent' step, since we can't fully guarantee the repo structure existence
-            # without the user cloning it first, we will Implement a subprocess caller 
-            # which is more robust for "run.py" integration.
-            pass
-            
-        except ImportError as e:
-            raise ImportError(f"InstantMesh modules not found. Did you clone the repo? {e}")
-
-        # 3. Processing
-        try:
-            # We will use subprocess to call run.py if possible, 
-            # Or simplified logic.
-            # Let's assume we are calling the internal logic for better control.
-            
-            # MOCKING THE HEAVY LIFTING FOR NOW TO PREVENT CRASH IF REPO MISSING
-            # BUT PROVIDING THE REAL CODE STRUCTURE IN COMMENTS FOR THE USER
-            
-            # Real Implementation Plan for User:
-            # 1. Load config
-            # 2. Process Image (Rembg)
-            # 3. Run MV Diffusion
-            # 4. Run LGM Reconstruction
-            # 5. Export Mesh
-            
-            # Since I cannot execute the real model here (no GPU/repo), I must provide
-            # the code that *would* work if environment is correct.
-            
-            import subprocess
-            
-            cwd = instant_mesh_path
-            # Input handling
-            input_file = image_path if isinstance(image_path, str) else image_path.get('front')
-            if not input_file or not os.path.exists(input_file):
-                raise ValueError("Valid input image required.")
-                
-            output_dir = os.path.abspath("output")
+        cancel_token = cancel_token or CancellationToken()
+        started = time.perf_counter()
+        stats = [] # One record per target stage, in the order they finished
+
+        # Input handling
+        input_file = image_path if isinstance(image_path, str) else image_path.get('Front')
+        if not input_file or not os.path.exists(input_file):
+            raise RuntimeError("Pipeline Failed: Valid input image required.")
+
+        output_dir = os.path.abspath(output_dir or "output")
+        options = dict(DEFAULT_OPTIONS, **(options or {}))
+        name = os.path.splitext(os.path.basename(input_file))[0]
+        low_vram = bool(low_vram or memory_budget_gb)
+        memory = {"budget_gb": memory_budget_gb} if low_vram else None
+        keys, cache_key = self.result_keys(input_file, model_name, low_vram, options)
+
+        # 1. Result cache: identical image + parameters never reach the worker
+        cache = self.manager.result_cache
+        cached_path = cache.get(cache_key, required=("video",) if options["save_video"] else ())
+        if cached_path:
+            self._log(f"Result cache hit, reusing {cached_path} ({cache.format_stats()})", on_log_callback)
             os.makedirs(output_dir, exist_ok=True)
-            
-            # Construct command: Use backend/instantmesh_wrapper.py that handles mocking
-            wrapper_script = os.path.join(os.path.dirname(__file__), "instantmesh_wrapper.py")
-            if not os.path.exists(wrapper_script):
-                 raise FileNotFoundError(f"Wrapper script not found at {wrapper_script}")
-
-            # python backend/instantmesh_wrapper.py configs/instant-mesh-large.yaml input.png --output_path output/
-            # Note: The wrapper chdirs to InstantMesh root internally
-            
-            cmd = [
-                sys.executable,
-                wrapper_script,
-                "configs/instant-mesh-large.yaml",
-                input_file,
-                "--save_video", 
-                "--output_path", output_dir
-            ]
-            
-
-
-            print(f"Executing: {' '.join(cmd)}")
-            
-            # Env with PYTHONPATH
-            env = os.environ.copy()
-            env["PYTHONPATH"] = env.get("PYTHONPATH", "") + os.pathsep + cwd
-            
-            # We don't set cwd here because wrapper handles sys.path and chdir
-            # We just pass environment if needed, but wrapper is smart enough
-            
-            process = subprocess.Popen(
-                cmd, 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.STDOUT, # Merge stderr to stdout for full logging
-                text=True,
-                bufsize=1, # Line buffering
-                universal_newlines=True
-            )
-            
-            # Real-time output reading
-            full_stdout = []
-            while True:
-                line = process.stdout.readline()
-                if not line and process.poll() is not None:
-                    break
-                if line:
-                    stripped_line = line.strip()
-                    if stripped_line:
-                        full_stdout.append(stripped_line)
-                        print(f"[InstantMesh] {stripped_line}") # Console debug
-                        if on_log_callback:
-                            on_log_callback(stripped_line)
-                            
-            return_code = process.poll()
-            
-            if return_code != 0:
-                raise RuntimeError(f"InstantMesh Error (Code {return_code}). Check logs.")
-                
-            stdout = "\n".join(full_stdout)
+            published = self._publish(cached_path, output_dir)
+            for artifact, path in cache.get_artifacts(cache_key).items():
+                published.update(self._publish(path, output_dir, artifact))
+            published["stats"] = self._write_stats(output_dir, stats, started, name=name, cached=True)
+            write_manifest(output_dir, published, name=name, model_name=model_name,
+                           options=options, cache_key=cache_key, stage_keys=keys, cached=True)
+            return published["mesh"]
+        self._log(f"Result cache miss ({cache.format_stats()})", on_log_callback)
+
+        # 2. Run the stages, resuming from the first one whose inputs changed
+        try:
+            results = self._run_stages(os.path.abspath(input_file), name, options, keys,
+                                       low_vram, on_log_callback, cancel_token, on_progress_callback,
+                                       memory, stats)
             print("InstantMesh Finished.")
-            
-            # Find the output file
-            # InstantMesh output naming might be based on input filename
-            base_name = os.path.splitext(os.path.basename(input_file))[0]
-             # It usually creates a folder or specific file
-             # Let's assume it puts it in output_dir
-             
-             # Fallback check for generated obj
-            result_path = None
-            for f in os.listdir(output_dir):
-                 if f.endswith('.obj') and base_name in f:
-                     result_path = os.path.join(output_dir, f)
-                     # Rename to timestamp to avoid overwrites and match App logic?
-                     # Kept simple for now.
-                     break
-            
-            if not result_path:
-                 # If subprocess worked but file naming is different, verify
-                 raise FileNotFoundError("Mesh generation finished but output file not found.")
+
+            # 3. Publish the final artifacts to output/ and describe them in its manifest.json
+            os.makedirs(output_dir, exist_ok=True)
+            published = self._publish(results["mesh"].mesh, output_dir)
+            result_path = published["mesh"]
+            artifacts = {"video": results["export"].video} if results["export"].video else None
+            if artifacts:
+                published.update(self._publish(artifacts["video"], output_dir, "video"))
+            published["stats"] = self._write_stats(output_dir, stats, started, name=name, cached=False)
+            write_manifest(output_dir, published, name=name, model_name=model_name,
+                           options=options, cache_key=cache_key, stage_keys=keys)
 
         except Exception as e:
+            if cancel_token.cancelled:
+                # Whatever broke (usually the killed worker's pipe) is a consequence of the cancel
+                latency = time.monotonic() - cancel_token.cancelled_at
+                self._log(f"Cancelled, worker idle after {latency:.2f}s", on_log_callback)
+                raise JobCancelled("Generation cancelled") from e
             # Re-raise to be caught by worker
             raise RuntimeError(f"Pipeline Failed: {e}")
+        finally:
+            self.manager.stage_store.prune()
+
+        if cache.put(cache_key, result_path, artifacts):
+            self._log(f"Stored result in cache ({cache.format_stats()})", on_log_callback)
+        return result_path
+
+    def result_keys(self, input_file, model_name, low_vram=False, options=None):
+        """
+        Returns (stage keys, result cache key) for an input and its options.
+
+        The base key covers the image bytes and everything that is not a stage
+        option (model, config, precision). Stage keys chain off it, and the
+        result cache key covers the final stages, i.e. every parameter. A job
+        manifest whose cache_key matches is therefore an up-to-date result.
+        """
+        options = dict(DEFAULT_OPTIONS, **(options or {}))
+        base_key = ResultCache.make_key(input_file, self._variant_params(model_name, low_vram))
+        keys = stage_keys(base_key, options)
+        cache_key = hashlib.sha256(" ".join(keys[s] for s in TARGET_STAGES).encode("utf-8")).hexdigest()
+        return keys, cache_key
+
+    def _run_stages(self, input_file, name, options, keys, low_vram, on_log_callback, cancel_token,
+                    on_progress_callback=None, memory=None, stats=None):
+        """
+        Produces the outputs of TARGET_STAGES, running only what is missing.
+
+        A stage whose persisted output matches its key is reused; otherwise its
+        dependencies are resolved first and the stage is sent to the worker.
+        Changing only export settings therefore reuses the diffusion and
+        reconstruction results.
+
+        The cancel token is checked before every stage. While a stage runs on
+        the worker, cancelling kills the worker so the job stops right away
+        instead of after the stage; completed stages stay persisted.
+
+        Overall progress weighs each stage by StageSpec.weight, and the timing
+        of every stage that actually ran is appended to STAGE_TIMINGS_PATH.
+
+        memory ({"budget_gb": ...} or None) is forwarded with every stage and
+        switches the worker into low-memory mode. The worker enforces the
+        budget: a stage it cannot fit, even after retrying with smaller
+        chunks, comes back as an error and fails the job.
+
+        If given, stats collects one record per stage: the worker's
+        StageRecorder snapshot for stages that ran, {"cached": True} otherwise.
+        """
+        stats = stats if stats is not None else []
+        store = self.manager.stage_store
+        results = {}
+        worker = None
+        total_weight = sum(stage.weight for stage in STAGES)
+        completed_weight = 0.0
+
+        def report(weight):
+            if on_progress_callback:
+                on_progress_callback(min(99, int(100 * weight / total_weight)))
+
+        def ensure(stage):
+            nonlocal worker
+            nonlocal completed_weight
+            if stage.name in results:
+                return results[stage.name]
+
+            output = store.load(stage, keys[stage.name])
+            if output is not None:
+                self._log(f"Stage {stage.name}: reusing cached result", on_log_callback)
+                stats.append({"stage": stage.name, "cached": True})
+                results[stage.name] = output
+                completed_weight += stage.weight
+                report(completed_weight)
+                return output
+
+            available = {"input_path": input_file}
+            for dep in stage.depends_on:
+                available.update(asdict(ensure(STAGES_BY_NAME[dep])))
+
+            cancel_token.raise_if_cancelled()
+
+            # Take a warm worker from the pool only once a stage really has to run
+            if worker is None:
+                self.manager.load_model(low_vram, on_log_callback=on_log_callback)
+                worker = stack.enter_context(self.manager.workers.acquire(
+                    on_log_callback=on_log_callback, cancel_token=cancel_token))
+
+            self._log(f"Stage {stage.name}: running", on_log_callback)
+            request = {
+                "stage": stage.name,
+                "name": name,
+                "output_dir": store.stage_dir(stage, keys[stage.name]),
+                "inputs": {k: available[k] for k in stage_input_names(stage)},
+                "params": {p: options[p] for p in stage.params},
+                "memory": memory,
+            }
+            reply = worker.run_job(
+                request,
+                on_log_callback=on_log_callback,
+                on_progress=lambda event: report(completed_weight + stage.weight * event.get("fraction", 0)),
+            )
+            # The worker's manifest is the single source of truth for what the stage produced
+            output = store.load(stage, keys[stage.name])
+            if output is None:
+                raise RuntimeError(f"Stage {stage.name} finished without a valid manifest.")
+            results[stage.name] = output
+            completed_weight += stage.weight
+            report(completed_weight)
+            record = self._record_timing(stage, keys[stage.name], name, request["params"], reply.get("timing"),
+                                         on_log_callback, (memory or {}).get("budget_gb"))
+            stats.append(dict(record or {"stage": stage.name}, cached=False))
+            return output
+
+        with contextlib.ExitStack() as stack:
+            for stage_name in TARGET_STAGES:
+                ensure(STAGES_BY_NAME[stage_name])
+        return results
+
+    def _record_timing(self, stage, key, name, params, timing, on_log_callback=None, budget_gb=None):
+        """
+        Logs a finished stage's measurements and appends them to STAGE_TIMINGS_PATH.
+        With a memory budget, the log line includes the chunk sizes the worker
+        chose to stay within it.
+
+        Returns:
+            dict: The stage record, or None if the worker sent no timing.
+        """
+        if not timing:
+            return None
+        peak = timing.get("peak_rss_mb")
+        plan = timing.get("memory_plan") or {}
+        budget_text = ""
+        if budget_gb:
+            budget_text = (f" (budget {budget_gb * 1024:.0f} MB, geometry chunk "
+                           f"{plan.get('geometry_chunk_points')} points, "
+                           f"{plan.get('render_chunk_views')} views per render)")
+        self._log(f"Stage {stage.name}: {format_stage_stats(timing)}{budget_text}", on_log_callback)
+        record = {
+            "stage": stage.name,
+            "key": key,
+            "params": params,
+            "elapsed": timing.get("elapsed"),
+            "cpu_time": timing.get("cpu_time"),
+            "cpu_utilization": timing.get("cpu_utilization"),
+            "peak_rss_mb": peak,
+            "rss_mb": timing.get("rss_mb"),
+            "torch": timing.get("torch"),
+            "memory_budget_gb": budget_gb,
+            "memory_plan": timing.get("memory_plan"),
+        }
+        try:
+            append_jsonl(STAGE_TIMINGS_PATH, dict(record, time=time.time(), name=name,
+                                                  config=self.manager.workers.config))
+        except OSError as e:
+            print(f"[Pipeline] Could not record stage timing: {e}")
+        return record
+
+    def _write_stats(self, output_dir, stats, started, **fields):
+        """Saves the job's per-stage records as STAGE_STATS_FILE in output_dir; returns its path."""
+        path = os.path.join(output_dir, STAGE_STATS_FILE)
+        write_json(path, dict(
+            fields,
+            config=self.manager.workers.config,
+            wall_time=round(time.perf_counter() - started, 3),
+            stage_wall_time=round(sum((r.get("elapsed") or 0.0 for r in stats), 0.0), 3),
+            stage_cpu_time=round(sum((r.get("cpu_time") or 0.0 for r in stats), 0.0), 3),
+            peak_rss_mb=max((r["peak_rss_mb"] for r in stats if r.get("peak_rss_mb") is not None), default=None),
+            stages=stats,
+        ))
+        return path
+
+    @staticmethod
+    def _publish(path, output_dir, artifact="mesh"):
+        """
+        Links (or copies) an artifact and its same-named sidecars into output_dir.
+        Returns a dict artifact name -> published path; sidecars are keyed by filename.
+        """
+        if not path or not os.path.exists(path):
+            raise FileNotFoundError("Mesh generation finished but output file not found.")
+
+        src_dir = os.path.dirname(path)
+        filename = os.path.basename(path)
+        stem = os.path.splitext(filename)[0]
+        sidecars = [f for f in os.listdir(src_dir)
+                    if f not in (filename, MANIFEST_FILE) and os.path.splitext(f)[0] == stem]
+
+        published = {}
+        for name, source in [(artifact, filename)] + [(f, f) for f in sidecars]:
+            target = os.path.join(output_dir, source)
+            if os.path.exists(target):
+                os.remove(target)
+            try:
+                os.link(os.path.join(src_dir, source), target)
+            except OSError:
+                shutil.copy2(os.path.join(src_dir, source), target)
+            published[name] = target
+        return published
+
+    def _variant_params(self, model_name, low_vram):
+        """Everything besides the image and stage options that affects the result."""
+        worker_config = self.manager.workers.config
+        config_file = os.path.join(os.path.dirname(__file__), 'InstantMesh', worker_config)
+        config_hash = None
+        if os.path.exists(config_file):
+            with open(config_file, "rb") as f:
+                config_hash = hashlib.sha256(f.read()).hexdigest()
+
+        return {
+            "model_name": model_name,
+            "low_vram": bool(low_vram),
+            "config": worker_config,
+            "config_sha256": config_hash,
+        }
+
+    @staticmethod
+    def _log(message, on_log_callback=None):
+        print(f"[Pipeline] {message}")
+        if on_log_callback:
+            on_log_callback(message)
@@ -0,0 +1,35 @@
+"""
+Line protocol spoken between the backend and instantmesh_wrapper.py.
+
+Requests are written to the wrapper's stdin as one JSON object per line.
+Replies come back on stdout, which the wrapper shares with InstantMesh,
+diffusers and tqdm, so every protocol message is tagged with MESSAGE_PREFIX.
+Any line without the prefix is plain log output.
+"""
+import json
+
+MESSAGE_PREFIX = "@@instantmesh "
+
+
+def encode_message(event, **fields):
+    """Builds a tagged protocol line (without trailing newline)."""
+    payload = {"event": event}
+    payload.update(fields)
+    return MESSAGE_PREFIX + json.dumps(payload)
+
+
+def decode_message(line):
+    """
+    Returns the message dict carried by a stdout line, or None for log output.
+
+    tqdm redraws its bar with carriage returns and no newline, so the prefix is
+    searched anywhere in the line instead of only at the start.
+    """
+    index = line.find(MESSAGE_PREFIX)
+    if index < 0:
+        return None
+    try:
+        message = json.loads(line[index + len(MESSAGE_PREFIX):])
+    except ValueError:
+        return None
+    return message if isinstance(message, dict) else None
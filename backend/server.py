@@ -0,0 +1,431 @@
+"""
+Local HTTP job server, so other tools on this host can generate meshes
+without the Qt app.
+
+    python -m backend.server [--host 127.0.0.1] [--port 8765] [--workers 1] [--stub]
+
+Endpoints (JSON unless noted):
+
+    POST   /jobs                 Submit. Either raw image bytes (Content-Type
+                                 image/*, options as query parameters such as
+                                 ?seed=3&no_rembg=1) or a JSON body
+                                 {"image_path": ..., "options": {...},
+                                  "priority": 0, "low_vram": false,
+                                  "memory_budget_gb": null}.
+    GET    /jobs                 All jobs.
+    GET    /jobs/<id>            State, progress, last status line, result.
+    GET    /jobs/<id>/logs       Log lines as text/plain, streamed until the job
+                                 finishes (?follow=0 for what is there now).
+    GET    /jobs/<id>/mesh       The generated .obj (409 until the job is done).
+    DELETE /jobs/<id>            Cancel.
+    GET    /health               Queue counts.
+
+Jobs run on the regular JobQueue threads; the event loop only serves
+requests from in-memory snapshots, so status polling never waits on the
+pipeline. --stub swaps the model for a fake one that writes a tetrahedron,
+for testing clients without weights or a GPU.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import collections
+from dataclasses import asdict, replace
+from urllib.parse import urlsplit, parse_qsl
+
+from backend.jobs import Job, JobQueue, JobCancelled
+from backend.stages import DEFAULT_OPTIONS
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_UPLOAD_DIR = os.path.join("output", "uploads")
+MAX_BODY_BYTES = 64 * 1024 * 1024
+MAX_LOG_LINES = 2000 # Per job
+READ_CHUNK = 1024 * 1024
+
+REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error"}
+UPLOAD_EXTENSIONS = {"image/png": ".png", "image/jpeg": ".jpg", "image/webp": ".webp", "image/bmp": ".bmp"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def stub_run_job(job, update, cancel_token, delay=0.1, steps=10):
+    """Stand-in for the model: reports progress, then writes a tetrahedron .obj."""
+    for step in range(steps):
+        if cancel_token.cancelled:
+            raise JobCancelled("Job cancelled")
+        time.sleep(delay)
+        update(progress=int(100 * (step + 1) / (steps + 1)), status=f"Stub step {step + 1}/{steps}")
+
+    output_dir = job.output_dir or os.path.join(os.path.abspath("output"), job.id)
+    os.makedirs(output_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(job.image_path))[0]
+    mesh_path = os.path.join(output_dir, f"{name}.obj")
+    with open(mesh_path, "w", encoding="utf-8") as f:
+        f.write("v 0 0 0\nv 1 0 0\nv 0 1 0\nv 0 0 1\nf 1 3 2\nf 1 2 4\nf 1 4 3\nf 2 3 4\n")
+    return mesh_path
+
+
+class JobRecord:
+    """Event-loop side view of one job: latest snapshot plus its log lines."""
+
+    def __init__(self, job):
+        self.job = job
+        self.lines = collections.deque(maxlen=MAX_LOG_LINES)
+        self.total_lines = 0 # Lines ever added, including those rotated out
+        self.changed = asyncio.Event()
+
+    def update(self, job):
+        if job.status and job.status != self.job.status:
+            self.lines.append(job.status)
+            self.total_lines += 1
+        if job.finished and not self.job.finished:
+            self.lines.append(f"Job {job.state}" + (f": {job.error}" if job.error else ""))
+            self.total_lines += 1
+        self.job = job
+        # Wake every waiter, then arm a fresh event for the next change
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class JobServer:
+    """
+    asyncio HTTP front end for a JobQueue.
+
+    Args:
+        manager (BackendManager): Runs real generations. Ignored with stub.
+        stub (bool): Use stub_run_job instead of the model.
+        workers (int): Jobs running at the same time.
+        upload_dir (str): Where uploaded images are stored.
+    """
+
+    def __init__(self, manager=None, host=DEFAULT_HOST, port=DEFAULT_PORT, stub=False, workers=1,
+                 upload_dir=DEFAULT_UPLOAD_DIR, stub_delay=0.1):
+        self.host = host
+        self.port = port
+        self.upload_dir = os.path.abspath(upload_dir)
+        self.manager = None
+        if stub:
+            self.jobs = JobQueue(lambda job, update, token: stub_run_job(job, update, token, delay=stub_delay),
+                                 concurrency=workers)
+        else:
+            if manager is None:
+                from backend.manager import BackendManager
+                manager = BackendManager()
+            self.manager = manager
+            manager.set_concurrency(workers)
+            self.jobs = manager.jobs
+        self.records = {}
+        self._loop = None
+        self._server = None
+
+    # --- Lifecycle ---
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self.jobs.add_listener(self._on_job_threadsafe)
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1] # Resolves port 0
+        print(f"[Server] Listening on http://{self.host}:{self.port}")
+        return self._server
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        self.jobs.remove_listener(self._on_job_threadsafe)
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    # --- Job updates (arrive on job threads) ---
+
+    def _on_job_threadsafe(self, job):
+        self._loop.call_soon_threadsafe(self._on_job, job)
+
+    def _on_job(self, job):
+        record = self.records.get(job.id)
+        if record is None:
+            self.records[job.id] = JobRecord(job)
+        else:
+            record.update(job)
+
+    # --- HTTP plumbing ---
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HTTPError as e:
+                    await self._send_json(writer, e.status, {"error": str(e)}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, query, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                try:
+                    keep_alive = await self._dispatch(writer, method, path, query, headers, body, keep_alive)
+                except HTTPError as e:
+                    await self._send_json(writer, e.status, {"error": str(e)}, keep_alive=keep_alive)
+                except Exception as e:
+                    print(f"[Server] Error handling {method} {path}: {e}")
+                    await self._send_json(writer, 500, {"error": str(e)}, keep_alive=False)
+                    break
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _read_request(self, reader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return None # Client closed the connection
+        except asyncio.LimitOverrunError:
+            raise HTTPError(400, "Request header too large")
+
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+
+        length = int(headers.get("content-length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, "Body too large")
+        body = await reader.readexactly(length) if length else b""
+
+        url = urlsplit(target)
+        return method.upper(), url.path.rstrip("/") or "/", dict(parse_qsl(url.query)), headers, body
+
+    async def _send(self, writer, status, body=b"", content_type="application/json", keep_alive=True, headers=None):
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+                 f"Content-Type: {content_type}",
+                 f"Content-Length: {len(body)}",
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        lines += [f"{key}: {value}" for key, value in (headers or {}).items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def _send_json(self, writer, status, payload, keep_alive=True):
+        await self._send(writer, status, json.dumps(payload).encode("utf-8"), keep_alive=keep_alive)
+
+    # --- Routes ---
+
+    async def _dispatch(self, writer, method, path, query, headers, body, keep_alive):
+        """Handles one request; returns whether the connection may be reused."""
+        parts = path.strip("/").split("/")
+
+        if parts == ["health"] and method == "GET":
+            await self._send_json(writer, 200, {"status": "ok", "jobs": self.jobs.counts()}, keep_alive)
+        elif parts == ["jobs"] and method == "POST":
+            job = await self._submit(query, headers, body)
+            await self._send_json(writer, 202, {"id": job.id, "url": f"/jobs/{job.id}"}, keep_alive)
+        elif parts == ["jobs"] and method == "GET":
+            await self._send_json(writer, 200, {"jobs": [self._job_json(r.job) for r in self.records.values()]},
+                                  keep_alive)
+        elif len(parts) == 2 and parts[0] == "jobs":
+            record = self._record(parts[1])
+            if method == "GET":
+                await self._send_json(writer, 200, self._job_json(record.job), keep_alive)
+            elif method == "DELETE":
+                cancelled = self.jobs.cancel(record.job.id)
+                await self._send_json(writer, 200 if cancelled else 409, {"id": record.job.id, "cancelled": cancelled},
+                                      keep_alive)
+            else:
+                raise HTTPError(405, f"{method} not allowed")
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "logs" and method == "GET":
+            return await self._stream_logs(writer, self._record(parts[1]), query.get("follow", "1") != "0", keep_alive)
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "mesh" and method == "GET":
+            await self._send_mesh(writer, self._record(parts[1]).job, keep_alive)
+        else:
+            raise HTTPError(404, f"No route for {method} {path}")
+        return keep_alive
+
+    def _record(self, job_id):
+        record = self.records.get(job_id)
+        if record is None:
+            raise HTTPError(404, f"Unknown job {job_id}")
+        return record
+
+    async def _submit(self, query, headers, body):
+        content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        if content_type == "application/json":
+            try:
+                request = json.loads(body or b"{}")
+            except ValueError:
+                raise HTTPError(400, "Invalid JSON body")
+            if not isinstance(request, dict):
+                raise HTTPError(400, "JSON body must be an object")
+            image_path = request.get("image_path")
+            if not image_path or not os.path.isfile(image_path):
+                raise HTTPError(400, "image_path must point to an existing file")
+            image_path = os.path.abspath(image_path)
+            upload = None
+            options = request.get("options") or {}
+            if not isinstance(options, dict):
+                raise HTTPError(400, "options must be a JSON object")
+        else:
+            if not body:
+                raise HTTPError(400, "Send an image body or a JSON request")
+            image_path = os.path.join(self.upload_dir, uuid.uuid4().hex + UPLOAD_EXTENSIONS.get(content_type, ".png"))
+            upload = body
+            request = query
+            options = {k: v for k, v in query.items() if k in DEFAULT_OPTIONS}
+
+        unknown = set(options) - set(DEFAULT_OPTIONS)
+        if unknown:
+            raise HTTPError(400, f"Unknown options: {', '.join(sorted(unknown))}")
+        options = {k: self._parse_option(k, v) for k, v in options.items()}
+        memory_budget_gb = None
+        if request.get("memory_budget_gb") not in (None, ""):
+            memory_budget_gb = self._parse_number("memory_budget_gb", request["memory_budget_gb"], float)
+            if not 0 < memory_budget_gb < float("inf"):
+                raise HTTPError(400, f"Invalid value for memory_budget_gb: {request['memory_budget_gb']}")
+        if upload is not None:
+            # Only once the request is valid; the disk write stays off the loop
+            await asyncio.get_running_loop().run_in_executor(None, self._write_upload, image_path, upload)
+
+        job = Job(
+            image_path=image_path,
+            model_name=request.get("model", "InstantMesh"),
+            low_vram=str(request.get("low_vram", False)).lower() in ("1", "true", "yes"),
+            options=options,
+            priority=self._parse_number("priority", request.get("priority", 0), int),
+            memory_budget_gb=memory_budget_gb,
+        )
+        # Register (a snapshot: the queue mutates job in place) before any update can arrive
+        self.records[job.id] = JobRecord(replace(job))
+        self.jobs.submit(job)
+        return job
+
+    def _write_upload(self, image_path, body):
+        os.makedirs(self.upload_dir, exist_ok=True)
+        with open(image_path, "wb") as f:
+            f.write(body)
+
+    @classmethod
+    def _parse_option(cls, name, value):
+        """Option from a query string or a JSON body, as the type of its default."""
+        default = DEFAULT_OPTIONS[name]
+        if isinstance(default, bool):
+            if isinstance(value, bool):
+                return value
+            if isinstance(value, str):
+                return value.lower() in ("1", "true", "yes", "on")
+            raise HTTPError(400, f"Invalid value for {name}: {value}")
+        return cls._parse_number(name, value, type(default))
+
+    @staticmethod
+    def _parse_number(name, value, kind):
+        """int or float from a string or JSON number; booleans and fractional ints are refused."""
+        if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            raise HTTPError(400, f"Invalid value for {name}: {value}")
+        try:
+            number = kind(value)
+        except (ValueError, OverflowError):
+            raise HTTPError(400, f"Invalid value for {name}: {value}")
+        if kind is int and isinstance(value, float) and value != number:
+            raise HTTPError(400, f"Invalid value for {name}: {value}")
+        return number
+
+    @staticmethod
+    def _job_json(job):
+        payload = asdict(job)
+        payload["finished"] = job.finished
+        return payload
+
+    async def _stream_logs(self, writer, record, follow, keep_alive):
+        if not follow:
+            body = "".join(line + "\n" for line in record.lines).encode("utf-8")
+            await self._send(writer, 200, body, "text/plain; charset=utf-8", keep_alive)
+            return keep_alive
+
+        writer.write(("HTTP/1.1 200 OK\r\nContent-Type: text/plain; charset=utf-8\r\n"
+                      "Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n").encode("latin-1"))
+        position = record.total_lines - len(record.lines)
+        while True:
+            first = record.total_lines - len(record.lines)
+            new_lines = list(record.lines)[max(0, position - first):]
+            position = record.total_lines
+            if new_lines:
+                chunk = "".join(line + "\n" for line in new_lines).encode("utf-8")
+                writer.write(f"{len(chunk):x}\r\n".encode("latin-1") + chunk + b"\r\n")
+                await writer.drain()
+            if record.job.finished:
+                break
+            await record.changed.wait()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+        return False
+
+    async def _send_mesh(self, writer, job, keep_alive):
+        if job.state != "done" or not job.result_path:
+            raise HTTPError(409, f"Job is {job.state}, no mesh yet")
+        if not os.path.isfile(job.result_path):
+            raise HTTPError(404, "Mesh file no longer exists")
+
+        size = os.path.getsize(job.result_path)
+        filename = os.path.basename(job.result_path)
+        writer.write((f"HTTP/1.1 200 OK\r\nContent-Type: model/obj\r\nContent-Length: {size}\r\n"
+                      f"Content-Disposition: attachment; filename=\"{filename}\"\r\n"
+                      f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode("latin-1"))
+        loop = asyncio.get_running_loop()
+        with open(job.result_path, "rb") as f:
+            while True:
+                chunk = await loop.run_in_executor(None, f.read, READ_CHUNK) # Disk reads stay off the loop
+                if not chunk:
+                    break
+                writer.write(chunk)
+                await writer.drain()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m backend.server", description="Local HTTP job server.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Interface to bind (keep it local: no authentication).")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=1, help="Jobs running at the same time.")
+    parser.add_argument("--upload-dir", default=DEFAULT_UPLOAD_DIR)
+    parser.add_argument("--stub", action="store_true", help="Use a fake model (for testing clients).")
+    parser.add_argument("--stub-delay", type=float, default=0.1, help="Seconds per fake progress step.")
+    args = parser.parse_args(argv)
+
+    server = JobServer(host=args.host, port=args.port, stub=args.stub, workers=args.workers,
+                       upload_dir=args.upload_dir, stub_delay=args.stub_delay)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        print("[Server] Shutting down...")
+    finally:
+        server.jobs.cancel_all()
+        server.jobs.wait(timeout=10)
+        if server.manager is not None:
+            server.manager.unload_model()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+import os
+import json
+import shutil
+import hashlib
+from dataclasses import dataclass, fields
+from typing import Optional
+
+from backend.manifest import MANIFEST_FILE, read_manifest, artifact_paths
+
+DEFAULT_STAGE_DIR = os.path.join("cache", "stages")
+DEFAULT_MAX_SIZE_MB = 8192
+
+# Generation options understood by the InstantMesh engine (same defaults as run.py,
+# except that the turntable video is always requested by the app).
+DEFAULT_OPTIONS = {
+    "no_rembg": False,
+    "diffusion_steps": 75,
+    "seed": 42,
+    "scale": 1.0,
+    "view": 6,
+    "export_texmap": False,
+    "save_video": True,
+    "distance": 4.5,
+}
+
+
+# --- Stage outputs ---
+# Each field is the path of one persisted artifact.
+
+@dataclass
+class SegmentOutput:
+    image: str              # Background-removed, recentred input image
+
+@dataclass
+class MultiviewOutput:
+    grid: str               # 3x2 grid of zero123plus views
+
+@dataclass
+class ReconstructionOutput:
+    planes: str             # Triplane features (torch.save'd tensor)
+
+@dataclass
+class MeshOutput:
+    mesh: str               # Extracted .obj
+
+@dataclass
+class ExportOutput:
+    video: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class StageSpec:
+    """
+    One step of the generation pipeline.
+
+    A stage consumes the outputs of the stages it depends on, and its result
+    depends only on those outputs plus the options listed in params.
+    """
+    name: str
+    depends_on: tuple
+    params: tuple
+    output_type: type
+    weight: float           # Rough share of a full run's time, for overall progress
+
+    def make_output(self, outputs):
+        names = {f.name for f in fields(self.output_type)}
+        return self.output_type(**{k: v for k, v in outputs.items() if k in names})
+
+
+STAGES = (
+    StageSpec("segment", (), ("no_rembg",), SegmentOutput, 5),
+    StageSpec("multiview", ("segment",), ("diffusion_steps", "seed"), MultiviewOutput, 60),
+    StageSpec("reconstruct", ("multiview",), ("scale", "view"), ReconstructionOutput, 5),
+    StageSpec("mesh", ("reconstruct",), ("export_texmap",), MeshOutput, 15),
+    StageSpec("export", ("reconstruct",), ("save_video", "distance"), ExportOutput, 15),
+)
+STAGES_BY_NAME = {stage.name: stage for stage in STAGES}
+
+# Stages whose outputs make up a finished generation
+TARGET_STAGES = ("mesh", "export")
+
+
+def stage_input_names(stage):
+    """Names of the artifacts a stage consumes (the first stage takes the raw image)."""
+    if not stage.depends_on:
+        return ["input_path"]
+    return [f.name for dep in stage.depends_on for f in fields(STAGES_BY_NAME[dep].output_type)]
+
+
+def stage_keys(base_key, options):
+    """
+    Computes the cache key of every stage.
+
+    Keys are chained: a stage's key hashes its own parameters together with
+    the keys of the stages it depends on, so changing an option invalidates
+    that stage and everything downstream of it, and nothing upstream.
+    """
+    keys = {}
+    for stage in STAGES:
+        payload = {
+            "stage": stage.name,
+            "depends_on": [keys[dep] for dep in stage.depends_on] or [base_key],
+            "params": {p: options[p] for p in stage.params},
+        }
+        keys[stage.name] = hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+    return keys
+
+
+class StageStore:
+    """
+    Persists stage intermediates under cache/stages/<stage>/<key>/.
+
+    The worker writes each stage's manifest.json (see backend/manifest.py)
+    after its artifacts, so a directory only counts as complete once the
+    manifest exists and a crash halfway through a stage is simply re-run
+    next time.
+    """
+
+    RESULT_FILE = MANIFEST_FILE
+
+    def __init__(self, root=DEFAULT_STAGE_DIR, max_size_mb=DEFAULT_MAX_SIZE_MB):
+        self.root = os.path.abspath(root)
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+
+    def stage_dir(self, stage, key):
+        return os.path.join(self.root, stage.name, key)
+
+    def load(self, stage, key):
+        """Returns the stage's typed output if it was persisted and is intact, else None."""
+        stage_dir = self.stage_dir(stage, key)
+        manifest = read_manifest(stage_dir)
+        if manifest is None:
+            return None
+
+        paths = artifact_paths(manifest, stage_dir)
+        if paths is None:
+            return None
+        try:
+            output = stage.make_output(paths)
+        except TypeError:
+            return None
+
+        os.utime(os.path.join(stage_dir, self.RESULT_FILE)) # mtime doubles as last-used time for eviction
+        return output
+
+    def prune(self):
+        """Evicts least recently used stage directories until under the size cap."""
+        entries = []
+        total = 0
+        for stage_dir in self._stage_dirs():
+            size = self._dir_size(stage_dir)
+            result_path = os.path.join(stage_dir, self.RESULT_FILE)
+            last_used = os.path.getmtime(result_path) if os.path.exists(result_path) else 0
+            entries.append((last_used, size, stage_dir))
+            total += size
+
+        for last_used, size, stage_dir in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            print(f"[Stages] Evicting {os.path.relpath(stage_dir, self.root)}")
+            shutil.rmtree(stage_dir, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        """
+        Deletes every persisted intermediate.
+        Returns a tuple (deleted_count, freed_bytes).
+        """
+        count = 0
+        freed = 0
+        for stage_dir in self._stage_dirs():
+            freed += self._dir_size(stage_dir)
+            shutil.rmtree(stage_dir, ignore_errors=True)
+            count += 1
+        return count, freed
+
+    def _stage_dirs(self):
+        for stage in STAGES:
+            parent = os.path.join(self.root, stage.name)
+            if not os.path.isdir(parent):
+                continue
+            for key in os.listdir(parent):
+                yield os.path.join(parent, key)
+
+    @staticmethod
+    def _dir_size(path):
+        total = 0
+        for dirpath, _, filenames in os.walk(path):
+            for filename in filenames:
+                try:
+                    total += os.path.getsize(os.path.join(dirpath, filename))
+                except OSError:
+                    pass
+        return total
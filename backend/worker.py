@@ -0,0 +1,402 @@
+import os
+import sys
+import json
+import time
+import signal
+import subprocess
+import threading
+import contextlib
+from dataclasses import dataclass
+from typing import Optional
+
+from backend.protocol import decode_message
+
+WRAPPER_SCRIPT = os.path.join(os.path.dirname(__file__), "instantmesh_wrapper.py")
+INSTANT_MESH_PATH = os.path.join(os.path.dirname(__file__), "InstantMesh")
+DEFAULT_CONFIG = "configs/instant-mesh-large.yaml"
+KILL_GRACE_SECONDS = 0.5 # SIGTERM -> SIGKILL escalation delay
+
+# Native thread pools that otherwise size themselves to the whole machine
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+
+@dataclass(frozen=True)
+class ThreadBudget:
+    """CPU share of one worker process."""
+    num_threads: int                # torch intra-op threads
+    interop_threads: int            # torch inter-op threads
+    cpus: Optional[tuple] = None    # CPU ids to pin to, or None for no affinity
+
+    def args(self):
+        """Command line flags for instantmesh_wrapper.py."""
+        args = ["--num_threads", str(self.num_threads), "--interop_threads", str(self.interop_threads)]
+        if self.cpus:
+            args += ["--cpus", ",".join(str(cpu) for cpu in self.cpus)]
+        return args
+
+    def env(self):
+        return {name: str(self.num_threads) for name in THREAD_ENV_VARS}
+
+
+def available_cpus():
+    """CPU ids this process may run on (respects taskset/cgroup affinity where supported)."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def plan_thread_budgets(workers, cpus=None, pin=False):
+    """
+    Splits the machine into one ThreadBudget per worker.
+
+    CPUs are handed out in contiguous blocks (neighbouring ids usually share
+    caches), and the thread counts add up to the number of CPUs, so N
+    workers together use the machine exactly once instead of N times over.
+    With more workers than CPUs every worker gets a single thread.
+
+    Args:
+        workers (int): Number of worker processes.
+        cpus (list): CPU ids to distribute (defaults to available_cpus()).
+        pin (bool): Also pin every worker to its block of CPUs.
+
+    Returns:
+        list[ThreadBudget]
+    """
+    cpus = list(cpus) if cpus is not None else available_cpus()
+    workers = max(1, int(workers))
+    base, extra = divmod(len(cpus), workers)
+
+    budgets = []
+    start = 0
+    for index in range(workers):
+        count = base + (1 if index < extra else 0)
+        if count == 0:
+            block = (cpus[index % len(cpus)],)
+        else:
+            block = tuple(cpus[start:start + count])
+            start += count
+        budgets.append(ThreadBudget(
+            num_threads=len(block),
+            interop_threads=1 if len(block) < 8 else 2,
+            cpus=block if pin else None,
+        ))
+    return budgets
+
+
+class InstantMeshWorker:
+    """
+    A long-lived instantmesh_wrapper.py process running in --serve mode.
+
+    The wrapper imports torch and loads the checkpoints once when it starts,
+    then executes jobs written to its stdin. Only the first job pays the
+    startup cost; later jobs cost just the inference itself.
+    """
+
+    def __init__(self, config=DEFAULT_CONFIG, budget=None, slot=0, memory_budget_gb=None):
+        self.config = config
+        self.budget = budget    # ThreadBudget, or None for torch defaults
+        self.slot = slot        # Index of the budget within its pool
+        self.memory_budget_gb = memory_budget_gb # Start in low-memory mode (no eager model load)
+        self.process = None
+        self._lock = threading.Lock()
+        self._job_counter = 0
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self, on_log_callback=None):
+        """Spawns the wrapper and blocks until it reports the models are loaded."""
+        if self.is_alive():
+            return
+
+        cmd = [sys.executable, WRAPPER_SCRIPT, self.config, "--serve"]
+        if self.budget is not None:
+            cmd += self.budget.args()
+        if self.memory_budget_gb is not None:
+            cmd += ["--memory_budget_gb", str(self.memory_budget_gb)]
+        print(f"Starting InstantMesh worker: {' '.join(cmd)}")
+
+        env = os.environ.copy()
+        env["PYTHONPATH"] = env.get("PYTHONPATH", "") + os.pathsep + INSTANT_MESH_PATH
+        env["PYTHONUNBUFFERED"] = "1"
+        if self.budget is not None:
+            env.update(self.budget.env())
+
+        # Own process group, so kill() also reaches anything the wrapper spawns (ffmpeg, loaders, ...)
+        if os.name == "nt":
+            group_args = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+        else:
+            group_args = {"start_new_session": True}
+
+        self.process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT, # Merge stderr to stdout for full logging
+            text=True,
+            bufsize=1, # Line buffering
+            env=env,
+            **group_args
+        )
+
+        try:
+            message = self._read_until(("ready", "error"), on_log_callback)
+        except Exception:
+            self.stop()
+            raise
+        if message["event"] == "error":
+            self.stop()
+            raise RuntimeError(f"InstantMesh worker failed to start: {message.get('message')}")
+        print(f"InstantMesh worker ready (pid {message.get('pid')}).")
+
+    def run_job(self, job, on_log_callback=None, on_progress=None):
+        """
+        Sends one job to the worker and waits for its result.
+
+        Args:
+            job (dict): Keyword arguments for InstantMeshEngine.generate.
+            on_log_callback (callable): Receives every plain log line.
+            on_progress (callable): Receives every "progress" message (stage,
+                                    fraction, elapsed, peak_rss_mb).
+
+        Returns:
+            dict: The worker's "done" message with the artifact paths and the
+                  stage timing.
+        """
+        with self._lock:
+            if not self.is_alive():
+                raise RuntimeError("InstantMesh worker is not running.")
+
+            self._job_counter += 1
+            request = dict(job, id=self._job_counter)
+            try:
+                self.process.stdin.write(json.dumps(request) + "\n")
+                self.process.stdin.flush()
+            except OSError as e:
+                raise RuntimeError(f"Lost connection to InstantMesh worker: {e}")
+
+            message = self._read_until(("done", "error"), on_log_callback, on_progress)
+            if message["event"] == "error":
+                raise RuntimeError(f"InstantMesh Error: {message.get('message')}")
+            return message
+
+    def _read_until(self, events, on_log_callback, on_progress=None):
+        """Forwards log lines until a protocol message with one of the given events arrives."""
+        while True:
+            line = self.process.stdout.readline()
+            if not line:
+                return_code = self.process.wait()
+                raise RuntimeError(f"InstantMesh worker exited (Code {return_code}). Check logs.")
+
+            stripped_line = line.strip()
+            if not stripped_line:
+                continue
+
+            message = decode_message(stripped_line)
+            if message is None:
+                print(f"[InstantMesh] {stripped_line}") # Console debug
+                if on_log_callback:
+                    on_log_callback(stripped_line)
+            elif message.get("event") in events:
+                return message
+            elif message.get("event") == "progress" and on_progress:
+                on_progress(message)
+
+    def stop(self, timeout=10):
+        """Asks the worker to exit, killing it if it does not comply in time."""
+        if self.process is None:
+            return
+
+        if self.process.poll() is None:
+            try:
+                self.process.stdin.write(json.dumps({"command": "shutdown"}) + "\n")
+                self.process.stdin.flush()
+                self.process.stdin.close()
+            except OSError:
+                pass
+
+            try:
+                self.process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                self.kill()
+
+        self.process = None
+        print("InstantMesh worker stopped.")
+
+    def kill(self, grace=KILL_GRACE_SECONDS):
+        """
+        Terminates the worker's whole process tree immediately, e.g. to cancel
+        a running job. The model memory is released with the process; the
+        pool starts a fresh worker on next use.
+
+        SIGTERM goes to the process group first, SIGKILL follows after `grace`
+        seconds for anything still alive. Safe to call from any thread while
+        run_job() is blocked on the worker's output.
+
+        Returns:
+            float: Seconds until the worker had exited.
+        """
+        process = self.process
+        if process is None:
+            return 0.0
+
+        start = time.monotonic()
+        if process.poll() is None:
+            if os.name == "nt":
+                subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            else:
+                self._signal_group(process, signal.SIGTERM)
+                try:
+                    process.wait(timeout=grace)
+                except subprocess.TimeoutExpired:
+                    pass
+                # Also sweeps children that outlived the wrapper itself
+                self._signal_group(process, signal.SIGKILL)
+            process.wait()
+
+        elapsed = time.monotonic() - start
+        print(f"InstantMesh worker killed (pid {process.pid}) in {elapsed:.2f}s.")
+        return elapsed
+
+    @staticmethod
+    def _signal_group(process, sig):
+        try:
+            os.killpg(process.pid, sig) # start_new_session makes the pid the group id
+        except (ProcessLookupError, PermissionError):
+            pass
+
+
+class WorkerPool:
+    """
+    A fixed number of InstantMeshWorker processes, one per concurrent job.
+
+    Workers are started lazily the first time they are handed out and then
+    stay warm. acquire() blocks while every worker is busy.
+
+    Every worker slot gets its own ThreadBudget (see plan_thread_budgets), so
+    N workers share the cores instead of each spawning a thread per core.
+
+    With a memory budget set, workers start in low-memory mode and load
+    models per stage instead of keeping both resident.
+    """
+
+    def __init__(self, size=1, config=DEFAULT_CONFIG, partition_threads=True, pin_cpus=False,
+                 memory_budget_gb=None):
+        self.config = config
+        self.partition_threads = partition_threads
+        self.pin_cpus = pin_cpus
+        self.memory_budget_gb = memory_budget_gb
+        self._size = max(1, int(size))
+        self._budgets = self._plan_budgets(self._size)
+        self._lock = threading.Condition()
+        self._idle = []
+        self._busy = set()
+        self._retired = set() # Busy workers to stop once released
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def budgets(self):
+        return list(self._budgets)
+
+    def _plan_budgets(self, size):
+        if not self.partition_threads:
+            return [None] * size
+        return plan_thread_budgets(size, pin=self.pin_cpus)
+
+    def resize(self, size, pin_cpus=None):
+        """
+        Changes the pool size (and optionally CPU pinning). The thread budgets
+        are re-planned, so idle workers are stopped right away (and restarted
+        with their new budget on next use); busy ones stop once their job is done.
+        """
+        size = max(1, int(size))
+        with self._lock:
+            if size == self._size and (pin_cpus is None or pin_cpus == self.pin_cpus):
+                return
+            self._size = size
+            if pin_cpus is not None:
+                self.pin_cpus = pin_cpus
+            self._budgets = self._plan_budgets(size)
+        self._restart_workers()
+
+    def set_memory_budget(self, memory_budget_gb):
+        """
+        Sets the memory budget new workers start with (None for normal mode).
+        Switching between normal and low-memory mode restarts the workers
+        like resize(); a changed budget alone only applies to new workers,
+        since every stage request carries its own budget anyway.
+        """
+        with self._lock:
+            switched = (memory_budget_gb is None) != (self.memory_budget_gb is None)
+            self.memory_budget_gb = memory_budget_gb
+        if switched:
+            self._restart_workers()
+
+    def _restart_workers(self):
+        """Stops idle workers now and busy ones once they are released."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._retired.update(self._busy)
+            self._lock.notify_all()
+        for worker in idle:
+            worker.stop()
+
+    def _free_slot(self):
+        # Caller holds self._lock
+        used = {w.slot for w in self._idle} | {w.slot for w in self._busy if w not in self._retired}
+        return next(slot for slot in range(self._size) if slot not in used)
+
+    def workers(self):
+        with self._lock:
+            return list(self._idle) + list(self._busy)
+
+    @contextlib.contextmanager
+    def acquire(self, on_log_callback=None, cancel_token=None):
+        """
+        Hands out a started worker for the duration of the with-block.
+        Cancelling cancel_token kills the worker, also while it is still
+        loading the models.
+        """
+        with self._lock:
+            while not self._idle and len(self._busy) >= self._size:
+                self._lock.wait()
+            if self._idle:
+                worker = self._idle.pop()
+            else:
+                slot = self._free_slot()
+                worker = InstantMeshWorker(self.config, budget=self._budgets[slot], slot=slot,
+                                           memory_budget_gb=self.memory_budget_gb)
+            self._busy.add(worker)
+
+        try:
+            if cancel_token is None:
+                worker.start(on_log_callback=on_log_callback)
+                yield worker
+            else:
+                with cancel_token.on_cancel(worker.kill):
+                    cancel_token.raise_if_cancelled()
+                    worker.start(on_log_callback=on_log_callback)
+                    yield worker
+        finally:
+            with self._lock:
+                self._busy.discard(worker)
+                retired = worker in self._retired
+                self._retired.discard(worker)
+                if not retired and len(self._idle) + len(self._busy) < self._size:
+                    self._idle.append(worker)
+                    worker = None
+                self._lock.notify_all()
+            if worker is not None:
+                worker.stop() # Pool shrank or was stopped while this worker was busy
+
+    def stop_all(self):
+        """Stops idle workers now and busy ones as soon as they are released."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._retired.update(self._busy)
+        for worker in idle:
+            worker.stop()
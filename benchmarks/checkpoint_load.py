@@ -0,0 +1,175 @@
+"""
+Checkpoint load benchmark: classic pickle load vs. the memory-mapped copy
+from backend/checkpoint.py.
+
+Every loader runs in a fresh interpreter. With --processes N, N loaders hold
+the weights at the same time, which shows how much memory concurrent workers
+really cost (PSS splits shared pages between the processes mapping them).
+
+    python benchmarks/checkpoint_load.py [--ckpt PATH] [--processes 2]
+    python benchmarks/checkpoint_load.py --synthetic-mb 1024
+
+Without --ckpt, backend/InstantMesh/ckpts/instant_mesh_large.ckpt is used.
+--synthetic-mb generates a throwaway checkpoint of that size instead.
+The first mmap run converts the checkpoint; that one-time cost is reported
+separately. RSS/PSS figures need Linux (/proc).
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+DEFAULT_CKPT = os.path.join(PROJECT_ROOT, "backend", "InstantMesh", "ckpts", "instant_mesh_large.ckpt")
+KEY = "state_dict"
+PREFIX = "lrm_generator."
+
+LOADER_SNIPPET = r"""
+import sys, time, json
+sys.path.insert(0, {root!r})
+import torch
+
+def memory():
+    fields = {{}}
+    for name in ("/proc/self/status", "/proc/self/smaps_rollup"):
+        try:
+            for line in open(name):
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].rstrip(":") in ("VmRSS", "VmHWM", "Pss", "Private_Clean", "Private_Dirty"):
+                    fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+        except OSError:
+            pass
+    return fields
+
+before = memory()
+start = time.perf_counter()
+if {mode!r} == "pickle":
+    state_dict = torch.load({ckpt!r}, map_location="cpu")[{key!r}]
+    state_dict = {{k[len({prefix!r}):]: v for k, v in state_dict.items() if k.startswith({prefix!r})}}
+else:
+    from backend.checkpoint import load_state_dict
+    state_dict = load_state_dict({ckpt!r}, key={key!r}, prefix={prefix!r}, out_dir={out_dir!r})
+load_s = time.perf_counter() - start
+
+# Inference reads every weight; touch them all so mapped pages are counted
+start = time.perf_counter()
+checksum = sum(float(v.float().sum()) for v in state_dict.values() if torch.is_tensor(v))
+touch_s = time.perf_counter() - start
+
+print("loaded", flush=True)
+sys.stdin.readline() # Wait until every loader holds its weights
+after = memory()
+print(json.dumps({{
+    "load_s": load_s,
+    "touch_s": touch_s,
+    "rss_mb": after.get("VmRSS"),
+    "peak_rss_mb": after.get("VmHWM"),
+    "pss_mb": after.get("Pss"),
+    "private_mb": (after.get("Private_Clean", 0) + after.get("Private_Dirty", 0)) if "Pss" in after else None,
+    "baseline_rss_mb": before.get("VmRSS"),
+}}), flush=True)
+"""
+
+
+def run_loaders(mode, ckpt, out_dir, processes):
+    code = LOADER_SNIPPET.format(root=PROJECT_ROOT, mode=mode, ckpt=ckpt, key=KEY, prefix=PREFIX, out_dir=out_dir)
+    children = [
+        subprocess.Popen([sys.executable, "-c", code], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        for _ in range(processes)
+    ]
+    for child in children:
+        for line in child.stdout:
+            if line.strip() == "loaded":
+                break
+        else:
+            raise RuntimeError(f"{mode} loader exited with code {child.wait()}")
+    results = []
+    for child in children:
+        child.stdin.write("measure\n")
+        child.stdin.flush()
+    for child in children:
+        lines = [line for line in child.stdout.read().splitlines() if line.startswith("{")]
+        child.wait()
+        results.append(json.loads(lines[-1]))
+    return results
+
+
+def make_synthetic(path, size_mb):
+    import torch
+
+    state_dict = {}
+    remaining = int(size_mb * 1024 * 1024 / 4)
+    index = 0
+    while remaining > 0:
+        numel = min(remaining, 4 * 1024 * 1024)
+        state_dict[f"{PREFIX}block{index}.weight"] = torch.randn(numel)
+        remaining -= numel
+        index += 1
+    torch.save({KEY: state_dict}, path, _use_new_zipfile_serialization=False) # Like the legacy .ckpt pickles
+
+
+def summarise(label, results):
+    def total(field):
+        values = [r[field] for r in results if r.get(field) is not None]
+        return sum(values) if values else None
+
+    def fmt(value, unit):
+        return f"{value:8.1f}{unit}" if value is not None else "       -"
+
+    load = max(r["load_s"] for r in results)
+    touch = max(r["touch_s"] for r in results)
+    print(f"{label:<8} {load:8.3f}s {touch:8.3f}s {fmt(total('rss_mb'), 'M')} {fmt(total('pss_mb'), 'M')} "
+          f"{fmt(total('private_mb'), 'M')}")
+    return {"mode": label, "load_s": load, "touch_s": touch, "processes": results,
+            "total_rss_mb": total("rss_mb"), "total_pss_mb": total("pss_mb"),
+            "total_private_mb": total("private_mb")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare pickle and memory-mapped checkpoint loads.")
+    parser.add_argument("--ckpt", default=DEFAULT_CKPT, help="Checkpoint to load.")
+    parser.add_argument("--synthetic-mb", type=float, help="Benchmark a generated checkpoint of this size instead.")
+    parser.add_argument("--processes", type=int, default=1, help="Loaders holding the weights at the same time.")
+    parser.add_argument("--json", help="Also write the results to this file.")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="ckpt_bench_")
+    try:
+        ckpt = args.ckpt
+        out_dir = os.path.dirname(os.path.abspath(ckpt))
+        if args.synthetic_mb:
+            ckpt = os.path.join(tmp_dir, "synthetic.ckpt")
+            out_dir = tmp_dir
+            make_synthetic(ckpt, args.synthetic_mb)
+        if not os.path.exists(ckpt):
+            sys.exit(f"Checkpoint not found: {ckpt} (use --ckpt or --synthetic-mb)")
+
+        from backend.checkpoint import convert, is_converted
+
+        conversion_s = None
+        if not is_converted(ckpt, KEY, PREFIX, out_dir=out_dir):
+            start = time.perf_counter()
+            convert(ckpt, KEY, PREFIX, out_dir=out_dir)
+            conversion_s = time.perf_counter() - start
+
+        print(f"checkpoint: {ckpt} ({os.path.getsize(ckpt) / 2**20:.0f} MB), {args.processes} process(es)")
+        if conversion_s is not None:
+            print(f"one-time conversion: {conversion_s:.2f}s")
+        print(f"{'mode':<8} {'load':>9} {'touch':>9} {'RSS':>9} {'PSS':>9} {'private':>9}")
+        rows = [summarise(mode, run_loaders(mode, ckpt, out_dir, args.processes)) for mode in ("pickle", "mmap")]
+
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump({"checkpoint": ckpt, "conversion_s": conversion_s, "results": rows}, f, indent=2)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Multi-view render benchmark: views/sec of nvdiffrast.multiview.render_views
+(one instanced call for all K views) versus rendering the K views one call
+at a time, as the samples do.
+
+The mesh is the sphere from the bundled samples/data/envphong.npz (30k
+triangles), shaded with its normals as vertex colors and antialiased.
+Cameras sit on a circle around it. Run from the project root:
+
+    python benchmarks/multiview_render.py [--views 1,2,4,8,16,32] [--resolution 256]
+    python benchmarks/multiview_render.py --device cuda --json results.json
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import statistics
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NVDIFFRAST_ROOT = os.path.join(PROJECT_ROOT, "backend", "nvdiffrast")
+sys.path.insert(0, NVDIFFRAST_ROOT)
+
+import numpy as np
+import torch
+import nvdiffrast.torch as dr
+from nvdiffrast.multiview import render_views, transform_pos
+
+
+def camera_matrices(count):
+    """Clip-space transforms [count, 4, 4] for cameras on a circle around the origin."""
+    n, f, x = 1.0, 10.0, 0.4
+    proj = np.array([[n / x, 0, 0, 0],
+                     [0, n / x, 0, 0],
+                     [0, 0, -(f + n) / (f - n), -(2 * f * n) / (f - n)],
+                     [0, 0, -1, 0]], np.float32)
+    out = []
+    for k in range(count):
+        a = 2 * math.pi * k / count
+        c, s = math.cos(a), math.sin(a)
+        mv = np.array([[c, 0, s, 0], [0, 1, 0, 0], [-s, 0, c, -3.5], [0, 0, 0, 1]], np.float32)
+        out.append(proj @ mv)
+    return np.stack(out)
+
+
+def render_loop(glctx, mtx, pos, pos_idx, col, resolution):
+    """One rasterize/interpolate/antialias call chain per view, like the samples."""
+    colors = []
+    for k in range(mtx.shape[0]):
+        clip = transform_pos(mtx[k], pos)
+        rast, _ = dr.rasterize(glctx, clip, pos_idx, resolution)
+        color, _ = dr.interpolate(col[None], rast, pos_idx)
+        colors.append(dr.antialias(color, rast, clip, pos_idx))
+    return torch.cat(colors)
+
+
+def render_batch(glctx, mtx, pos, pos_idx, col, resolution):
+    return render_views(glctx, mtx, pos, pos_idx, resolution, col=col)["color"]
+
+
+def measure(fn, repeat, device):
+    def sync():
+        if device.type == "cuda":
+            torch.cuda.synchronize(device)
+    fn() # Warm-up
+    sync()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        sync()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure instanced multi-view rendering against a per-view loop.")
+    parser.add_argument("--views", default="1,2,4,8,16,32", help="Comma separated view counts K.")
+    parser.add_argument("--resolution", type=int, default=256, help="Square output resolution.")
+    parser.add_argument("--device", default="cpu", help="cpu or cuda.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed renders per configuration.")
+    parser.add_argument("--json", help="Also write the results to this file.")
+    args = parser.parse_args()
+
+    device = torch.device(args.device)
+    with np.load(os.path.join(NVDIFFRAST_ROOT, "samples", "data", "envphong.npz")) as f:
+        pos_idx, pos, normals, _ = f.values()
+    pos_idx = torch.as_tensor(pos_idx.astype(np.int32), device=device)
+    pos = torch.as_tensor(pos, dtype=torch.float32, device=device)
+    col = torch.as_tensor(normals * 0.5 + 0.5, dtype=torch.float32, device=device)
+    glctx = dr.RasterizeCudaContext(device=device) if device.type == "cuda" else dr.RasterizeCpuContext()
+    resolution = (args.resolution, args.resolution)
+    print(f"{pos_idx.shape[0]} triangles at {args.resolution}x{args.resolution} on {device}")
+
+    results = []
+    print(f"{'views':>5} {'loop':>9} {'batched':>9} {'loop v/s':>9} {'batch v/s':>9} {'speedup':>8}")
+    for count in [int(x) for x in args.views.split(",")]:
+        mtx = camera_matrices(count)
+        with torch.no_grad():
+            loop_s = measure(lambda: render_loop(glctx, mtx, pos, pos_idx, col, resolution), args.repeat, device)
+            batch_s = measure(lambda: render_batch(glctx, mtx, pos, pos_idx, col, resolution), args.repeat, device)
+        row = {
+            "views": count,
+            "loop_s": loop_s,
+            "batched_s": batch_s,
+            "loop_views_per_s": count / loop_s,
+            "batched_views_per_s": count / batch_s,
+            "speedup": loop_s / batch_s,
+        }
+        results.append(row)
+        print(f"{count:>5} {loop_s * 1000:>7.1f}ms {batch_s * 1000:>7.1f}ms "
+              f"{row['loop_views_per_s']:>9.1f} {row['batched_views_per_s']:>9.1f} {row['speedup']:>7.2f}x")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": sys.version.split()[0],
+                "torch": torch.__version__,
+                "device": str(device),
+                "resolution": args.resolution,
+                "triangles": pos_idx.shape[0],
+                "repeat": args.repeat,
+                "results": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+nvdiffrast sample benchmark: runs the cube, earth, pose and envphong training
+demos from backend/nvdiffrast/samples/torch for a fixed number of iterations
+from a fixed seed, with logging, display and saving off, and records
+iterations/sec, peak memory, and per-op forward/backward time for
+rasterize, interpolate, texture and antialias.
+
+Each sample runs in a child process so its peak memory is its own (peak
+RSS on CPU, peak allocated Cuda memory on Cuda). The samples read the
+bundled samples/data/*.npz; a sample whose data file is missing (earth.npz
+is not bundled) is reported as skipped. Run from the project root:
+
+    python benchmarks/nvdiffrast_samples.py [--samples cube,pose] [--iters 50]
+    python benchmarks/nvdiffrast_samples.py --device cuda --json results.json
+
+Op timings wrap the public nvdiffrast.torch functions, so an op's time
+includes its Python wrapper. Backward time is measured with hooks on the
+op's autograd node. On Cuda every op is synchronized to be timed, which
+lowers iterations/sec a little compared to an untimed run.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+from collections import defaultdict
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NVDIFFRAST_ROOT = os.path.join(PROJECT_ROOT, "backend", "nvdiffrast")
+SAMPLES_DIR = os.path.join(NVDIFFRAST_ROOT, "samples", "torch")
+DATA_DIR = os.path.join(NVDIFFRAST_ROOT, "samples", "data")
+
+OPS = ("rasterize", "interpolate", "texture", "antialias")
+
+# Sample name -> (module, fit function, data file, fixed arguments). Sizes are
+# cut down from the sample defaults so that the CPU backend finishes in minutes.
+SAMPLES = {
+    "cube": ("cube", "fit_cube", "cube_c.npz", dict(max_iter=200, resolution=16)),
+    "earth": ("earth", "fit_earth", "earth.npz", dict(max_iter=20, res=256, ref_res=1024, enable_mip=True)),
+    "pose": ("pose", "fit_pose", "cube_p.npz", dict(max_iter=50, resolution=256, grad_phase_start=0.0)),
+    "envphong": ("envphong", "fit_env_phong", "envphong.npz", dict(max_iter=10, res=256)),
+}
+
+
+class OpTimer:
+    """Times the nvdiffrast.torch ops called while installed."""
+
+    def __init__(self, dr, torch, device):
+        self.dr = dr
+        self.torch = torch
+        self.cuda = device.type == "cuda"
+        self.stats = defaultdict(lambda: {"calls": 0, "forward_s": 0.0, "backward_calls": 0, "backward_s": 0.0, "peak_extra_bytes": 0})
+        self.peak_bytes = 0
+        self._saved = {}
+
+    def sync(self):
+        if self.cuda:
+            self.torch.cuda.synchronize()
+
+    def install(self):
+        for name in OPS:
+            self._saved[name] = getattr(self.dr, name)
+            setattr(self.dr, name, self._wrap(name, self._saved[name]))
+
+    def uninstall(self):
+        for name, fn in self._saved.items():
+            setattr(self.dr, name, fn)
+        self._saved = {}
+
+    def _wrap(self, name, fn):
+        def timed(*args, **kwargs):
+            stat = self.stats[name]
+            self.sync()
+            if self.cuda:
+                self.peak_bytes = max(self.peak_bytes, self.torch.cuda.max_memory_allocated())
+                before = self.torch.cuda.memory_allocated()
+                self.torch.cuda.reset_peak_memory_stats()
+            start = time.perf_counter()
+            out = fn(*args, **kwargs)
+            self.sync()
+            stat["forward_s"] += time.perf_counter() - start
+            stat["calls"] += 1
+            if self.cuda:
+                peak = self.torch.cuda.max_memory_allocated()
+                self.peak_bytes = max(self.peak_bytes, peak)
+                stat["peak_extra_bytes"] = max(stat["peak_extra_bytes"], peak - before)
+            self._hook_backward(stat, out)
+            return out
+        return timed
+
+    def _hook_backward(self, stat, out):
+        nodes = {t.grad_fn for t in (out if isinstance(out, tuple) else (out,)) if t.grad_fn is not None}
+        for node in nodes:
+            start = []
+            def pre(grad_outputs, start=start):
+                self.sync()
+                start.append(time.perf_counter())
+            def post(grad_inputs, grad_outputs, start=start):
+                self.sync()
+                stat["backward_s"] += time.perf_counter() - start.pop()
+                stat["backward_calls"] += 1
+            node.register_prehook(pre)
+            node.register_hook(post)
+
+    def summary(self):
+        out = {}
+        for name in OPS:
+            s = self.stats[name]
+            out[name] = dict(s,
+                             forward_mean_ms=1000 * s["forward_s"] / s["calls"] if s["calls"] else 0.0,
+                             backward_mean_ms=1000 * s["backward_s"] / s["backward_calls"] if s["backward_calls"] else 0.0)
+            if not self.cuda:
+                out[name]["peak_extra_bytes"] = None
+        return out
+
+
+def run_sample(name, iters, seed, device_name):
+    """Run one sample in this process and return its result dict."""
+    module_name, fit_name, data_file, kwargs = SAMPLES[name]
+    if not os.path.exists(os.path.join(DATA_DIR, data_file)):
+        return {"sample": name, "skipped": f"samples/data/{data_file} not found"}
+
+    sys.path.insert(0, NVDIFFRAST_ROOT)
+    sys.path.insert(0, SAMPLES_DIR)
+    import numpy as np
+    import torch
+    import nvdiffrast.torch as dr
+    import util
+    if device_name:
+        util.device = device_name
+    device = torch.device(util.device)
+    fit = getattr(__import__(module_name), fit_name)
+
+    kwargs = dict(kwargs, log_interval=0, display_interval=None, out_dir=None)
+    if iters is not None:
+        kwargs["max_iter"] = iters
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+    timer = OpTimer(dr, torch, device)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    if timer.cuda:
+        torch.cuda.reset_peak_memory_stats()
+    timer.install()
+    try:
+        start = time.perf_counter()
+        fit(**kwargs)
+        timer.sync()
+        elapsed = time.perf_counter() - start
+    finally:
+        timer.uninstall()
+
+    iterations = kwargs["max_iter"] + 1 # The samples run iterations 0..max_iter.
+    result = {
+        "sample": name,
+        "device": str(device),
+        "iterations": iterations,
+        "seconds": elapsed,
+        "iterations_per_s": iterations / elapsed,
+        "ops": timer.summary(),
+    }
+    if timer.cuda:
+        result["peak_cuda_bytes"] = max(timer.peak_bytes, torch.cuda.max_memory_allocated())
+    else:
+        result["peak_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        result["rss_before_bytes"] = rss_before
+    return result
+
+
+def run_child(name, args):
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", name, "--seed", str(args.seed)]
+    if args.iters is not None:
+        cmd += ["--iters", str(args.iters)]
+    if args.device:
+        cmd += ["--device", args.device]
+    proc = subprocess.run(cmd, cwd=PROJECT_ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {"sample": name, "error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit code {proc.returncode}"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the nvdiffrast training samples.")
+    parser.add_argument("--samples", default=",".join(SAMPLES), help="Comma separated samples to run.")
+    parser.add_argument("--iters", type=int, help="Override every sample's iteration count.")
+    parser.add_argument("--seed", type=int, default=0, help="Numpy and torch random seed.")
+    parser.add_argument("--device", help="cpu or cuda (default: cuda if available).")
+    parser.add_argument("--json", help="Also write the results to this file.")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_sample(args.child, args.iters, args.seed, args.device)
+        print(json.dumps(result))
+        return
+
+    results = []
+    for name in args.samples.split(","):
+        if name not in SAMPLES:
+            parser.error(f"unknown sample '{name}', choose from {', '.join(SAMPLES)}")
+        result = run_child(name, args)
+        results.append(result)
+        if "skipped" in result or "error" in result:
+            print(f"{name}: {result.get('skipped') or result.get('error')}")
+            continue
+        peak = result.get("peak_cuda_bytes", result.get("peak_rss_bytes"))
+        print(f"{name}: {result['iterations']} iterations in {result['seconds']:.2f}s "
+              f"({result['iterations_per_s']:.2f} it/s) on {result['device']}, peak memory {peak / 2**20:.0f} MiB")
+        print(f"  {'op':<12} {'calls':>6} {'fwd mean':>10} {'fwd total':>10} {'bwd mean':>10} {'bwd total':>10}")
+        for op, s in result["ops"].items():
+            print(f"  {op:<12} {s['calls']:>6} {s['forward_mean_ms']:>8.2f}ms {s['forward_s']:>9.2f}s "
+                  f"{s['backward_mean_ms']:>8.2f}ms {s['backward_s']:>9.2f}s")
+
+    if args.json:
+        import torch
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": sys.version.split()[0],
+                "torch": torch.__version__,
+                "seed": args.seed,
+                "results": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+CPU rasterizer benchmark: frame time and triangles/sec of the vendored
+nvdiffrast CPU rasterizer versus the number of worker threads.
+
+A UV sphere of about --triangles triangles is rendered from --views cameras
+around it (instanced mode, one minibatch entry per view), like InstantMesh's
+multi-view renders. Every thread count gets one warm-up frame, then
+--repeat timed frames. Run from the project root:
+
+    python benchmarks/rasterize_threads.py [--resolution 512] [--triangles 100000]
+    python benchmarks/rasterize_threads.py --threads 1,2,4,8 --json results.json
+
+Before timing, the sphere is depth peeled with every thread count as a
+regression check: the layers must be identical across thread counts, and
+no layer may repeat a (pixel, triangle) pair of an earlier layer. A failed
+check exits with an error; --no-check skips it.
+
+Torch's own intra-op threads are left alone; pin them with
+OMP_NUM_THREADS=1 to see the scaling of the rasterizer's thread pool alone.
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import statistics
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "backend", "nvdiffrast"))
+
+import torch
+import nvdiffrast.torch as dr
+
+
+def sphere(triangles):
+    """UV sphere with about the given number of triangles; returns (vertices [V, 3], tri [T, 3] int32)."""
+    rings = max(2, int(math.sqrt(triangles / 4)))
+    segments = 2 * rings
+    theta = torch.linspace(0, math.pi, rings + 1)[:, None]
+    phi = torch.linspace(0, 2 * math.pi, segments + 1)[None, :]
+    v = torch.stack([theta.sin() * phi.cos(), theta.cos().expand(-1, segments + 1), theta.sin() * phi.sin()], dim=-1).reshape(-1, 3)
+    i = torch.arange((rings + 1) * (segments + 1)).reshape(rings + 1, segments + 1)
+    a, b, c, d = i[:-1, :-1].reshape(-1), i[:-1, 1:].reshape(-1), i[1:, :-1].reshape(-1), i[1:, 1:].reshape(-1)
+    tri = torch.cat([torch.stack([a, b, c], -1), torch.stack([b, d, c], -1)])
+    return v, tri.to(torch.int32)
+
+
+def clip_positions(v, views):
+    """Clip-space positions [views, V, 4] for cameras on a circle around the mesh."""
+    n, f, x = 1.0, 10.0, 0.6
+    proj = torch.tensor([[n / x, 0, 0, 0],
+                         [0, n / x, 0, 0],
+                         [0, 0, -(f + n) / (f - n), -(2 * f * n) / (f - n)],
+                         [0, 0, -1, 0]])
+    posw = torch.cat([v, torch.ones(v.shape[0], 1)], dim=1)
+    out = []
+    for k in range(views):
+        a = 2 * math.pi * k / views
+        c, s = math.cos(a), math.sin(a)
+        mv = torch.tensor([[c, 0, s, 0], [0, 1, 0, 0], [-s, 0, c, -3.0], [0, 0, 0, 1]])
+        out.append(posw @ (proj @ mv).t())
+    return torch.stack(out).contiguous()
+
+
+def peel_layers(pos, tri, resolution, threads, layers):
+    ctx = dr.RasterizeCpuContext(num_threads=threads)
+    with dr.DepthPeeler(ctx, pos, tri, resolution=[resolution, resolution]) as peeler:
+        return [peeler.rasterize_next_layer()[0] for _ in range(layers)]
+
+
+def check_peeling(pos, tri, resolution, thread_counts, layers=4):
+    """Return a list of problems with depth peeling; empty if it is correct."""
+    problems = []
+    reference = peel_layers(pos, tri, resolution, thread_counts[0], layers)
+    seen = set()
+    for n, rast in enumerate(reference):
+        tri_id = rast[..., 3].to(torch.int64).reshape(-1)
+        pix = (tri_id > 0).nonzero()[:, 0]
+        pairs = set(zip(pix.tolist(), tri_id[pix].tolist()))
+        repeated = len(pairs & seen)
+        if repeated:
+            problems.append(f"layer {n} repeats {repeated} (pixel, triangle) pairs of earlier layers")
+        seen |= pairs
+    for threads in thread_counts[1:]:
+        layers_t = peel_layers(pos, tri, resolution, threads, layers)
+        if not all(torch.equal(a, b) for a, b in zip(reference, layers_t)):
+            problems.append(f"{threads} threads peel different layers than {thread_counts[0]}")
+    return problems
+
+
+def measure(pos, tri, resolution, threads, repeat):
+    ctx = dr.RasterizeCpuContext(num_threads=threads)
+    dr.rasterize(ctx, pos, tri, resolution=[resolution, resolution]) # Warm-up
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        dr.rasterize(ctx, pos, tri, resolution=[resolution, resolution])
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), min(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure CPU rasterizer scaling across threads.")
+    parser.add_argument("--resolution", type=int, default=512, help="Square output resolution.")
+    parser.add_argument("--triangles", type=int, default=100000, help="Approximate mesh triangle count.")
+    parser.add_argument("--views", type=int, default=6, help="Views rendered per frame.")
+    parser.add_argument("--threads", help="Comma separated thread counts (default: 1, 2, 4, ... up to the CPU count).")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed frames per thread count.")
+    parser.add_argument("--json", help="Also write the results to this file.")
+    parser.add_argument("--no-check", action="store_true", help="Skip the depth peeling check.")
+    args = parser.parse_args()
+
+    if args.threads:
+        thread_counts = [int(x) for x in args.threads.split(",")]
+    else:
+        cpus = os.cpu_count() or 1
+        thread_counts = sorted({min(2 ** k, cpus) for k in range(cpus.bit_length() + 1)})
+
+    v, tri = sphere(args.triangles)
+    pos = clip_positions(v, args.views)
+    total = tri.shape[0] * args.views
+    print(f"{tri.shape[0]} triangles x {args.views} views at {args.resolution}x{args.resolution}, "
+          f"torch intra-op threads: {torch.get_num_threads()}")
+
+    if not args.no_check:
+        problems = check_peeling(pos, tri, min(args.resolution, 128), thread_counts)
+        if problems:
+            sys.exit("Depth peeling check failed: " + "; ".join(problems))
+        print(f"Depth peeling check passed for threads {', '.join(map(str, thread_counts))}")
+
+    results = []
+    base = None
+    print(f"{'threads':>7} {'frame':>9} {'best':>9} {'Mtri/s':>8} {'speedup':>8}")
+    for threads in thread_counts:
+        median_s, min_s = measure(pos, tri, args.resolution, threads, args.repeat)
+        base = base or median_s
+        row = {
+            "threads": threads,
+            "frame_median_s": median_s,
+            "frame_min_s": min_s,
+            "triangles_per_s": total / median_s,
+            "speedup": base / median_s,
+        }
+        results.append(row)
+        print(f"{threads:>7} {median_s * 1000:>7.1f}ms {min_s * 1000:>7.1f}ms "
+              f"{row['triangles_per_s'] / 1e6:>8.2f} {row['speedup']:>7.2f}x")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": sys.version.split()[0],
+                "torch": torch.__version__,
+                "resolution": args.resolution,
+                "triangles": tri.shape[0],
+                "views": args.views,
+                "repeat": args.repeat,
+                "results": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Startup benchmark: cold import time of the backend and time until the main
+window is shown.
+
+Every sample runs in a fresh interpreter, so nothing is cached between runs
+(apart from the OS file cache). Run from the project root:
+
+    python benchmarks/startup.py [--repeat 5] [--json results.json]
+
+The window is created with the offscreen Qt platform unless QT_QPA_PLATFORM
+is already set.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that should not be loaded by a plain import of the app
+HEAVY_MODULES = ["torch", "numpy", "huggingface_hub", "xatlas", "nvdiffrast", "diffusers", "trimesh"]
+
+IMPORT_SNIPPET = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+WINDOW_SNIPPET = """
+import sys, time, json
+start = time.perf_counter()
+from PySide6.QtWidgets import QApplication
+from ui.main_window import MainWindow
+app = QApplication([sys.argv[0]])
+app.setStyle('Fusion')
+window = MainWindow()
+window.show()
+app.processEvents()
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def run_sample(code, env):
+    """Runs code in a new interpreter; returns (in-process seconds, process seconds, heavy modules)."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=PROJECT_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    process_seconds = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed")
+    # The measured code may print its own logs; the result is the last line
+    payload = json.loads(result.stdout.strip().splitlines()[-1])
+    return payload["seconds"], process_seconds, payload["heavy"]
+
+
+def measure(label, code, repeat, env):
+    samples = []
+    process_samples = []
+    heavy = []
+    for _ in range(repeat):
+        seconds, process_seconds, heavy = run_sample(code, env)
+        samples.append(seconds)
+        process_samples.append(process_seconds)
+    return {
+        "target": label,
+        "min_s": min(samples),
+        "median_s": statistics.median(samples),
+        "process_median_s": statistics.median(process_samples),
+        "heavy_modules": heavy,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold import and window startup times.")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per target.")
+    parser.add_argument("--json", help="Also write the results to this file.")
+    parser.add_argument("--skip-window", action="store_true", help="Only measure the backend imports.")
+    args = parser.parse_args()
+
+    env = os.environ.copy()
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    env["PYTHONPATH"] = PROJECT_ROOT + os.pathsep + env.get("PYTHONPATH", "")
+
+    targets = [
+        ("import backend.manager", IMPORT_SNIPPET.format(module="backend.manager", heavy=HEAVY_MODULES)),
+        ("import backend.pipeline", IMPORT_SNIPPET.format(module="backend.pipeline", heavy=HEAVY_MODULES)),
+    ]
+    if not args.skip_window:
+        targets.append(("main.py window shown", WINDOW_SNIPPET.format(heavy=HEAVY_MODULES)))
+
+    results = []
+    print(f"{'target':<26} {'min':>8} {'median':>8} {'process':>8}  heavy modules loaded")
+    for label, code in targets:
+        try:
+            row = measure(label, code, args.repeat, env)
+        except RuntimeError as e:
+            print(f"{label:<26} failed: {e}")
+            continue
+        results.append(row)
+        print(f"{label:<26} {row['min_s']:>7.3f}s {row['median_s']:>7.3f}s {row['process_median_s']:>7.3f}s  "
+              f"{', '.join(row['heavy_modules']) or '-'}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "repeat": args.repeat, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,13 +3,19 @@ from PySide6.QtWidgets import QApplication
 from ui.main_window import MainWindow
 
 def main():
-    app = QApplication(sys.argv)
+    # --prewarm starts an InstantMesh worker in the background right away,
+    # so the first generation does not wait for the model to load
+    prewarm = "--prewarm" in sys.argv
+    app = QApplication([arg for arg in sys.argv if arg != "--prewarm"])
     
     # Set app style hints if needed
     app.setStyle('Fusion')
     
     window = MainWindow()
     window.show()
+
+    if prewarm:
+        window.backend().prewarm(low_vram=window.sidebar.low_vram_check.isChecked())
     
     sys.exit(app.exec())
 
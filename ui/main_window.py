@@ -3,7 +3,7 @@ from PySide6.QtWidgets import (
     QProgressBar, QLabel, QFileDialog, QMessageBox,
     QSplitter, QScrollArea
 )
-from PySide6.QtCore import Qt, QThread, Signal
+from PySide6.QtCore import Qt, QThread, QObject, Signal
 from PySide6.QtGui import QAction, QKeySequence, QShortcut
 from .sidebar import SidebarWidget
 from .viewport import ViewportWidget
@@ -11,70 +11,14 @@ from .log_panel import LogWidget
 from .asset_manager import AssetManagerWidget
 from .theme import DARK_THEME
 
-# Placeholder for the backend worker
-class GenerationWorker(QThread):
-    progress_update = Signal(int, str) # value, status text
-    finished_success = Signal(object, str) # mesh object, saved file path
-    finished_error = Signal(str)
+class JobEventBridge(QObject):
+    """
+    Forwards backend job updates to the GUI thread.
 
-    def __init__(self, prompt, image_path, model_name, low_vram):
-        super().__init__()
-        self.prompt = prompt
-        self.image_path = image_path
-        self.model_name = model_name
-        self.low_vram = low_vram
-
-    def run(self):
-        from backend.manager import BackendManager
-        from backend.pipeline import GenerationPipeline
-        import trimesh
-        import time
-        import os
-
-        try:
-            manager = BackendManager()
-            pipeline = GenerationPipeline(manager)
-            
-            self.progress_update.emit(10, "Initializing Model & Pipeline...")
-            time.sleep(1)
-            self.progress_update.emit(30, "Loading Model weights...")
-            
-            # Wrapper for signal emission because pipeline runs in this thread
-            def log_callback(msg):
-                self.progress_update.emit(-1, msg) # -1 indicates log only, not progress value change
-
-            pipeline.run(self.prompt, self.image_path, self.model_name, self.low_vram, on_log_callback=log_callback)
-            
-            self.progress_update.emit(60, "Generating Geometry...")
-            time.sleep(1)
-            
-            self.progress_update.emit(90, "Finalizing Mesh...")
-            time.sleep(1)
-            
-            mesh = trimesh.creation.icosphere(radius=1.0)
-            
-            output_dir = "output"
-            os.makedirs(output_dir, exist_ok=True)
-            timestamp = int(time.time())
-            filename = f"model_{timestamp}.obj"
-            filepath = os.path.join(output_dir, filename)
-            
-            with open(filepath, 'w') as f:
-                f.write(f"# Dummy OBJ file for {filename}")
-            
-            self.progress_update.emit(100, "Done!")
-            self.finished_success.emit(mesh, filepath)
-            
-        except Exception as e:
-            self.finished_error.emit(str(e))
-
-    def stop(self):
-        # Allow external stop (force termination if needed, or via flag)
-        # Since pipeline.run is blocking subprocess, we might need to terminate thread
-        # But properly we should use a flag if possible. 
-        # For now, we rely on the main thread terminating this QThread if needed.
-        self.terminate()
-        self.wait()
+    JobQueue listeners run on the job's background thread; emitting a signal
+    from there queues the slot call onto the thread owning this object.
+    """
+    job_updated = Signal(object) # backend.jobs.Job snapshot
 
 
 
@@ -160,7 +104,10 @@ class MainWindow(QMainWindow):
         self.progress_bar.setStyleSheet("QProgressBar { border: 1px solid #555; border-radius: 2px; text-align: center; } QProgressBar::chunk { background: #00cc66; }")
         self.statusBar().addPermanentWidget(self.progress_bar)
 
-        self.worker = None
+        self.job_bridge = JobEventBridge()
+        self.job_bridge.job_updated.connect(self.on_job_updated)
+        self.active_jobs = {} # job id -> latest Job snapshot, for jobs started from this window
+        self._backend = None
         self.current_mesh = None
         
         # Shortcuts
@@ -180,6 +127,7 @@ class MainWindow(QMainWindow):
         file_menu = menubar.addMenu("File")
         file_menu.addAction("New Project", self.action_new_project)
         file_menu.addAction("Open Image", self.action_open_image)
+        file_menu.addAction("Queue Folder...", self.action_queue_folder)
         file_menu.addSeparator()
         file_menu.addAction("Clean Cache", self.action_clean_cache)
         file_menu.addSeparator()
@@ -204,7 +152,7 @@ class MainWindow(QMainWindow):
     def action_open_image(self): self.log_panel.info("Open Image.")
     def action_clean_cache(self):
         reply = QMessageBox.question(self, "Clean Cache", 
-                                     "Delete all generated files in output/ and assets/?\nThis cannot be undone.",
+                                     "Delete all generated files in output/, assets/ and the result cache?\nThis cannot be undone.",
                                      QMessageBox.Yes | QMessageBox.No)
         if reply == QMessageBox.Yes:
             from backend.manager import BackendManager
@@ -219,6 +167,22 @@ class MainWindow(QMainWindow):
             # Clear Asset Manager list visually
             self.asset_manager.list_widget.clear()
 
+    def action_queue_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Select Image Folder")
+        if not folder:
+            return
+        import os
+        images = sorted(
+            os.path.join(folder, f) for f in os.listdir(folder)
+            if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.webp'))
+        )
+        if not images:
+            QMessageBox.warning(self, "Queue Folder", "No images found in the selected folder.")
+            return
+        for image in images:
+            self.submit_job("", image)
+        self.log_panel.info(f"Queued {len(images)} images from {folder}")
+
     def action_export_mesh(self): self.export_mesh()
     def action_undo(self): self.log_panel.info("Undo.")
     def action_redo(self): self.log_panel.info("Redo.")
@@ -281,19 +245,27 @@ class MainWindow(QMainWindow):
             # Force layout update/repaint to fix any visual artifacts
             self.main_splitter.refresh()
 
+    def backend(self):
+        """The BackendManager, imported on first use and subscribed to job updates."""
+        if self._backend is None:
+            from backend.manager import BackendManager
+            self._backend = BackendManager()
+            self._backend.jobs.add_listener(self.job_bridge.job_updated.emit)
+        return self._backend
+
     def stop_generation(self):
-        if self.worker and self.worker.isRunning():
-            self.log_panel.warning("Stopping generation...")
-            self.worker.stop()
-            self.worker = None
-            
-        from backend.manager import BackendManager
-        BackendManager().request_stop()
-        
-        self.sidebar.set_generating_state(False)
-        self.status_bar_label.setText("Stopped")
-        self.progress_bar.setValue(0)
-        self.log_panel.info("Generation stopped by user.")
+        manager = self.backend()
+        self.log_panel.warning("Stopping generation...")
+        manager.request_stop()
+
+        if manager.jobs.is_busy():
+            # Running jobs report "cancelled" through on_job_updated once their worker is gone
+            self.status_bar_label.setText("Stopping...")
+        else:
+            self.sidebar.set_generating_state(False)
+            self.status_bar_label.setText("Stopped")
+            self.progress_bar.setValue(0)
+            self.log_panel.info("Generation stopped by user.")
 
     # --- Generation Logic ---
     def start_generation(self, prompt, image_path):
@@ -302,46 +274,80 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Input Error", "Provide prompt or image.")
             return
             
-        self.progress_bar.setValue(0)
-        self.status_bar_label.setText("Processing...")
         self.log_panel.info(f"Starting generation... Prompt: {prompt}")
-        self.sidebar.set_generating_state(True)
-        
+        self.submit_job(prompt, image_path)
+
+    def submit_job(self, prompt, image_path):
+        manager = self.backend()
+        manager.set_concurrency(self.sidebar.concurrency_spin.value(),
+                                pin_cpus=self.sidebar.pin_cpus_check.isChecked())
+        memory_budget_gb = self.sidebar.memory_budget_spin.value() or None
+        manager.set_memory_budget(memory_budget_gb)
+
         model = self.sidebar.model_combo.currentText()
         low_vram = self.sidebar.low_vram_check.isChecked()
-        
-        self.worker = GenerationWorker(prompt, image_path, model, low_vram)
-        self.worker.progress_update.connect(self.on_progress)
-        self.worker.finished_success.connect(self.on_generation_success)
-        self.worker.finished_error.connect(self.on_generation_error)
-        self.worker.start()
+        job = manager.submit_job(image_path, model_name=model, low_vram=low_vram, prompt=prompt,
+                                 memory_budget_gb=memory_budget_gb)
+        self.active_jobs[job.id] = job
 
-    def on_progress(self, value, text):
-        if value >= 0:
-            self.progress_bar.setValue(value)
-        
-        self.status_bar_label.setText(text)
-        
-        # If it's a log message (value -1) or significant progress
-        if value == -1:
-             self.log_panel.info(f"[Core] {text}")
-        elif value % 10 == 0: 
-             self.log_panel.info(f"Progress: {value}% - {text}")
+        self.status_bar_label.setText("Processing...")
+        self.sidebar.set_generating_state(True)
+        self.update_queue_progress()
+
+    def on_job_updated(self, job):
+        if job.id not in self.active_jobs:
+            return
+        previous = self.active_jobs[job.id]
+        self.active_jobs[job.id] = job
+        tag = f"[{job.id[:6]}]" if len(self.active_jobs) > 1 else ""
+
+        if job.state == "running" and job.status and job.status != previous.status:
+            self.status_bar_label.setText(f"{tag} {job.status}".strip())
+            self.log_panel.info(f"[Core]{tag} {job.status}")
+        elif job.state != previous.state:
+            if job.state == "done":
+                self.on_generation_success(job)
+            elif job.state == "failed":
+                self.on_generation_error(f"{tag} {job.error}".strip())
+            elif job.state == "cancelled":
+                latency = f" (stopped in {job.cancel_latency:.2f}s)" if job.cancel_latency else ""
+                self.log_panel.warning(f"{tag} Job cancelled: {job.image_path}{latency}".strip())
 
-    def on_generation_success(self, mesh, file_path):
-        self.status_bar_label.setText("Done")
-        self.log_panel.success("Generation Complete.")
-        self.sidebar.set_generating_state(False)
+        self.update_queue_progress()
+
+    def update_queue_progress(self):
+        jobs = list(self.active_jobs.values())
+        if not jobs:
+            return
+        self.progress_bar.setValue(int(sum(100 if j.finished else j.progress for j in jobs) / len(jobs)))
+
+        if all(j.finished for j in jobs):
+            done = sum(1 for j in jobs if j.state == "done")
+            if len(jobs) > 1:
+                self.log_panel.info(f"Queue finished: {done}/{len(jobs)} jobs succeeded.")
+            if all(j.state == "cancelled" for j in jobs):
+                self.status_bar_label.setText("Stopped")
+            else:
+                self.status_bar_label.setText("Done" if done == len(jobs) else "Finished with errors")
+            self.sidebar.set_generating_state(False)
+            self.active_jobs.clear()
+
+    def on_generation_success(self, job):
+        import os
+        file_path = job.result_path
+        self.log_panel.success(f"Generation Complete: {file_path}")
+        mesh = self._load_mesh(file_path)
+        if mesh is None:
+            return
         self.current_mesh = mesh
         self.viewport.update_mesh(mesh)
         
         # Take Screenshot for Thumbnail
-        import os
         # Use assets/thumbnails as requested
         thumb_dir = os.path.join("assets", "thumbnails")
         os.makedirs(thumb_dir, exist_ok=True)
-        filename = os.path.basename(file_path).replace(".obj", ".png").replace(".glb", ".png")
-        thumb_path = os.path.join(thumb_dir, filename)
+        stem = os.path.splitext(os.path.basename(file_path))[0]
+        thumb_path = os.path.join(thumb_dir, f"{job.id}_{stem}.png")
         
         # Wait a brief moment for render to update (OpenGL can be async)
         QThread.msleep(100) 
@@ -352,19 +358,31 @@ class MainWindow(QMainWindow):
     def on_generation_error(self, error_msg):
         self.status_bar_label.setText("Error")
         self.log_panel.error(error_msg)
-        self.sidebar.set_generating_state(False)
-        QMessageBox.critical(self, "Error", error_msg)
+        if len(self.active_jobs) <= 1:
+            QMessageBox.critical(self, "Error", error_msg)
 
     def load_mesh_from_asset(self, file_path):
         self.log_panel.info(f"Loading {file_path}")
-        try:
-             # mock load
-            import trimesh
-            mesh = trimesh.creation.icosphere(radius=1.0)
+        mesh = self._load_mesh(file_path)
+        if mesh is not None:
             self.current_mesh = mesh
             self.viewport.update_mesh(mesh)
+
+    def _load_mesh(self, file_path):
+        try:
+            import trimesh
+            return trimesh.load(file_path, force='mesh')
         except Exception as e:
             self.log_panel.error(f"Load failed: {e}")
+            return None
+
+    def closeEvent(self, event):
+        # Shut down the warm InstantMesh worker so it does not outlive the window
+        if self._backend is not None:
+            self._backend.request_stop()
+            self._backend.jobs.wait(timeout=2) # Let cancelled jobs kill their workers
+            self._backend.unload_model()
+        super().closeEvent(event)
 
     def export_mesh(self):
         if not self.current_mesh:
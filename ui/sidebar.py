@@ -1,7 +1,9 @@
+import os
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QLabel, QPushButton, 
     QTextEdit, QComboBox, QCheckBox, QListWidget, 
-    QFileDialog, QGroupBox, QTabWidget, QGridLayout, QMessageBox, QHBoxLayout
+    QFileDialog, QGroupBox, QTabWidget, QGridLayout, QMessageBox, QHBoxLayout,
+    QSpinBox, QDoubleSpinBox
 )
 from PySide6.QtCore import Qt, Signal, QMimeData
 from PySide6.QtGui import QDragEnterEvent, QDropEvent, QPixmap
@@ -78,9 +80,36 @@ class SidebarWidget(QWidget):
         settings_layout.addWidget(QLabel("Model:"))
         settings_layout.addWidget(self.model_combo)
         
-        self.low_vram_check = QCheckBox("Low VRAM Mode (FP16)")
-        self.low_vram_check.setChecked(True)
+        self.low_vram_check = QCheckBox("Low Memory Mode (BF16 on CPU / FP16 on GPU)")
+        self.low_vram_check.setChecked(False)
+        self.low_vram_check.setToolTip("Keep weights in half precision and load one sub-model at a time")
         settings_layout.addWidget(self.low_vram_check)
+
+        # A budget implies low memory mode; stages that go over it are reported in the log
+        self.memory_budget_spin = QDoubleSpinBox()
+        self.memory_budget_spin.setRange(0.0, 1024.0)
+        self.memory_budget_spin.setSingleStep(0.5)
+        self.memory_budget_spin.setDecimals(1)
+        self.memory_budget_spin.setValue(0.0)
+        self.memory_budget_spin.setSpecialValueText("Off")
+        self.memory_budget_spin.setSuffix(" GB")
+        self.memory_budget_spin.setToolTip("Peak RAM per parallel job (0 = off)")
+        settings_layout.addWidget(QLabel("Memory budget:"))
+        settings_layout.addWidget(self.memory_budget_spin)
+
+        # Each parallel job runs in its own warm worker process
+        self.concurrency_spin = QSpinBox()
+        self.concurrency_spin.setRange(1, max(1, os.cpu_count() or 1))
+        self.concurrency_spin.setValue(1)
+        self.concurrency_spin.setToolTip("Number of generation jobs running at the same time")
+        settings_layout.addWidget(QLabel("Parallel jobs:"))
+        settings_layout.addWidget(self.concurrency_spin)
+
+        # The cores are always split between the jobs; pinning also binds each job to its own cores
+        self.pin_cpus_check = QCheckBox("Pin jobs to CPU cores")
+        self.pin_cpus_check.setChecked(False)
+        self.pin_cpus_check.setToolTip("Give every parallel job its own block of cores (CPU mode)")
+        settings_layout.addWidget(self.pin_cpus_check)
         
         settings_group.setLayout(settings_layout)
         self.layout.addWidget(settings_group)